@@ -0,0 +1,32 @@
+"""add_book_keyset_indexes
+
+Revision ID: 3f9c1a7d2b84
+Revises: 005019b6ed22
+Create Date: 2026-10-16 09:12:04.118233
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1a7d2b84'
+down_revision = '005019b6ed22'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_books_title_id', 'books', ['title', 'id'], unique=False)
+    op.create_index('ix_books_author_id', 'books', ['author', 'id'], unique=False)
+    op.create_index('ix_books_average_rating_id', 'books', ['average_rating', 'id'], unique=False)
+    op.create_index('ix_books_total_reviews_id', 'books', ['total_reviews', 'id'], unique=False)
+    op.create_index('ix_books_publication_date_id', 'books', ['publication_date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_publication_date_id', table_name='books')
+    op.drop_index('ix_books_total_reviews_id', table_name='books')
+    op.drop_index('ix_books_average_rating_id', table_name='books')
+    op.drop_index('ix_books_author_id', table_name='books')
+    op.drop_index('ix_books_title_id', table_name='books')
@@ -0,0 +1,47 @@
+"""add_row_versions
+
+Revision ID: 7a1d4e9c3b56
+Revises: e5b3c8a1f024
+Create Date: 2026-10-16 15:48:37.120944
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a1d4e9c3b56'
+down_revision = 'e5b3c8a1f024'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('row_version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('reviews', sa.Column('row_version', sa.Integer(), server_default='1', nullable=False))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.row_version := OLD.row_version + 1;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER books_row_version_trigger
+        BEFORE UPDATE ON books
+        FOR EACH ROW EXECUTE FUNCTION bump_row_version()
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_row_version_trigger
+        BEFORE UPDATE ON reviews
+        FOR EACH ROW EXECUTE FUNCTION bump_row_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS reviews_row_version_trigger ON reviews")
+    op.execute("DROP TRIGGER IF EXISTS books_row_version_trigger ON books")
+    op.execute("DROP FUNCTION IF EXISTS bump_row_version()")
+    op.drop_column('reviews', 'row_version')
+    op.drop_column('books', 'row_version')
@@ -0,0 +1,48 @@
+"""add_book_search_vector
+
+Revision ID: 8d2e6b0c4a17
+Revises: 3f9c1a7d2b84
+Create Date: 2026-10-16 10:03:41.527190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e6b0c4a17'
+down_revision = '3f9c1a7d2b84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+    op.execute("""
+        CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.author, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(array_to_string(NEW.genres, ' '), '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER books_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, author, genres, description ON books
+        FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+    """)
+    # Backfill existing rows through the trigger
+    op.execute("UPDATE books SET title = title")
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_search_vector', table_name='books', postgresql_using='gin')
+    op.execute("DROP TRIGGER IF EXISTS books_search_vector_trigger ON books")
+    op.execute("DROP FUNCTION IF EXISTS books_search_vector_update()")
+    op.drop_column('books', 'search_vector')
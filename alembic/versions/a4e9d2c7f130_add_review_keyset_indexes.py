@@ -0,0 +1,37 @@
+"""add_review_keyset_indexes
+
+Revision ID: a4e9d2c7f130
+Revises: f3c7b1e80d59
+Create Date: 2026-10-16 18:05:47.219381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e9d2c7f130'
+down_revision = 'f3c7b1e80d59'
+branch_labels = None
+depends_on = None
+
+ACTIVE_REVIEWS = sa.text('is_deleted = false')
+
+
+def upgrade() -> None:
+    # Composite (filter, sort column, id) indexes serving keyset pagination of active reviews
+    op.create_index('ix_reviews_book_created_id', 'reviews', ['book_id', 'created_at', 'id'], postgresql_where=ACTIVE_REVIEWS)
+    op.create_index('ix_reviews_book_rating_id', 'reviews', ['book_id', 'rating', 'id'], postgresql_where=ACTIVE_REVIEWS)
+    op.create_index('ix_reviews_book_helpful_id', 'reviews', ['book_id', 'helpful_votes', 'id'], postgresql_where=ACTIVE_REVIEWS)
+    op.create_index('ix_reviews_user_created_id', 'reviews', ['user_id', 'created_at', 'id'], postgresql_where=ACTIVE_REVIEWS)
+    op.create_index('ix_reviews_created_id', 'reviews', ['created_at', 'id'], postgresql_where=ACTIVE_REVIEWS)
+    op.create_index('ix_user_favorites_user_created_id', 'user_favorites', ['user_id', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_favorites_user_created_id', table_name='user_favorites')
+    op.drop_index('ix_reviews_created_id', table_name='reviews')
+    op.drop_index('ix_reviews_user_created_id', table_name='reviews')
+    op.drop_index('ix_reviews_book_helpful_id', table_name='reviews')
+    op.drop_index('ix_reviews_book_rating_id', table_name='reviews')
+    op.drop_index('ix_reviews_book_created_id', table_name='reviews')
@@ -0,0 +1,30 @@
+"""add_book_top_rated_score_index
+
+Revision ID: b6d1f4a8e293
+Revises: a4e9d2c7f130
+Create Date: 2026-10-16 18:32:10.845127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d1f4a8e293'
+down_revision = 'a4e9d2c7f130'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Must match TOP_RATED_SCORE_SQL in app/db/models.py for the planner to use it
+    op.create_index(
+        'ix_books_top_rated_score',
+        'books',
+        [sa.text("(coalesce(average_rating, 0) + least(coalesce(total_reviews, 0) / 1000.0, 0.1)) DESC"), 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_top_rated_score', table_name='books')
@@ -0,0 +1,29 @@
+"""add_book_trigram_indexes
+
+Revision ID: b71e0f5d93c2
+Revises: 8d2e6b0c4a17
+Create Date: 2026-10-16 11:27:15.804412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e0f5d93c2'
+down_revision = '8d2e6b0c4a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_books_title_trgm', 'books', ['title'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'})
+    op.create_index('ix_books_author_trgm', 'books', ['author'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_author_trgm', table_name='books', postgresql_using='gin')
+    op.drop_index('ix_books_title_trgm', table_name='books', postgresql_using='gin')
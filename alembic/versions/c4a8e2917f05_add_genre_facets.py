@@ -0,0 +1,63 @@
+"""add_genre_facets
+
+Revision ID: c4a8e2917f05
+Revises: b71e0f5d93c2
+Create Date: 2026-10-16 13:40:52.276318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e2917f05'
+down_revision = 'b71e0f5d93c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Restore the GIN index dropped in 005019b6ed22; it serves genre overlap/containment filters
+    op.create_index('ix_books_genres', 'books', ['genres'], unique=False, postgresql_using='gin')
+
+    op.create_table('genre_counts',
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('book_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('genre')
+    )
+    op.execute("""
+        CREATE OR REPLACE FUNCTION books_genre_counts_update() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.genres IS NOT NULL THEN
+                UPDATE genre_counts SET book_count = book_count - 1
+                WHERE genre IN (SELECT DISTINCT g FROM unnest(OLD.genres) AS g);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.genres IS NOT NULL THEN
+                INSERT INTO genre_counts (genre, book_count)
+                SELECT DISTINCT g, 1 FROM unnest(NEW.genres) AS g WHERE g IS NOT NULL
+                ON CONFLICT (genre) DO UPDATE SET book_count = genre_counts.book_count + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER books_genre_counts_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF genres ON books
+        FOR EACH ROW EXECUTE FUNCTION books_genre_counts_update()
+    """)
+    # Backfill from the current catalog
+    op.execute("""
+        INSERT INTO genre_counts (genre, book_count)
+        SELECT g, count(DISTINCT b.id)
+        FROM books b, unnest(b.genres) AS g
+        WHERE g IS NOT NULL
+        GROUP BY g
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS books_genre_counts_trigger ON books")
+    op.execute("DROP FUNCTION IF EXISTS books_genre_counts_update()")
+    op.drop_table('genre_counts')
+    op.drop_index('ix_books_genres', table_name='books', postgresql_using='gin')
@@ -0,0 +1,96 @@
+"""add_book_rating_sum
+
+Revision ID: d8f2a6c19e47
+Revises: 7a1d4e9c3b56
+Create Date: 2026-10-16 17:12:05.381554
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f2a6c19e47'
+down_revision = '7a1d4e9c3b56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    # Backfill the aggregates from active reviews
+    op.execute("""
+        UPDATE books b SET
+            rating_sum = coalesce(r.rating_sum, 0),
+            total_reviews = coalesce(r.review_count, 0),
+            average_rating = CASE
+                WHEN coalesce(r.review_count, 0) > 0 THEN round(r.rating_sum::numeric / r.review_count, 1)
+                ELSE 0
+            END
+        FROM books bb
+        LEFT JOIN (
+            SELECT book_id, sum(rating) AS rating_sum, count(*) AS review_count
+            FROM reviews
+            WHERE NOT coalesce(is_deleted, false)
+            GROUP BY book_id
+        ) r ON r.book_id = bb.id
+        WHERE b.id = bb.id
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION apply_book_rating_delta(target_id integer, sum_delta integer, count_delta integer)
+        RETURNS void AS $$
+            UPDATE books SET
+                rating_sum = rating_sum + sum_delta,
+                total_reviews = coalesce(total_reviews, 0) + count_delta,
+                average_rating = CASE
+                    WHEN coalesce(total_reviews, 0) + count_delta > 0
+                    THEN round((rating_sum + sum_delta)::numeric / (coalesce(total_reviews, 0) + count_delta), 1)
+                    ELSE 0
+                END
+            WHERE id = target_id
+        $$ LANGUAGE sql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION reviews_book_rating_update() RETURNS trigger AS $$
+        DECLARE
+            old_sum integer := 0;
+            old_count integer := 0;
+            new_sum integer := 0;
+            new_count integer := 0;
+        BEGIN
+            IF TG_OP <> 'INSERT' AND NOT coalesce(OLD.is_deleted, false) THEN
+                old_sum := OLD.rating;
+                old_count := 1;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NOT coalesce(NEW.is_deleted, false) THEN
+                new_sum := NEW.rating;
+                new_count := 1;
+            END IF;
+            IF TG_OP = 'UPDATE' AND OLD.book_id = NEW.book_id THEN
+                IF new_sum <> old_sum OR new_count <> old_count THEN
+                    PERFORM apply_book_rating_delta(NEW.book_id, new_sum - old_sum, new_count - old_count);
+                END IF;
+                RETURN NULL;
+            END IF;
+            IF old_count > 0 THEN
+                PERFORM apply_book_rating_delta(OLD.book_id, -old_sum, -old_count);
+            END IF;
+            IF new_count > 0 THEN
+                PERFORM apply_book_rating_delta(NEW.book_id, new_sum, new_count);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER reviews_book_rating_trigger
+        AFTER INSERT OR DELETE OR UPDATE OF rating, is_deleted, book_id ON reviews
+        FOR EACH ROW EXECUTE FUNCTION reviews_book_rating_update()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS reviews_book_rating_trigger ON reviews")
+    op.execute("DROP FUNCTION IF EXISTS reviews_book_rating_update()")
+    op.execute("DROP FUNCTION IF EXISTS apply_book_rating_delta(integer, integer, integer)")
+    op.drop_column('books', 'rating_sum')
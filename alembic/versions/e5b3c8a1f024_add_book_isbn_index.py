@@ -0,0 +1,25 @@
+"""add_book_isbn_index
+
+Revision ID: e5b3c8a1f024
+Revises: c4a8e2917f05
+Create Date: 2026-10-16 15:02:11.904512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b3c8a1f024'
+down_revision = 'c4a8e2917f05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Serves the ISBN match in bulk catalog imports (see app/services/book_import.py)
+    op.create_index(op.f('ix_books_isbn'), 'books', ['isbn'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_books_isbn'), table_name='books')
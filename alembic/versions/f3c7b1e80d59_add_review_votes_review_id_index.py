@@ -0,0 +1,24 @@
+"""add_review_votes_review_id_index
+
+Revision ID: f3c7b1e80d59
+Revises: d8f2a6c19e47
+Create Date: 2026-10-16 17:41:22.604918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c7b1e80d59'
+down_revision = 'd8f2a6c19e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_review_votes_review_id', 'review_votes', ['review_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_review_votes_review_id', table_name='review_votes')
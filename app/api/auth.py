@@ -1,5 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import timedelta, datetime
 from datetime import timezone
@@ -12,9 +15,9 @@ from app.core.auth import (
     create_access_token, 
     ACCESS_TOKEN_EXPIRE_MINUTES,
     Token,
-    get_current_user
+    get_current_user_async
 )
-from app.db.session import get_db
+from app.db.session import get_db, get_async_db
 from app.db.models import User, InvalidatedToken
 
 router = APIRouter()
@@ -38,7 +41,7 @@ async def register(
     name: Optional[str] = Form(None),
     username: Optional[str] = Form(None),
     password: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new user using either JSON or form data."""
     try:
@@ -54,19 +57,15 @@ async def register(
             )
             
         # Check if email already exists
-        existing_user = (
-            db.query(User)
-            .filter(User.email == username)
-            .first()
-        )
+        existing_user = await db.scalar(select(User.id).where(User.email == username).limit(1))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already exists"
             )
             
-        # Create new user
-        password_hash = get_password_hash(password)
+        # Create new user (bcrypt is CPU-bound, keep it off the event loop)
+        password_hash = await run_in_threadpool(get_password_hash, password)
         new_user = User(
             name=name,
             email=username,
@@ -76,9 +75,9 @@ async def register(
         db.add(new_user)
         
         try:
-            db.commit()
+            await db.commit()
         except Exception:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail="Error creating user - database error"
@@ -102,17 +101,17 @@ async def register(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/register/json", response_model=RegisterResponse)
-async def register_json(user: UserRegister, db: Session = Depends(get_db)):
+async def register_json(user: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a new user using JSON data."""
     # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user.username).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == user.username).limit(1))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already exists"
         )
     try:
-        password_hash = get_password_hash(user.password)
+        password_hash = await run_in_threadpool(get_password_hash, user.password)
         new_user = User(
             name=user.name,
             email=user.username,
@@ -120,8 +119,7 @@ async def register_json(user: UserRegister, db: Session = Depends(get_db)):
             created_at=datetime.now(timezone.utc)
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
         
         # Generate access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -137,7 +135,7 @@ async def register_json(user: UserRegister, db: Session = Depends(get_db)):
         }
     except Exception as e:
         print(f"Error creating user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 async def register_user(user_data: Dict[str, str], db: Session):
@@ -212,12 +210,14 @@ async def register_user(user_data: Dict[str, str], db: Session):
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Authenticate user and return token."""
     try:
         # Use selective loading to only get required fields
-        user = db.query(User.email, User.hashed_password).filter(User.email == form_data.username).first()
+        user = (await db.execute(
+            select(User.email, User.hashed_password).where(User.email == form_data.username).limit(1)
+        )).first()
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -226,7 +226,7 @@ async def login(
             )
 
         # Verify password
-        if not verify_password(form_data.password, user.hashed_password):
+        if not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -252,8 +252,8 @@ async def login(
 @router.post("/logout")
 async def logout(
     token: str = Depends(oauth2_scheme),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Logout user by invalidating their token."""
     # Add token to invalidated tokens table
@@ -262,13 +262,12 @@ async def logout(
         invalidated_at=datetime.now(timezone.utc)
     )
     db.add(invalid_token)
-    db.commit()
+    await db.commit()
     return {"message": "Successfully logged out"}
 
-from app.core.auth import get_current_user  # Import from core
 
 @router.get("/me", response_model=Dict[str, Any])
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_user_async)):
     """Get current user information."""
     return {
         "id": current_user.id,
@@ -280,7 +279,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 @router.post("/logout")
 async def logout(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Logout user by invalidating the current token.
@@ -288,9 +287,9 @@ async def logout(
     """
     try:
         # Check if token is already invalidated
-        existing_invalidated = db.query(InvalidatedToken).filter(
-            InvalidatedToken.token == token
-        ).first()
+        existing_invalidated = await db.scalar(
+            select(InvalidatedToken.id).where(InvalidatedToken.token == token).limit(1)
+        )
         
         if existing_invalidated:
             raise HTTPException(
@@ -304,14 +303,14 @@ async def logout(
             invalidated_at=datetime.now(timezone.utc)
         )
         db.add(invalidated_token)
-        db.commit()
+        await db.commit()
         
         return {"message": "Successfully logged out"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error during logout: {str(e)}"
@@ -1,22 +1,43 @@
 from typing import List, Optional
+import io
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.auth import get_current_user
-from app.db.session import get_db
-from app.schemas.book import Book, BookCreate, BookUpdate, BookSearchParams, BookListResponse
-from app.services.book import BookService
+from app.core.cache import cache_versions_shared, get_cache_version_changed_at
+from app.core.etag import etag_matches, json_response, make_etag, not_modified
+from app.db.session import get_async_read_db, get_db, get_read_db, get_session_factory, may_lag_behind
+from app.schemas.book import Book, BookCreate, BookUpdate, BookSearchParams, BookListResponse, SparseBookListResponse, BookSuggestResponse, BookImportResult, BookBatchRequest, BookBatchResponse
+from app.services.book import BookService, book_list_cache
+from app.services.book_import import BookImportService
+from app.services.counting import COUNT_STRATEGY_PATTERN
+from app.services.suggest import get_suggestion_index
 
 router = APIRouter(tags=["books"])
 
+BATCH_MAX_IDS = 1000
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
 @router.get("/", response_model=BookListResponse)
 def list_books(
-    search: Optional[str] = Query(None, description="Search text to filter books by title, author, or genres"),
-    sortBy: Optional[str] = Query(None, description="Field to sort by (title, author, rating, date)", alias="sortBy"),
+    search: Optional[str] = Query(None, description="Full-text search over title, author, genres and description; results are ranked by relevance unless sortBy is given"),
+    fuzzy: bool = Query(False, description="Typo-tolerant title/author matching, ranked by similarity"),
+    genre: Optional[List[str]] = Query(None, description="Filter by genre (repeat for several)"),
+    genre_mode: str = Query("any", pattern="^(any|all)$", description="Match books having any or all of the genres"),
+    min_rating: Optional[float] = Query(None, ge=0.0, le=5.0, description="Minimum average rating"),
+    facets: bool = Query(False, description="Include per-genre counts for the matching books"),
+    sortBy: Optional[str] = Query(None, description="Field to sort by (title, author, rating, date, relevance)", alias="sortBy"),
     sortOrder: Optional[str] = Query(None, description="Sort order (asc or desc)", alias="sortOrder"),
     offset: Optional[int] = Query(0, ge=0, description="Number of items to skip"),
     limit: Optional[int] = Query(20, gt=0, le=100, description="Number of items to return"),
-    db: Session = Depends(get_db)
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor; offset is ignored when set"),
+    include_total: bool = Query(True, description="Compute the total match count"),
+    count: str = Query("exact", pattern=COUNT_STRATEGY_PATTERN, description="Total count strategy (exact, cached or estimated)"),
+    fields: Optional[str] = Query(None, description="Comma-separated book fields to return, e.g. id,title,author,average_rating"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
 ):
     # Set default values for pagination
     if limit is None:
@@ -24,8 +45,8 @@ def list_books(
     if offset is None:
         offset = 0
         
-    # Calculate page number from offset/limit
-    page = (offset // limit) + 1
+    # Calculate page number from offset/limit (not meaningful in cursor mode)
+    page = (offset // limit) + 1 if not after else None
     items_per_page = limit
 
     # Normalize sort parameters
@@ -33,7 +54,7 @@ def list_books(
     normalized_sort_order = sortOrder.lower() if sortOrder else 'asc'
     
     # Validate sort parameters
-    valid_sort_fields = ['title', 'author', 'rating', 'date', 'publication_date', 'average_rating', 'total_reviews']
+    valid_sort_fields = ['title', 'author', 'rating', 'date', 'publication_date', 'average_rating', 'total_reviews', 'relevance']
     valid_sort_orders = ['asc', 'desc']
     
     if normalized_sort_by and normalized_sort_by not in valid_sort_fields:
@@ -41,41 +62,195 @@ def list_books(
     if normalized_sort_order not in valid_sort_orders:
         raise HTTPException(status_code=400, detail=f"Invalid sort_order value. Must be one of: {', '.join(valid_sort_orders)}")
     
+    try:
+        selected_fields = BookService.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     book_service = BookService(db)
     search_params = BookSearchParams(
         search=search,
+        fuzzy=fuzzy,
+        genres=genre,
+        genre_mode=genre_mode,
+        min_rating=min_rating,
+        facets=facets,
         sort_by=normalized_sort_by,
         sort_order=normalized_sort_order,
         offset=offset,
         limit=limit,
         page=None,  # We're using offset/limit pagination
-        items_per_page=limit  # Using limit as items_per_page for metadata
+        items_per_page=limit,  # Using limit as items_per_page for metadata
+        after=after,
+        include_total=include_total,
+        count_strategy=count,
+        fields=selected_fields
     )
     
     # Log the parameters for debugging
     logger = logging.getLogger(__name__)
     logger.info(f"Endpoint received: sort_by={normalized_sort_by}, sort_order={normalized_sort_order}")
-    books, total_count = book_service.get_books(search_params)
+
+    # The listing key embeds the catalog version, so it identifies this exact representation,
+    # provided the version is shared by every worker; otherwise the payload is tagged by content
+    list_key = book_service.list_cache_key(search_params)
+    etag = make_etag("books", list_key) if cache_versions_shared() else None
+    if etag is not None and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    # Serve repeated listings from the response cache
+    if book_list_cache.enabled:
+        cached = book_list_cache.get(list_key)
+        if cached is not None:
+            return json_response(cached, if_none_match, etag)
+
+    try:
+        books, total_count, cursor = book_service.get_books_page(search_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    genre_facets = book_service.get_genre_facets(search_params) if facets else None
     
     # Calculate pagination metadata
-    total_pages = (total_count + items_per_page - 1) // items_per_page if items_per_page else None
+    total_pages = (total_count + items_per_page - 1) // items_per_page if total_count is not None and items_per_page else None
     current_page_count = len(books)
     
-    return BookListResponse(
+    if selected_fields:
+        response_class, books = SparseBookListResponse, [BookService.project(book, selected_fields) for book in books]
+    else:
+        response_class = BookListResponse
+    response = response_class(
         books=books,
         total=total_count,
         page=page,
         items_per_page=items_per_page,
         total_pages=total_pages,
-        current_page_count=current_page_count
+        current_page_count=current_page_count,
+        next_cursor=cursor,
+        facets=genre_facets
+    )
+    payload = response.model_dump_json()
+    if may_lag_behind(db, get_cache_version_changed_at('catalog')):
+        # A replica still catching up on the latest catalog change may predate the
+        # version in list_key: tag the result by content and keep it out of the cache
+        etag = None
+    elif book_list_cache.enabled:
+        book_list_cache.set(list_key, payload)
+    return json_response(payload, if_none_match, etag)
+
+@router.get("/suggest", response_model=BookSuggestResponse)
+def suggest_books(
+    q: str = Query(..., min_length=1, max_length=255, description="Prefix typed so far"),
+    limit: int = Query(10, gt=0, le=20, description="Number of suggestions to return"),
+    db: Session = Depends(get_db)
+):
+    """Title/author completions served from the in-memory prefix index"""
+    index = get_suggestion_index(db)
+    return BookSuggestResponse(query=q, suggestions=index.suggest(q, limit))
+
+@router.get("/batch", response_model=BookBatchResponse)
+async def get_books_batch(
+    ids: str = Query(..., description="Comma-separated book ids, e.g. 1,2,3"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """Fetch many books in one request; use POST /batch for large id sets"""
+    try:
+        book_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not book_ids:
+        raise HTTPException(status_code=400, detail="At least one id is required")
+    if len(book_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_IDS} ids per request")
+    books, missing = await BookService(db).get_books_by_ids_async(book_ids)
+    return BookBatchResponse(books=books, missing=missing)
+
+@router.post("/batch", response_model=BookBatchResponse)
+async def post_books_batch(request: BookBatchRequest, db: AsyncSession = Depends(get_async_read_db)):
+    """Fetch many books in one request, ids in the body"""
+    books, missing = await BookService(db).get_books_by_ids_async(request.ids)
+    return BookBatchResponse(books=books, missing=missing)
+
+@router.get("/export")
+def export_books(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Output format"),
+    search: Optional[str] = Query(None, description="Full-text search over title, author, genres and description"),
+    fuzzy: bool = Query(False, description="Typo-tolerant title/author matching"),
+    genre: Optional[List[str]] = Query(None, description="Filter by genre (repeat for several)"),
+    genre_mode: str = Query("any", pattern="^(any|all)$", description="Match books having any or all of the genres"),
+    min_rating: Optional[float] = Query(None, ge=0.0, le=5.0, description="Minimum average rating"),
+    session_factory=Depends(get_session_factory)
+):
+    """Stream the (optionally filtered) catalog in id order"""
+    search_params = BookSearchParams(
+        search=search,
+        fuzzy=fuzzy,
+        genres=genre,
+        genre_mode=genre_mode,
+        min_rating=min_rating
     )
+    # Request-scoped sessions are closed before a streamed body is sent, so the
+    # export owns its session until the last row has been written
+    db = session_factory()
+
+    def stream():
+        try:
+            yield from BookService(db).export_books(search_params, format)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'}
+    )
+
+@router.post("/import", response_model=BookImportResult)
+def import_books(
+    file: UploadFile = File(..., description="CSV (with header row) or NDJSON catalog feed"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Feed format; inferred from the file name when omitted"),
+    db: Session = Depends(get_db),
+    _=Depends(get_current_user)
+):
+    """Upsert a catalog feed into books by ISBN"""
+    fmt = format or ("ndjson" if (file.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv")
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        return BookImportService(db).import_books(stream, fmt)
+    except UnicodeDecodeError:  # A ValueError subclass; checked first
+        raise HTTPException(status_code=400, detail="Import file must be UTF-8 encoded")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{book_id}", response_model=Book)
-def get_book(book_id: int, db: Session = Depends(get_db)):
+async def get_book(
+    book_id: int,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated book fields to return"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    try:
+        selected_fields = BookService.parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     book_service = BookService(db)
-    book = book_service.get_book(book_id)
+    if if_none_match:
+        # Answer revalidations from the version column alone
+        version = await book_service.get_book_version_async(book_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        etag = make_etag("book", book_id, version, selected_fields)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    book = await book_service.get_book_async(book_id, selected_fields)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
+    etag = make_etag("book", book.id, book.row_version, selected_fields)
+    if selected_fields:
+        return JSONResponse(BookService.project(book, selected_fields), headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return book
 
 @router.post("/", response_model=Book)
@@ -1,5 +1,5 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from app.core.auth import get_current_user
 from app.db.session import get_db
@@ -8,6 +8,8 @@ from app.services.profile import ProfileService
 
 router = APIRouter(tags=["profile"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 @router.get("/me", response_model=ProfileResponse)
 def get_my_profile(
     current_user = Depends(get_current_user),
@@ -36,25 +38,41 @@ def update_my_profile(
 
 @router.get("/me/reviews", response_model=List[ReviewBrief])
 def get_my_reviews(
+    response: Response,
     limit: int = 10,
     offset: int = 0,
+    after: Optional[str] = Query(None, description="Cursor from a previous page's X-Next-Cursor header; offset is ignored when set"),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get current user's reviews"""
+    """Get current user's reviews; the next page's cursor is returned in X-Next-Cursor"""
     profile_service = ProfileService(db)
-    return profile_service.get_user_reviews(current_user.id, limit, offset)
+    try:
+        items, cursor = profile_service.get_user_reviews_page(current_user.id, limit, offset, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return items
 
 @router.get("/me/favorites", response_model=List[FavoriteResponse])
 def get_my_favorites(
+    response: Response,
     limit: int = 10,
     offset: int = 0,
+    after: Optional[str] = Query(None, description="Cursor from a previous page's X-Next-Cursor header; offset is ignored when set"),
     current_user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get current user's favorite books"""
+    """Get current user's favorite books; the next page's cursor is returned in X-Next-Cursor"""
     profile_service = ProfileService(db)
-    return profile_service.get_user_favorites(current_user.id, limit, offset)
+    try:
+        items, cursor = profile_service.get_user_favorites_page(current_user.id, limit, offset, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return items
 
 @router.post("/me/favorites/{book_id}", response_model=FavoriteResponse)
 def add_to_favorites(
@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from openai import AsyncOpenAI
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.db.session import get_db
-from app.core.auth import get_current_user
+from app.db.session import get_async_read_db
+from app.core.auth import get_current_user_async
+from app.core.clients import get_async_redis, get_openai_client
 from app.schemas.recommendation import RecommendationRequest, RecommendationResponse
 from app.services.recommendation import RecommendationService
 
@@ -12,8 +15,10 @@ router = APIRouter()
 @router.post("", response_model=RecommendationResponse)
 async def get_recommendations(
     request: RecommendationRequest,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_read_db),
+    cache: Optional[Redis] = Depends(get_async_redis),
+    openai_client: Optional[AsyncOpenAI] = Depends(get_openai_client)
 ):
     """
     Get personalized book recommendations for the current user.
@@ -28,7 +33,7 @@ async def get_recommendations(
     - genre: Filter recommendations by specific genre
     """
     try:
-        recommendation_service = RecommendationService(db)
+        recommendation_service = RecommendationService(db, cache=cache, openai_client=openai_client)
         result = await recommendation_service.get_recommendations(
             user_id=current_user.id,
             limit=request.limit,
@@ -1,20 +1,66 @@
 from typing import List, Optional
 from datetime import datetime, timezone
-from fastapi import APIRouter, Depends, HTTPException, Query
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.core.auth import get_current_user
-from app.db.session import get_db
+from app.core.cache import cache_versions_shared, get_cache_version, get_cache_version_changed_at
+from app.core.etag import etag_matches, json_response, make_etag, not_modified
+from app.db.session import get_async_read_db, get_db, get_read_db, may_lag_behind
 from app.schemas.review import (
     ReviewResponse,
+    ReviewListResponse,
     ReviewCreate,
     ReviewUpdate,
     ReviewVoteCreate,
     ReviewSearchParams
 )
-from app.services.review import ReviewService
+from app.services.review import EDIT_WINDOW, ReviewService
+from app.services.counting import COUNT_STRATEGY_PATTERN
 
 router = APIRouter(tags=["reviews"])
 
+# can_edit depends on the clock, so list ETags also change every bucket
+CAN_EDIT_BUCKET_SECONDS = 300
+
+def _can_edit(created_at: datetime) -> bool:
+    """Reviews can be edited within 24 hours of creation"""
+    return datetime.now(timezone.utc) - created_at < EDIT_WINDOW
+
+def _review_row(row) -> dict:
+    """Listing row from ReviewService.get_review_rows in ReviewResponse shape"""
+    return {
+        "id": row.id,
+        "text": row.text,
+        "rating": row.rating,
+        "user_id": row.user_id,
+        "book_id": row.book_id,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+        "is_deleted": row.is_deleted,
+        "helpful_votes": row.helpful_votes,
+        "unhelpful_votes": row.unhelpful_votes,
+        "user": {"id": row.user_id, "email": row.user_email},
+        "can_edit": _can_edit(row.created_at)
+    }
+
+def _review_response(review) -> ReviewResponse:
+    return ReviewResponse.model_validate({
+        "id": review.id,
+        "text": review.text,
+        "rating": review.rating,
+        "user_id": review.user_id,
+        "book_id": review.book_id,
+        "created_at": review.created_at,
+        "updated_at": review.updated_at,
+        "is_deleted": review.is_deleted,
+        "helpful_votes": review.helpful_votes,
+        "unhelpful_votes": review.unhelpful_votes,
+        "user": {"id": review.user.id, "email": review.user.email},
+        "can_edit": _can_edit(review.created_at)
+    })
+
 @router.post("", response_model=ReviewResponse)
 def create_review(
     review: ReviewCreate,
@@ -27,26 +73,7 @@ def create_review(
         result = review_service.create_review(current_user.id, review)
         print(f"Review created successfully: {result.id}")
         
-        # Calculate can_edit field (within 24 hours)
-        can_edit = (datetime.now(timezone.utc) - result.created_at).total_seconds() < 24 * 3600
-        
-        # Create the response with all required fields
-        response_dict = {
-            "id": result.id,
-            "text": result.text,
-            "rating": result.rating,
-            "user_id": result.user_id,
-            "book_id": result.book_id,
-            "created_at": result.created_at,
-            "updated_at": result.updated_at,
-            "is_deleted": result.is_deleted,
-            "helpful_votes": result.helpful_votes,
-            "unhelpful_votes": result.unhelpful_votes,
-            "user": {"id": result.user.id, "email": result.user.email},
-            "can_edit": can_edit
-        }
-        
-        return ReviewResponse.model_validate(response_dict)
+        return _review_response(result)
     except ValueError as e:
         print(f"ValueError in create_review: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -56,7 +83,7 @@ def create_review(
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("", response_model=dict)
+@router.get("", response_model=ReviewListResponse)
 def list_reviews(
     book_id: Optional[int] = None,
     user_id: Optional[int] = None,
@@ -65,8 +92,21 @@ def list_reviews(
     sort_order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
     page: int = Query(1, gt=0),
     items_per_page: int = Query(50, gt=0, le=100),
-    db: Session = Depends(get_db)
+    include_total: bool = Query(True),
+    count: str = Query("exact", pattern=COUNT_STRATEGY_PATTERN),
+    after: Optional[str] = Query(None, description="Cursor from a previous page's next_cursor; page is ignored when set"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db)
 ):
+    version = get_cache_version('reviews')
+    # Only a version shared by every worker identifies the page; otherwise it is tagged by content
+    etag = make_etag(
+        "reviews", version, book_id, user_id, rating, sort_by, sort_order,
+        page, items_per_page, include_total, count, after, int(time.time()) // CAN_EDIT_BUCKET_SECONDS
+    ) if cache_versions_shared() else None
+    if etag is not None and etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     review_service = ReviewService(db)
     search_params = ReviewSearchParams(
         book_id=book_id,
@@ -75,46 +115,53 @@ def list_reviews(
         sort_by=sort_by,
         sort_order=sort_order,
         page=page,
-        items_per_page=items_per_page
+        items_per_page=items_per_page,
+        include_total=include_total,
+        count_strategy=count,
+        after=after
     )
-    reviews, total_count = review_service.get_reviews(search_params)
-    
-    # Convert each SQLAlchemy Review model to Pydantic ReviewResponse
-    review_items = []
-    for review in reviews:
-        # Calculate if the review can be edited (within 24 hours)
-        can_edit = (datetime.now(timezone.utc) - review.created_at).total_seconds() < 24 * 3600
-        review_dict = {
-            "id": review.id,
-            "text": review.text,
-            "rating": review.rating,
-            "user_id": review.user_id,
-            "book_id": review.book_id,
-            "created_at": review.created_at,
-            "updated_at": review.updated_at,
-            "is_deleted": review.is_deleted,
-            "helpful_votes": review.helpful_votes,
-            "unhelpful_votes": review.unhelpful_votes,
-            "user": {"id": review.user.id, "email": review.user.email},
-            "can_edit": can_edit
-        }
-        review_items.append(ReviewResponse.model_validate(review_dict))
-    
-    return {
-        "items": review_items,
+    # Reviews and their authors come back as plain rows from one joined query;
+    # the whole page is then validated and serialized in a single pass
+    try:
+        rows, total_count, cursor = review_service.get_review_rows(search_params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    payload = ReviewListResponse.model_validate({
+        "items": [_review_row(row) for row in rows],
         "total": total_count,
         "page": page,
         "items_per_page": items_per_page,
-        "total_pages": (total_count + items_per_page - 1) // items_per_page
-    }
+        "total_pages": (total_count + items_per_page - 1) // items_per_page if total_count is not None else None,
+        "next_cursor": cursor
+    }).model_dump_json()
+    if may_lag_behind(db, get_cache_version_changed_at('reviews')):
+        # The replica may not have the latest review change yet, so the version
+        # does not identify what it returned; tag by content instead
+        etag = None
+    return json_response(payload, if_none_match, etag)
 
 @router.get("/{review_id}", response_model=ReviewResponse)
-def get_review(review_id: int, db: Session = Depends(get_db)):
+async def get_review(
+    review_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     review_service = ReviewService(db)
-    review = review_service.get_review(review_id)
+    if if_none_match:
+        # Answer revalidations from the version columns alone
+        version = await review_service.get_review_version_async(review_id)
+        if not version:
+            raise HTTPException(status_code=404, detail="Review not found")
+        etag = make_etag("review", review_id, version.row_version, _can_edit(version.created_at))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+    review = await review_service.get_review_async(review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
-    return review
+    response.headers["ETag"] = make_etag("review", review.id, review.row_version, _can_edit(review.created_at))
+    return _review_response(review)
 
 @router.put("/{review_id}", response_model=ReviewResponse)
 def update_review(
@@ -128,7 +175,7 @@ def update_review(
         updated_review = review_service.update_review(current_user.id, review_id, review)
         if not updated_review:
             raise HTTPException(status_code=404, detail="Review not found or unauthorized")
-        return updated_review
+        return _review_response(updated_review)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -5,7 +5,7 @@ from fastapi.responses import FileResponse
 from pathlib import Path
 
 from app.core.storage import StorageService
-from app.core.auth import get_current_user
+from app.core.auth import get_current_user_async
 
 router = APIRouter(tags=["storage"])
 storage_service = StorageService()
@@ -14,7 +14,7 @@ storage_service = StorageService()
 async def upload_file(
     file: UploadFile,
     subdir: Optional[str] = None,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user_async)
 ) -> dict:
     """
     Upload a file to storage.
@@ -41,7 +41,7 @@ async def upload_file(
 @router.delete("/{file_path:path}")
 async def delete_file(
     file_path: str,
-    current_user = Depends(get_current_user)
+    current_user = Depends(get_current_user_async)
 ) -> dict:
     """
     Delete a file from storage.
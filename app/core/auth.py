@@ -6,8 +6,10 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, Header
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.db.models import User, InvalidatedToken
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 # JWT Configuration
@@ -41,25 +43,36 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
-def verify_token(token: str, db: Session) -> Optional[TokenData]:
-    """Verify token and return username if token is valid."""
+def _token_email(token: str) -> Optional[str]:
+    """Subject (email) of a valid JWT, or None."""
     try:
-        # First check JWT validity
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        
-        # Check if token is invalidated
-        invalidated = db.query(InvalidatedToken).filter(
-            InvalidatedToken.token == token
-        ).first()
-        if invalidated:
-            return None
-                
-        return TokenData(email=email)
     except JWTError:
         return None
+    return payload.get("sub")
+
+def verify_token(token: str, db: Session) -> Optional[TokenData]:
+    """Verify token and return username if token is valid."""
+    email = _token_email(token)
+    if email is None:
+        return None
+    # Check if token is invalidated
+    invalidated = db.scalar(select(InvalidatedToken.id).where(InvalidatedToken.token == token).limit(1))
+    if invalidated:
+        return None
+    return TokenData(email=email)
+
+async def verify_token_async(token: str, db: AsyncSession) -> Optional[TokenData]:
+    """verify_token for an AsyncSession."""
+    email = _token_email(token)
+    if email is None:
+        return None
+    invalidated = await db.scalar(
+        select(InvalidatedToken.id).where(InvalidatedToken.token == token).limit(1)
+    )
+    if invalidated:
+        return None
+    return TokenData(email=email)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a new JWT access token."""
@@ -76,36 +89,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="v1/auth/login")
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db)
-) -> User:
-    """Get the current user from the token."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
-    try:
-        # Verify the token (this also checks for invalidation)
-        token_data = verify_token(token, db)
-        if token_data is None:
-            raise credentials_exception
-            
-        # Get the user
-        user = db.query(User).filter(User.email == token_data.email).first()
-        if user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has been invalidated",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except JWTError:
-        raise credentials_exception
-    
-    # Find user by email
-    user = db.query(User).filter(User.email == token_data.email).first()
+
+def _invalidated_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token has been invalidated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+# Endpoints authenticate on the same kind of session they use, so FastAPI's
+# per-request dependency cache hands both the same session (one connection):
+# sync `def` endpoints depend on get_current_user, `async def` ones on
+# get_current_user_async.
+
+def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Session = Depends(get_db)
+) -> User:
+    """Get the current user from the token."""
+    # Verify the token (this also checks for invalidation)
+    token_data = verify_token(token, db)
+    if token_data is None:
+        raise _credentials_exception()
+    user = db.scalar(select(User).where(User.email == token_data.email).limit(1))
+    if user is None:
+        raise _invalidated_exception()
+    return user
+
+async def get_current_user_async(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """get_current_user for async endpoints."""
+    token_data = await verify_token_async(token, db)
+    if token_data is None:
+        raise _credentials_exception()
+    user = await db.scalar(select(User).where(User.email == token_data.email).limit(1))
     if user is None:
-        raise credentials_exception
+        raise _invalidated_exception()
     return user
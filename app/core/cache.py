@@ -0,0 +1,187 @@
+"""Caching utilities: in-process TTL cache, shared Redis client and versioned response cache."""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional
+
+from redis import Redis, RedisError
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_RETRY_SECONDS = 30  # How long a failed Redis stays marked down
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed time-to-live."""
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_redis_client: Optional[Redis] = None
+_redis_down_until = 0.0
+_redis_lock = threading.Lock()
+
+
+def get_redis() -> Optional[Redis]:
+    """
+    Shared synchronous Redis client, or None while Redis is unavailable.
+
+    A failed connection is remembered for REDIS_RETRY_SECONDS so callers fall
+    back immediately instead of waiting on a connect timeout every time.
+    """
+    global _redis_client
+    if _redis_client is not None:
+        return _redis_client
+    if time.monotonic() < _redis_down_until:
+        return None
+    with _redis_lock:
+        if _redis_client is None and time.monotonic() >= _redis_down_until:
+            settings = get_settings()
+            client = Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                db=settings.REDIS_DB,
+                decode_responses=True,
+                socket_connect_timeout=0.25,
+                socket_timeout=0.25
+            )
+            try:
+                client.ping()
+                _redis_client = client
+            except RedisError as e:
+                logger.warning(f"Redis not available, using in-process cache: {str(e)}")
+                mark_redis_down()
+    return _redis_client
+
+
+def mark_redis_down() -> None:
+    """Stop using Redis until the retry interval has passed."""
+    global _redis_client, _redis_down_until
+    _redis_client = None
+    _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+_local_versions: Dict[str, int] = defaultdict(int)
+_local_changed_at: Dict[str, float] = defaultdict(float)
+
+
+def cache_version_key(name: str) -> str:
+    """Redis key holding a data set's version."""
+    return f"cache_version:{name}"
+
+
+def local_cache_version(name: str = "catalog") -> int:
+    """This process's fallback version of a data set; only bumps made here move it."""
+    return _local_versions[name]
+
+
+def get_cache_version(name: str = "catalog") -> int:
+    """Current version of a cached data set; part of every cache key built from it."""
+    redis = get_redis()
+    if redis is not None:
+        try:
+            return int(redis.get(cache_version_key(name)) or 0)
+        except RedisError:
+            mark_redis_down()
+    return _local_versions[name]
+
+
+def cache_versions_shared() -> bool:
+    """
+    Whether the version just read came from Redis. The in-process fallback
+    counters differ per worker, so they key local caches but must not identify
+    a representation to clients (ETags).
+    """
+    return _redis_client is not None
+
+
+def get_cache_version_changed_at(name: str = "catalog") -> float:
+    """Wall-clock time of the last bump of a data set's version, 0 when unknown."""
+    redis = get_redis()
+    if redis is not None:
+        try:
+            return float(redis.get(f"cache_version_changed_at:{name}") or 0)
+        except RedisError:
+            mark_redis_down()
+    return _local_changed_at[name]
+
+
+def bump_cache_version(name: str = "catalog") -> None:
+    """Invalidate every cache entry derived from a data set."""
+    now = time.time()
+    with _redis_lock:
+        _local_versions[name] += 1
+        _local_changed_at[name] = now
+    redis = get_redis()
+    if redis is not None:
+        try:
+            pipe = redis.pipeline()
+            pipe.incr(cache_version_key(name))
+            pipe.set(f"cache_version_changed_at:{name}", now)
+            pipe.execute()
+        except RedisError:
+            mark_redis_down()
+
+
+class ResponseCache:
+    """String cache stored in Redis, falling back to a per-process TTLCache."""
+
+    def __init__(self, prefix: str, ttl: int, max_local_entries: int = 1000):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._local = TTLCache(ttl=ttl, max_entries=max_local_entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: str) -> Optional[str]:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                return redis.get(f"{self.prefix}:{key}")
+            except RedisError:
+                mark_redis_down()
+        return self._local.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                redis.setex(f"{self.prefix}:{key}", self.ttl, value)
+                return
+            except RedisError:
+                mark_redis_down()
+        self._local.set(key, value)
@@ -0,0 +1,101 @@
+"""Process-wide async clients (Redis pool, OpenAI over a keep-alive HTTP pool) owned by the app lifespan."""
+import logging
+import time
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from app.core.cache import REDIS_RETRY_SECONDS, cache_version_key
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+OPENAI_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+OPENAI_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+
+
+class AsyncClients:
+    """
+    Holds the shared clients between start() and close().
+
+    Redis health is tracked here once for the whole process: a failed command
+    marks Redis down for REDIS_RETRY_SECONDS, during which redis() returns None
+    immediately instead of every request waiting on a connect timeout.
+    """
+
+    def __init__(self):
+        self._redis: Optional[Redis] = None
+        self._redis_down_until = 0.0
+        self._http: Optional[httpx.AsyncClient] = None
+        self._openai: Optional[AsyncOpenAI] = None
+
+    async def start(self) -> None:
+        settings = get_settings()
+        pool = ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True,
+            max_connections=50,
+            socket_connect_timeout=0.25,
+            socket_timeout=0.25
+        )
+        self._redis = Redis.from_pool(pool)  # The client owns (and closes) the pool
+        try:
+            await self._redis.ping()
+        except RedisError as e:
+            logger.warning(f"Redis not available, recommendation caching disabled: {str(e)}")
+            self.mark_redis_down()
+
+        self._http = httpx.AsyncClient(timeout=OPENAI_TIMEOUT, limits=OPENAI_LIMITS)
+        self._openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=self._http)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def redis(self) -> Optional[Redis]:
+        """The shared async Redis client, or None while it is marked down (or before startup)."""
+        if self._redis is None or time.monotonic() < self._redis_down_until:
+            return None
+        return self._redis
+
+    def mark_redis_down(self) -> None:
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    async def cache_version(self, name: str = "catalog") -> Optional[int]:
+        """Shared version of a cached data set (see app.core.cache), or None while Redis is unavailable."""
+        redis = self.redis()
+        if redis is None:
+            return None
+        try:
+            return int(await redis.get(cache_version_key(name)) or 0)
+        except RedisError:
+            self.mark_redis_down()
+            return None
+
+    def openai(self) -> Optional[AsyncOpenAI]:
+        return self._openai
+
+
+clients = AsyncClients()
+
+
+def get_async_redis() -> Optional[Redis]:
+    """Dependency: shared async Redis client, or None when Redis is unavailable."""
+    return clients.redis()
+
+
+def get_openai_client() -> Optional[AsyncOpenAI]:
+    """Dependency: shared OpenAI client, or None before startup."""
+    return clients.openai()
@@ -1,11 +1,19 @@
 import os
 from functools import lru_cache
+from typing import List
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+def to_async_url(url: str) -> str:
+    """Rewrite a PostgreSQL URL for the asyncpg driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
 class Settings(BaseModel):
     
     # Database Configuration
@@ -24,6 +32,19 @@ class Settings(BaseModel):
         else:
             return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        """DATABASE_URL for the asyncpg driver"""
+        return to_async_url(self.DATABASE_URL)
+
+    # Read replicas (comma-separated URLs); read-only endpoints are spread across them
+    DB_REPLICA_URLS: List[str] = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+    # Replicas further behind the primary than this are taken out of rotation
+    DB_REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+    DB_REPLICA_HEALTH_CHECK_SECONDS: float = float(os.getenv("DB_REPLICA_HEALTH_CHECK_SECONDS", "5"))
+    # After a write, the same client reads from the primary for this long
+    DB_READ_YOUR_WRITES_SECONDS: int = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+    
     # Other Settings
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key")  # In production, use a strong secret key
     algorithm: str = os.getenv("ALGORITHM", "HS256")
@@ -37,6 +58,23 @@ class Settings(BaseModel):
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
     REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
 
+    # Response cache TTL for book listings in seconds (0 disables)
+    BOOK_LIST_CACHE_TTL: int = int(os.getenv("BOOK_LIST_CACHE_TTL", "300"))
+
+    # Buffer review vote counter updates and apply them in batches (counters lag by up to the flush interval)
+    REVIEW_VOTE_WRITE_BEHIND: bool = os.getenv("REVIEW_VOTE_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+    REVIEW_VOTE_FLUSH_SECONDS: float = float(os.getenv("REVIEW_VOTE_FLUSH_SECONDS", "1"))
+
+    # Minimum age before a catalog change other than added/removed books rebuilds the SIMILAR genre matrix
+    GENRE_MATRIX_REFRESH_SECONDS: float = float(os.getenv("GENRE_MATRIX_REFRESH_SECONDS", "30"))
+
+    # Directory of the memory-mapped book embedding store (vectors.f32 + index.i64)
+    EMBEDDING_STORE_PATH: str = os.getenv("EMBEDDING_STORE_PATH", "data/embeddings")
+    # IVF index over the store: lists probed per query (higher = better recall, slower)
+    # and the store size below which AI recommendations scan all embeddings exactly
+    ANN_NPROBE: int = int(os.getenv("ANN_NPROBE", "8"))
+    ANN_MIN_ROWS: int = int(os.getenv("ANN_MIN_ROWS", "50000"))
+
 @lru_cache()
 def get_settings() -> Settings:
     return Settings()
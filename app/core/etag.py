@@ -0,0 +1,38 @@
+"""Entity tags and conditional GET (If-None-Match) helpers."""
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the version information identifying a representation."""
+    digest = hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response for a representation the client already has."""
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def json_response(payload: str, if_none_match: Optional[str], etag: Optional[str] = None) -> Response:
+    """
+    JSON response tagged with etag, or, when no version identifies the payload,
+    with a digest of the payload itself; 304 when the client already has it.
+    """
+    if etag is None:
+        etag = make_etag(payload)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, DECIMAL, Date, Text, ARRAY, UniqueConstraint
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, DECIMAL, Date, Text, UniqueConstraint, Index
+from sqlalchemy.orm import relationship, declarative_base, deferred
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from datetime import datetime, timezone
-from sqlalchemy import event
+from sqlalchemy import event, DDL, FetchedValue, text
 
 Base = declarative_base()
 
@@ -24,24 +25,58 @@ class User(Base):
     reviews = relationship("Review", back_populates="user")
     favorites = relationship("UserFavorite", back_populates="user")
 
+# TOP_RATED recommendation score: average rating plus a review-count boost capped at 0.1.
+# Kept as SQL text so queries repeat the indexed expression exactly (see ix_books_top_rated_score).
+TOP_RATED_SCORE_SQL = "(coalesce(average_rating, 0) + least(coalesce(total_reviews, 0) / 1000.0, 0.1))"
+
 class Book(Base):
     __tablename__ = "books"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False, index=True)
     author = Column(String(255), nullable=False, index=True)
-    isbn = Column(String(13), nullable=False)
+    isbn = Column(String(13), nullable=False, index=True)
     publication_date = Column(Date)
+    # Rating aggregates over active reviews, kept current by the reviews_book_rating_trigger
+    # (see BOOK_RATING_DDL); rating_sum lets every review write apply an O(1) delta
     average_rating = Column(DECIMAL(3, 2), default=0.0)
     total_reviews = Column(Integer, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default='0')
     created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
     genres = Column(ARRAY(String(50)), nullable=True)
     description = Column(Text, nullable=True)
+    # Maintained by the books_search_vector_trigger (see BOOKS_SEARCH_VECTOR_DDL); only used in SQL, never loaded
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
+    # Incremented on every update by the row_version trigger (see ROW_VERSION_DDL); feeds ETags
+    row_version = Column(Integer, nullable=False, server_default='1', server_onupdate=FetchedValue())
 
     # Relationships
     reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
     favorites = relationship("UserFavorite", back_populates="book")
 
+    # Composite (sort column, id) indexes serving keyset pagination
+    __table_args__ = (
+        Index('ix_books_title_id', 'title', 'id'),
+        Index('ix_books_author_id', 'author', 'id'),
+        Index('ix_books_average_rating_id', 'average_rating', 'id'),
+        Index('ix_books_total_reviews_id', 'total_reviews', 'id'),
+        Index('ix_books_publication_date_id', 'publication_date', 'id'),
+        Index('ix_books_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_books_genres', 'genres', postgresql_using='gin'),
+        # Trigram indexes serving fuzzy (typo-tolerant) title/author search
+        Index('ix_books_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('ix_books_author_trgm', 'author', postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'}),
+        # Serves the TOP_RATED recommendations' ORDER BY score DESC, id LIMIT k
+        Index('ix_books_top_rated_score', text(f"{TOP_RATED_SCORE_SQL} DESC"), 'id'),
+    )
+
+class GenreCount(Base):
+    """Per-genre book counts, maintained by the books_genre_counts_trigger"""
+    __tablename__ = "genre_counts"
+
+    genre = Column(String(50), primary_key=True)
+    book_count = Column(Integer, nullable=False, default=0)
+
 class Review(Base):
     __tablename__ = "reviews"
 
@@ -55,6 +90,8 @@ class Review(Base):
     is_deleted = Column(Boolean, default=False)
     helpful_votes = Column(Integer, nullable=False, default=0)
     unhelpful_votes = Column(Integer, nullable=False, default=0)
+    # Incremented on every update by the row_version trigger (see ROW_VERSION_DDL); feeds ETags
+    row_version = Column(Integer, nullable=False, server_default='1', server_onupdate=FetchedValue())
 
     # Relationships
     user = relationship("User", back_populates="reviews")
@@ -64,6 +101,12 @@ class Review(Base):
     # Constraints
     __table_args__ = (
         UniqueConstraint('user_id', 'book_id', name='uix_user_book_review'),
+        # Keyset pagination of active reviews: per book by each sort, per user, and overall by date
+        Index('ix_reviews_book_created_id', 'book_id', 'created_at', 'id', postgresql_where=(is_deleted == False)),
+        Index('ix_reviews_book_rating_id', 'book_id', 'rating', 'id', postgresql_where=(is_deleted == False)),
+        Index('ix_reviews_book_helpful_id', 'book_id', 'helpful_votes', 'id', postgresql_where=(is_deleted == False)),
+        Index('ix_reviews_user_created_id', 'user_id', 'created_at', 'id', postgresql_where=(is_deleted == False)),
+        Index('ix_reviews_created_id', 'created_at', 'id', postgresql_where=(is_deleted == False)),
     )
 
     @property
@@ -91,6 +134,8 @@ class ReviewVote(Base):
     # Constraints
     __table_args__ = (
         UniqueConstraint('user_id', 'review_id', name='uix_user_review_vote'),
+        # The unique constraint leads with user_id; per-review lookups need their own index
+        Index('ix_review_votes_review_id', 'review_id'),
     )
 
 class UserFavorite(Base):
@@ -108,6 +153,7 @@ class UserFavorite(Base):
     # Constraints
     __table_args__ = (
         UniqueConstraint('user_id', 'book_id', name='uix_user_book_favorite'),
+        Index('ix_user_favorites_user_created_id', 'user_id', 'created_at', 'id'),
     )
 
 class InvalidatedToken(Base):
@@ -116,3 +162,139 @@ class InvalidatedToken(Base):
     id = Column(Integer, primary_key=True, index=True)
     token = Column(String(500), nullable=False, unique=True, index=True)
     invalidated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+# Full-text search document: title/author weigh most, then genres, then description.
+BOOKS_SEARCH_VECTOR_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION books_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.author, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(array_to_string(NEW.genres, ' '), '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER books_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, author, genres, description ON books
+    FOR EACH ROW EXECUTE FUNCTION books_search_vector_update()
+    """,
+]
+
+# Keeps genre_counts in step with books.genres
+GENRE_COUNTS_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION books_genre_counts_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.genres IS NOT NULL THEN
+            UPDATE genre_counts SET book_count = book_count - 1
+            WHERE genre IN (SELECT DISTINCT g FROM unnest(OLD.genres) AS g);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.genres IS NOT NULL THEN
+            INSERT INTO genre_counts (genre, book_count)
+            SELECT DISTINCT g, 1 FROM unnest(NEW.genres) AS g WHERE g IS NOT NULL
+            ON CONFLICT (genre) DO UPDATE SET book_count = genre_counts.book_count + 1;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER books_genre_counts_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF genres ON books
+    FOR EACH ROW EXECUTE FUNCTION books_genre_counts_update()
+    """,
+]
+
+# Bumps row_version on every UPDATE of books and reviews, whichever code path issues it
+ROW_VERSION_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+    BEGIN
+        NEW.row_version := OLD.row_version + 1;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER books_row_version_trigger
+    BEFORE UPDATE ON books
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER reviews_row_version_trigger
+    BEFORE UPDATE ON reviews
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version()
+    """,
+]
+
+# Applies each review write's (rating sum, count) delta to its book, in the writing transaction.
+# A single UPDATE ... SET col = col + delta is atomic under concurrent review writes.
+BOOK_RATING_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION apply_book_rating_delta(target_id integer, sum_delta integer, count_delta integer)
+    RETURNS void AS $$
+        UPDATE books SET
+            rating_sum = rating_sum + sum_delta,
+            total_reviews = coalesce(total_reviews, 0) + count_delta,
+            average_rating = CASE
+                WHEN coalesce(total_reviews, 0) + count_delta > 0
+                THEN round((rating_sum + sum_delta)::numeric / (coalesce(total_reviews, 0) + count_delta), 1)
+                ELSE 0
+            END
+        WHERE id = target_id
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION reviews_book_rating_update() RETURNS trigger AS $$
+    DECLARE
+        old_sum integer := 0;
+        old_count integer := 0;
+        new_sum integer := 0;
+        new_count integer := 0;
+    BEGIN
+        IF TG_OP <> 'INSERT' AND NOT coalesce(OLD.is_deleted, false) THEN
+            old_sum := OLD.rating;
+            old_count := 1;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NOT coalesce(NEW.is_deleted, false) THEN
+            new_sum := NEW.rating;
+            new_count := 1;
+        END IF;
+        IF TG_OP = 'UPDATE' AND OLD.book_id = NEW.book_id THEN
+            IF new_sum <> old_sum OR new_count <> old_count THEN
+                PERFORM apply_book_rating_delta(NEW.book_id, new_sum - old_sum, new_count - old_count);
+            END IF;
+            RETURN NULL;
+        END IF;
+        IF old_count > 0 THEN
+            PERFORM apply_book_rating_delta(OLD.book_id, -old_sum, -old_count);
+        END IF;
+        IF new_count > 0 THEN
+            PERFORM apply_book_rating_delta(NEW.book_id, new_sum, new_count);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER reviews_book_rating_trigger
+    AFTER INSERT OR DELETE OR UPDATE OF rating, is_deleted, book_id ON reviews
+    FOR EACH ROW EXECUTE FUNCTION reviews_book_rating_update()
+    """,
+]
+
+# Install extensions and database-side triggers when tables are created outside of alembic (e.g. tests)
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+for statement in BOOKS_SEARCH_VECTOR_DDL:
+    event.listen(Book.__table__, "after_create", DDL(statement))
+# Needs both books and genre_counts, so install once all tables exist. Metadata-level
+# after_create fires on every create_all, even when the tables already exist, so the
+# statements must be re-runnable (CREATE OR REPLACE)
+for statement in GENRE_COUNTS_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement))
+for statement in ROW_VERSION_DDL + BOOK_RATING_DDL:
+    event.listen(Base.metadata, "after_create", DDL(statement))
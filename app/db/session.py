@@ -1,13 +1,60 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from app.core.config import get_settings
+from app.core.config import get_settings, to_async_url
+import itertools
 import logging
+import threading
+import time
 from app.db.models import Base, Book  # Import Base and models
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class QueryStats:
+    """SQL executed on behalf of one request"""
+    count: int = 0
+    total_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+# Set by the request middleware; worker threads running sync endpoints share the object
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Nested-transaction bookkeeping, not queries; left out so counts do not depend on savepoint use
+SAVEPOINT_STATEMENTS = ("SAVEPOINT ", "RELEASE SAVEPOINT ", "ROLLBACK TO SAVEPOINT ")
+
+
+# Registered on the Engine class so the primary, the replicas and the asyncpg engines are all covered
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None and not statement.startswith(SAVEPOINT_STATEMENTS):
+        stats.record(statement, time.perf_counter() - started)
+
 def get_engine():
     try:
         settings = get_settings()
@@ -41,6 +88,23 @@ def get_engine():
 engine = get_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_engine():
+    """Async (asyncpg) engine for endpoints running on the event loop; connects lazily."""
+    settings = get_settings()
+    return create_async_engine(
+        settings.ASYNC_DATABASE_URL,
+        pool_pre_ping=True,
+        pool_size=20,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=1800,
+        echo=False
+    )
+
+async_engine = get_async_engine()
+# Objects stay usable after commit; async sessions cannot lazily refresh expired attributes
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -50,3 +114,187 @@ def get_db():
         raise
     finally:
         db.close()
+
+def get_session_factory():
+    """
+    Session factory for work that outlives the request's dependencies, such as
+    streamed responses; the caller is responsible for closing the session.
+    """
+    return SessionLocal
+
+async def get_async_db():
+    """AsyncSession dependency for `async def` endpoints, so queries do not block the event loop"""
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database session error: {str(e)}")
+            raise
+
+
+class ReplicaRouter:
+    """
+    Round-robin selection over healthy read replicas.
+
+    A daemon thread checks every replica's reachability and replication lag each
+    DB_REPLICA_HEALTH_CHECK_SECONDS; replicas failing either check are skipped,
+    and reads fall back to the primary when none is left.
+    """
+    LAG_SQL = text("""
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """)
+
+    def __init__(self, urls: List[str], max_lag: float, check_interval: float, background_checks: bool = True):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.background_checks = background_checks
+        self._engines = [
+            create_engine(url, pool_pre_ping=True, pool_size=10, max_overflow=10, pool_recycle=1800,
+                          connect_args={"connect_timeout": 2})
+            for url in urls
+        ]
+        self._async_engines = [
+            create_async_engine(to_async_url(url), pool_pre_ping=True, pool_size=10, max_overflow=10,
+                                pool_recycle=1800)
+            for url in urls
+        ]
+        # Replica sessions are tagged so callers can tell their reads may lag (see may_lag_behind)
+        self._sessions = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine, info={"replica": True})
+            for engine in self._engines
+        ]
+        self._async_sessions = [
+            async_sessionmaker(engine, expire_on_commit=False, autoflush=False, info={"replica": True})
+            for engine in self._async_engines
+        ]
+        self._healthy = [True] * len(urls)  # Optimistic until the first check
+        self._counter = itertools.count()
+        self._checker: Optional[threading.Thread] = None
+        self._checker_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._engines)
+
+    def session(self) -> Optional[Session]:
+        """Session on the next healthy replica, or None to use the primary"""
+        index = self._pick()
+        return self._sessions[index]() if index is not None else None
+
+    def async_session(self) -> Optional[AsyncSession]:
+        """AsyncSession on the next healthy replica, or None to use the primary"""
+        index = self._pick()
+        return self._async_sessions[index]() if index is not None else None
+
+    def check(self) -> None:
+        """Probe every replica once and update its health"""
+        for index, engine in enumerate(self._engines):
+            try:
+                with engine.connect() as conn:
+                    lag = float(conn.execute(self.LAG_SQL).scalar() or 0)
+                healthy = lag <= self.max_lag
+                if not healthy:
+                    logger.warning(f"Read replica {index} is {lag:.1f}s behind the primary")
+            except Exception as e:
+                healthy = False
+                logger.warning(f"Read replica {index} health check failed: {str(e)}")
+            if healthy != self._healthy[index]:
+                logger.info(f"Read replica {index} is now {'healthy' if healthy else 'out of rotation'}")
+            self._healthy[index] = healthy
+
+    def _pick(self) -> Optional[int]:
+        if not self._engines:
+            return None
+        self._ensure_checker()
+        start = next(self._counter)
+        for offset in range(len(self._engines)):
+            index = (start + offset) % len(self._engines)
+            if self._healthy[index]:
+                return index
+        return None
+
+    def _ensure_checker(self) -> None:
+        if self._checker is not None or not self.background_checks:
+            return
+        with self._checker_lock:
+            if self._checker is None:
+                self._checker = threading.Thread(target=self._run_checks, name="replica-health", daemon=True)
+                self._checker.start()
+
+    def _run_checks(self) -> None:
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+
+_settings = get_settings()
+replica_router = ReplicaRouter(
+    _settings.DB_REPLICA_URLS,
+    max_lag=_settings.DB_REPLICA_MAX_LAG_SECONDS,
+    check_interval=_settings.DB_REPLICA_HEALTH_CHECK_SECONDS
+)
+
+def may_lag_behind(db, changed_at: float) -> bool:
+    """
+    Whether db reads from a replica that may not reflect a change made at
+    changed_at (epoch seconds) yet. Replicas stay in rotation while at most
+    max_lag behind, as measured up to one health-check interval ago.
+    """
+    if not db.info.get("replica"):
+        return False
+    return time.time() - changed_at <= replica_router.max_lag + replica_router.check_interval
+
+
+# Set on responses to writes; while it is in the future the client reads from the primary
+READ_YOUR_WRITES_COOKIE = "primary_until"
+
+
+def _reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def mark_recent_write(response: Response) -> None:
+    """Pin the client's reads to the primary until replicas have caught up with its write"""
+    if not replica_router.enabled:
+        return
+    window = get_settings().DB_READ_YOUR_WRITES_SECONDS
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE, str(time.time() + window), max_age=window, httponly=True, samesite="lax"
+    )
+
+
+def get_read_db(request: Request):
+    """
+    Session for read-only endpoints: a healthy replica in round-robin order, or the
+    primary when no replica is configured/healthy or the client wrote recently.
+    """
+    db = None if _reads_from_primary(request) else replica_router.session()
+    if db is None:
+        db = SessionLocal()
+    try:
+        yield db
+    except Exception as e:
+        logger.error(f"Database session error: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    """AsyncSession counterpart of get_read_db"""
+    db = None if _reads_from_primary(request) else replica_router.async_session()
+    if db is None:
+        db = AsyncSessionLocal()
+    async with db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database session error: {str(e)}")
+            raise
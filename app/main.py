@@ -1,10 +1,13 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import auth, storage, profile, recommendation, book, review
-from app.db.session import get_db
+from app.core.clients import clients
+from app.db.session import QueryStats, get_db, mark_recent_write, query_stats
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,7 +21,17 @@ from fastapi.staticfiles import StaticFiles
 import os
 
 
-app = FastAPI(title="Book Review Platform")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared Redis pool and OpenAI HTTP client once per process"""
+    await clients.start()
+    try:
+        yield
+    finally:
+        await clients.close()
+
+
+app = FastAPI(title="Book Review Platform", lifespan=lifespan)
 
 # Log database configuration on startup
 from app.core.config import get_settings
@@ -36,8 +49,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """After a successful write, keep the client's reads on the primary until replicas catch up"""
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_recent_write(response)
+    return response
+
+sql_logger = logging.getLogger("app.sql")
+SLOWEST_STATEMENT_LOG_CHARS = 500
+
+@app.middleware("http")
+async def sql_timing(request: Request, call_next):
+    """Report the request's query count and DB time in Server-Timing and a structured log line"""
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.reset(token)
+    if stats.count:
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.total_seconds * 1000:.2f};desc="{stats.count} queries", '
+            f'db-slowest;dur={stats.slowest_seconds * 1000:.2f}'
+        )
+        sql_logger.info(json.dumps({
+            "event": "request_sql",
+            "method": request.method,
+            "path": request.url.path,
+            "route": getattr(request.scope.get("route"), "path", None),
+            "status": response.status_code,
+            "queries": stats.count,
+            "db_ms": round(stats.total_seconds * 1000, 2),
+            "slowest_ms": round(stats.slowest_seconds * 1000, 2),
+            "slowest_sql": " ".join(stats.slowest_statement.split())[:SLOWEST_STATEMENT_LOG_CHARS]
+        }))
+    return response
+
 @app.get("/")
 async def root():
     """Root endpoint with database connection check"""
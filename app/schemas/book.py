@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 class BookBase(BaseModel):
@@ -27,28 +27,52 @@ class Book(BookBase):
     
     model_config = ConfigDict(from_attributes=True)  # Modern way to configure Pydantic models
 
+class GenreFacet(BaseModel):
+    genre: str
+    count: int
+
+class BookImportResult(BaseModel):
+    received: int
+    rejected: int
+    inserted: int
+    updated: int
+
 class BookListResponse(BaseModel):
     books: List[Book]
-    total: int
+    total: Optional[int] = None  # None when include_total=false
     page: Optional[int] = None
     items_per_page: Optional[int] = None
     total_pages: Optional[int] = None
     current_page_count: Optional[int] = None  # Number of items on the current page
+    next_cursor: Optional[str] = None  # Opaque cursor for the next page (pass as `after`)
+    facets: Optional[List[GenreFacet]] = None  # Per-genre counts, when requested
 
     model_config = ConfigDict(from_attributes=True)
 
+class SparseBookListResponse(BookListResponse):
+    books: List[Dict[str, Any]]  # Only the fields requested with `fields=`
+
 class BookSearchParams(BaseModel):
     search: Optional[str] = None
+    fuzzy: bool = Field(default=False, description="Use trigram similarity instead of full-text search")
+    genres: Optional[List[str]] = Field(default=None, description="Only books in these genres")
+    genre_mode: str = Field(default="any", pattern="^(any|all)$", description="Match any or all of the genres")
+    min_rating: Optional[float] = Field(default=None, ge=0.0, le=5.0)
+    facets: bool = False
     sort_by: Optional[str] = Field(None, description="Field to sort by (title, author, rating, date)")
     sort_order: Optional[str] = Field(None, description="Sort order (asc or desc)")
     offset: Optional[int] = Field(default=None, ge=0)
     limit: Optional[int] = Field(default=None, gt=0, le=100)
     page: Optional[int] = Field(default=None, gt=0)
     items_per_page: Optional[int] = Field(default=None, gt=0, le=100)
+    after: Optional[str] = Field(None, description="Opaque cursor from a previous page; enables keyset pagination")
+    include_total: bool = True
+    count_strategy: str = Field(default="exact", pattern="^(exact|cached|estimated)$")
+    fields: Optional[List[str]] = Field(default=None, description="Only return these book fields")
     
     @property
     def valid_sort_fields(self):
-        return ['title', 'author', 'rating', 'average_rating', 'total_reviews', 'date', 'publication_date']
+        return ['title', 'author', 'rating', 'average_rating', 'total_reviews', 'date', 'publication_date', 'relevance']
     
     @property
     def valid_sort_orders(self):
@@ -59,3 +83,20 @@ class BookSearchParams(BaseModel):
             raise ValueError(f"Invalid sort_by value. Must be one of: {', '.join(self.valid_sort_fields)}")
         if self.sort_order and self.sort_order.lower() not in self.valid_sort_orders:
             raise ValueError(f"Invalid sort_order value. Must be one of: {', '.join(self.valid_sort_orders)}")
+
+class BookBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+class BookBatchResponse(BaseModel):
+    books: List[Book]  # In request order, each id at most once
+    missing: List[int]  # Requested ids that do not exist
+
+class BookSuggestion(BaseModel):
+    text: str
+    kind: str = Field(..., description="'title' or 'author'")
+    book_id: Optional[int] = None  # Set for title completions
+    score: float
+
+class BookSuggestResponse(BaseModel):
+    query: str
+    suggestions: List[BookSuggestion]
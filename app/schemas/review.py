@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict
 from app.schemas.book import Book
 
@@ -37,6 +37,14 @@ class ReviewResponse(ReviewBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+class ReviewListResponse(BaseModel):
+    items: List[ReviewResponse]
+    total: Optional[int] = None
+    page: int
+    items_per_page: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+
 class ReviewSearchParams(BaseModel):
     book_id: Optional[int] = None
     user_id: Optional[int] = None
@@ -45,3 +53,6 @@ class ReviewSearchParams(BaseModel):
     items_per_page: int = Field(default=50, gt=0, le=100)
     sort_by: Optional[str] = Field(None, pattern='^(date|rating|votes)$')
     sort_order: Optional[str] = Field(None, pattern='^(asc|desc)$')
+    include_total: bool = True
+    count_strategy: str = Field(default='exact', pattern='^(exact|cached|estimated)$')
+    after: Optional[str] = None  # Cursor from a previous page's next_cursor
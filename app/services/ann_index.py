@@ -0,0 +1,215 @@
+"""Approximate nearest-neighbour search (IVF-flat) over the book embedding store."""
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.embedding_store import EmbeddingStore, embedding_store, normalize
+
+ASSIGN_CHUNK_ROWS = 8192  # Rows scored against the centroids at a time, bounding memory
+INDEX_FILE = "ivf.npz"
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index with exact (flat) scoring inside each list.
+
+    Store rows are clustered around `nlist` unit-length centroids by spherical
+    k-means. A query scores the centroids, then only the rows of the `nprobe`
+    closest lists, so with nlist ~ sqrt(rows) the cost grows with the square
+    root of the catalog. Raising nprobe trades speed for recall; nprobe equal
+    to nlist is an exact search.
+
+    The index holds the list assignment of every store row, not the vectors
+    themselves; those are read from the memory-mapped store.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray):
+        self.centroids = normalize(centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self._build_lists()
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    def _build_lists(self) -> None:
+        # Rows grouped by list; stable, so each list stays in row (file) order
+        self.list_rows = np.argsort(self.assignments, kind="stable")
+        self.list_offsets = np.concatenate(
+            ([0], np.cumsum(np.bincount(self.assignments, minlength=self.nlist)))
+        )
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return assignments
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        nlist: int,
+        iterations: int = 10,
+        sample_size: Optional[int] = None,
+        seed: int = 0
+    ) -> "IVFFlatIndex":
+        """Cluster a sample of the (unit-length) vectors, then assign every row."""
+        if not len(vectors):
+            raise ValueError("Cannot train an index without vectors")
+        nlist = max(1, min(nlist, len(vectors)))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(vectors), sample_size or nlist * 64)
+        sample_rows = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assignments, minlength=nlist)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.zeros_like(centroids)
+            sums[counts > 0] = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts[counts > 0], axis=0)
+            # Re-seed empty lists with random sample rows rather than leaving dead centroids
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize(sums)
+
+        index = cls(centroids, np.empty(0, dtype=np.int32))
+        index.add(vectors)
+        return index
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Append rows (the next rows of the store, in order) to their nearest lists."""
+        if not len(vectors):
+            return
+        self.assignments = np.concatenate((self.assignments, self._assign(vectors)))
+        self._build_lists()
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine similarities) of the best k rows found in the nprobe closest lists."""
+        query = normalize(query)
+        probe = _top_k(self.centroids @ query, min(max(nprobe, 1), self.nlist))
+        candidates = np.concatenate([
+            self.list_rows[self.list_offsets[list_id]:self.list_offsets[list_id + 1]] for list_id in probe
+        ])
+        candidates.sort()  # Read the mapped vectors front to back
+        scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write atomically, so concurrent readers see the old or the new index."""
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["IVFFlatIndex"]:
+        try:
+            with np.load(path) as data:
+                return cls(data["centroids"], data["assignments"])
+        except FileNotFoundError:
+            return None
+
+
+class EmbeddingSearch:
+    """
+    Per-worker nearest-neighbour search over an EmbeddingStore.
+
+    Uses the IVF index persisted next to the store (built by
+    scripts/build_ann_index.py, reloaded when that file changes) and keeps it
+    current by inserting rows appended to the store since. Without an index,
+    or below min_rows where a scan is just as fast, the search is exact.
+    """
+
+    def __init__(self, store: EmbeddingStore, nprobe: int, min_rows: int, save_every: int = 1000):
+        self.store = store
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._index: Optional[IVFFlatIndex] = None
+        self._index_mtime: Optional[float] = None
+        self._saved_rows = 0
+
+    @property
+    def index_path(self) -> Path:
+        return self.store.path / INDEX_FILE
+
+    def _save(self, index: IVFFlatIndex) -> None:
+        index.save(self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+        self._saved_rows = len(index)
+
+    def _current_index(self, vectors: np.ndarray) -> Optional[IVFFlatIndex]:
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime != self._index_mtime:
+                self._index = IVFFlatIndex.load(self.index_path) if mtime is not None else None
+                self._index_mtime = mtime
+                self._saved_rows = len(self._index) if self._index is not None else 0
+            index = self._index
+            if index is None or index.centroids.shape[1] != vectors.shape[1] or len(index) > len(vectors):
+                return None
+            if len(index) < len(vectors):
+                # Incremental insert of rows added since the index was built or last synced
+                index.add(vectors[len(index):])
+                if len(index) - self._saved_rows >= self.save_every:
+                    self._save(index)
+            return index
+
+    def set_index(self, index: IVFFlatIndex) -> None:
+        """Install a freshly trained index and persist it for every worker."""
+        self.store.path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._index = index
+            self._save(index)
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(store rows, cosine similarities) of the k nearest embeddings, best first."""
+        vectors = self.store.vectors
+        if not len(vectors) or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        index = self._current_index(vectors) if len(vectors) >= self.min_rows else None
+        if index is None:
+            scores = vectors @ normalize(query)
+            best = _top_k(scores, k)
+            return best, scores[best]
+        return index.search(vectors, query, k, nprobe or self.nprobe)
+
+
+def default_nlist(rows: int) -> int:
+    """sqrt(rows) lists balance centroid scoring against list scanning."""
+    return max(1, int(np.sqrt(rows)))
+
+
+embedding_search = EmbeddingSearch(
+    embedding_store,
+    nprobe=get_settings().ANN_NPROBE,
+    min_rows=get_settings().ANN_MIN_ROWS
+)
@@ -1,116 +1,380 @@
-from typing import List, Optional
+from typing import Iterator, List, Optional, Union
+import csv
+import hashlib
+import io
+import json
 import logging
 from fastapi import HTTPException
-from sqlalchemy import or_, func, text
-from sqlalchemy.orm import Session
-from app.db.models import Book
-from app.schemas.book import BookCreate, BookUpdate, BookSearchParams
+from sqlalchemy import Float, Integer, any_, cast, literal, or_, func, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer, load_only
+from app.core.cache import ResponseCache, bump_cache_version, get_cache_version
+from app.core.config import get_settings
+from app.db.models import Book, GenreCount
+from app.schemas.book import Book as BookSchema, BookCreate, BookUpdate, BookSearchParams
+from app.services.book_import import GENRE_SEPARATOR
+from app.services.counting import count_rows
+from app.services.suggest import suggestion_index
+from app.services.pagination import decode_cursor, fetch_keyset_page, keyset_order_by, next_cursor
 
 logger = logging.getLogger(__name__)
 
+# Serialized /v1/books pages keyed by catalog version and normalized parameters
+book_list_cache = ResponseCache("books:list", get_settings().BOOK_LIST_CACHE_TTL)
+
 class BookService:
-    def __init__(self, db: Session):
+    # Frontend sort fields mapped to Book columns
+    SORT_COLUMNS = {
+        'title': 'title',
+        'author': 'author',
+        'rating': 'average_rating',
+        'average_rating': 'average_rating',
+        'total_reviews': 'total_reviews',
+        'date': 'publication_date',
+        'publication_date': 'publication_date',
+        'relevance': 'relevance'
+    }
+    # Text search configuration used by the books_search_vector trigger
+    SEARCH_CONFIG = 'english'
+    # Minimum pg_trgm word similarity for fuzzy matches
+    FUZZY_THRESHOLD = 0.4
+    # Streaming export: output formats, columns (in order) and server-side cursor batch size
+    EXPORT_FORMATS = ('ndjson', 'csv')
+    EXPORT_COLUMNS = ('id', 'title', 'author', 'isbn', 'publication_date', 'genres', 'description',
+                      'average_rating', 'total_reviews')
+    EXPORT_BATCH_SIZE = 1000
+    # Fields a client may select with `fields=` (those of the Book response schema)
+    RESPONSE_FIELDS = tuple(BookSchema.model_fields)
+
+    def __init__(self, db: Union[Session, AsyncSession]):
+        # The *_async read methods need an AsyncSession; everything else a Session
         self.db = db
 
-    def get_book(self, book_id: int) -> Optional[Book]:
-        return self.db.query(Book).filter(Book.id == book_id).first()
+    def get_book(self, book_id: int, fields: Optional[List[str]] = None) -> Optional[Book]:
+        return self.db.execute(self._book_statement(book_id, fields)).scalar_one_or_none()
+
+    async def get_book_async(self, book_id: int, fields: Optional[List[str]] = None) -> Optional[Book]:
+        return (await self.db.execute(self._book_statement(book_id, fields))).scalar_one_or_none()
+
+    def _book_statement(self, book_id: int, fields: Optional[List[str]] = None):
+        statement = select(Book).where(Book.id == book_id)
+        if fields:
+            statement = statement.options(self._load_only(fields, 'row_version'))  # row_version feeds the ETag
+        return statement
+
+    @classmethod
+    def parse_fields(cls, fields: Optional[str]) -> Optional[List[str]]:
+        """
+        Parse a comma-separated `fields=` value.
+
+        Raises:
+            ValueError: If a field is not part of the book response
+        """
+        if not fields:
+            return None
+        selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in selected if name not in cls.RESPONSE_FIELDS]
+        if unknown:
+            raise ValueError(f"Invalid fields: {', '.join(unknown)}. Must be among: {', '.join(cls.RESPONSE_FIELDS)}")
+        return selected or None
+
+    @staticmethod
+    def project(book: Book, fields: List[str]) -> dict:
+        """JSON-ready dict holding only the selected fields of a book"""
+        record = {}
+        for name in fields:
+            value = getattr(book, name)
+            if name == 'average_rating':
+                value = float(value) if value is not None else 0.0
+            elif name == 'total_reviews':
+                value = value or 0
+            elif name == 'publication_date' and value is not None:
+                value = value.isoformat()
+            record[name] = value
+        return record
+
+    @staticmethod
+    def _load_only(fields: List[str], *extra: str):
+        """Loader option selecting just these columns (the primary key is always loaded)"""
+        names = dict.fromkeys(list(fields) + [name for name in extra if name in Book.__table__.c])
+        return load_only(*(getattr(Book, name) for name in names))
+
+    def get_books_by_ids(self, ids: List[int]) -> tuple[List[Book], List[int]]:
+        """
+        Fetch many books in one round trip (WHERE id = ANY(:ids), a single array parameter).
+
+        Returns:
+            Tuple of (books in the order of ids, ids that do not exist); duplicate ids are returned once
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids:
+            return [], []
+        rows = self.db.execute(self._books_by_ids_statement(unique_ids)).scalars().all()
+        return self._in_request_order(unique_ids, rows)
+
+    async def get_books_by_ids_async(self, ids: List[int]) -> tuple[List[Book], List[int]]:
+        unique_ids = list(dict.fromkeys(ids))
+        if not unique_ids:
+            return [], []
+        rows = (await self.db.execute(self._books_by_ids_statement(unique_ids))).scalars().all()
+        return self._in_request_order(unique_ids, rows)
+
+    def _books_by_ids_statement(self, unique_ids: List[int]):
+        return select(Book).options(defer(Book.description)).where(
+            Book.id == any_(literal(unique_ids, type_=ARRAY(Integer)))
+        )
+
+    @staticmethod
+    def _in_request_order(unique_ids: List[int], rows: List[Book]) -> tuple[List[Book], List[int]]:
+        by_id = {book.id: book for book in rows}
+        books = [by_id[book_id] for book_id in unique_ids if book_id in by_id]
+        missing = [book_id for book_id in unique_ids if book_id not in by_id]
+        return books, missing
+
+    def get_book_version(self, book_id: int) -> Optional[int]:
+        """Current row_version of a book (None if it does not exist), without loading the row"""
+        return self.db.scalar(select(Book.row_version).where(Book.id == book_id))
+
+    async def get_book_version_async(self, book_id: int) -> Optional[int]:
+        return await self.db.scalar(select(Book.row_version).where(Book.id == book_id))
+
+    def get_books(self, params: BookSearchParams) -> tuple[List[Book], Optional[int]]:
+        books, total_count, _ = self.get_books_page(params)
+        return books, total_count
 
-    def get_books(self, params: BookSearchParams) -> tuple[List[Book], int]:
+    def get_books_page(self, params: BookSearchParams) -> tuple[List[Book], Optional[int], Optional[str]]:
+        """
+        Fetch one page of books.
+
+        Returns:
+            Tuple of (books, total count or None when not requested, cursor for the next page or None)
+        """
         logger.info("Fetching books with params: %s", params)
         
-        # First verify we can access the books table directly
-        try:
-            result = self.db.execute(text("SELECT COUNT(*) FROM books"))
-            count = result.scalar()
-            logger.info(f"Direct SQL count from books table: {count}")
-            
-            # Get sample books directly
-            result = self.db.execute(text("SELECT id, title FROM books LIMIT 3"))
-            books = result.fetchall()
-            if books:
-                logger.info("Sample books from direct SQL:")
-                for book in books:
-                    logger.info(f"  Book {book.id}: {book.title}")
-            else:
-                logger.warning("No sample books found in direct SQL query")
-        except Exception as e:
-            logger.error(f"Error in direct SQL query: {str(e)}")
-        
         # Start the SQLAlchemy query
         query = self.db.query(Book)
-        logger.info(f"Initial SQLAlchemy query: {str(query)}")
+        query, search_rank = self._apply_filters(query, params)
+
+        # Get total count before sorting and pagination
+        total_count = None
+        if params.include_total:
+            total_count = count_rows(self.db, query, params.count_strategy,
+                                     namespace='catalog', key=self._filter_key(params))
         
+        # Apply sorting and pagination
+        sort_key, sort_column, sort_order = self._resolve_sort(params, search_rank)
+        logger.info(f"Sorting by {sort_key} {sort_order.upper()}")
+        if params.fields:
+            # The sort column seeds the next cursor, so it is loaded even when not selected
+            query = query.options(self._load_only(params.fields, sort_key))
+        else:
+            # List views never return the (potentially large) description
+            query = query.options(defer(Book.description))
+        if search_rank is not None and sort_key == search_rank[0]:
+            # Fetch the rank alongside each book so it can seed the next cursor
+            query = query.add_columns(sort_column.label('rank'))
+
+        if params.offset is not None and params.limit is not None:
+            # Use offset/limit style pagination
+            limit, offset = params.limit, params.offset
+        else:
+            # Use page/items_per_page style pagination with defaults
+            page = params.page if params.page is not None else 1
+            limit = params.items_per_page if params.items_per_page is not None else 50
+            offset = (page - 1) * limit
+
+        if params.after or offset == 0:
+            # Keyset pagination: seek past the last row of the previous page
+            after = decode_cursor(params.after, sort_key, sort_order) if params.after else None
+            result = fetch_keyset_page(query, sort_column, Book.id, sort_order, limit, after,
+                                       nullable=self._is_nullable(sort_key))
+        else:
+            query = query.order_by(None)  # Clear existing order_by
+            query = query.order_by(*keyset_order_by(sort_column, Book.id, sort_order))
+            result = query.offset(offset).limit(limit + 1).all()
+
+        has_more = len(result) > limit
+        result = result[:limit]
+        if search_rank is not None and sort_key == search_rank[0]:
+            cursor = next_cursor(result, has_more, sort_key, sort_order,
+                                 value_getter=lambda row: row.rank, id_getter=lambda row: row.Book.id)
+            result = [row.Book for row in result]
+        else:
+            cursor = next_cursor(result, has_more, sort_key, sort_order,
+                                 value_getter=lambda book: getattr(book, sort_key))
+        logger.info(f"Total count: {total_count}, Results: {len(result)}")
+        return result, total_count, cursor
+
+    def _apply_filters(self, query, params: BookSearchParams):
+        """
+        Apply search, genre and rating filters.
+
+        Returns:
+            Tuple of (filtered query, (cursor key, rank expression) for the active search or None)
+        """
         # Apply search filter if search parameter exists
-        if params.search:
-            search = f"%{params.search}%"
+        search_rank = None
+        if params.search and params.fuzzy:
+            # Typo-tolerant trigram match on title/author (served by the gin_trgm_ops indexes)
+            self.db.execute(
+                select(func.set_config('pg_trgm.word_similarity_threshold', str(self.FUZZY_THRESHOLD), True))
+            )
             query = query.filter(
                 or_(
-                    Book.title.ilike(search),
-                    Book.author.ilike(search)
+                    Book.title.op('%>')(params.search),
+                    Book.author.op('%>')(params.search)
                 ))
-                
-        # Get total count before sorting and pagination
-        total_count = query.count()
-        
-        # Apply sorting
-        if params.sort_by:
-            # Map frontend sort fields to database columns
-            column_mapping = {
-                'title': Book.title,
-                'author': Book.author,
-                'rating': Book.average_rating,
-                'average_rating': Book.average_rating,
-                'total_reviews': Book.total_reviews,
-                'date': Book.publication_date,
-                'publication_date': Book.publication_date
-            }
-            
-            # Get the correct column to sort by
-            sort_column = column_mapping.get(params.sort_by)
-            if sort_column is None:
-                logger.warning(f"Unknown sort column: {params.sort_by}")
+            # word_similarity returns real; cast like the full-text rank so cursors round-trip
+            search_rank = ('similarity', cast(func.greatest(
+                func.word_similarity(params.search, Book.title),
+                func.word_similarity(params.search, Book.author)
+            ), Float(53)))
+        elif params.search:
+            ts_query = func.websearch_to_tsquery(self.SEARCH_CONFIG, params.search)
+            query = query.filter(Book.search_vector.op('@@')(ts_query))
+            # ts_rank returns real; as double precision the rank survives the JSON cursor
+            # unchanged, so rows tied at a page boundary compare correctly on the next page
+            search_rank = ('relevance', cast(func.ts_rank(Book.search_vector, ts_query), Float(53)))
+
+        if params.genres:
+            if params.genre_mode == 'all':
+                query = query.filter(Book.genres.contains(params.genres))
             else:
-                logger.info(f"Sorting by column: {params.sort_by} -> {sort_column}")
-                
-                # Always ensure sort_order is either 'asc' or 'desc'
-                sort_order = params.sort_order.lower() if params.sort_order else 'asc'
-                if sort_order not in ['asc', 'desc']:
-                    sort_order = 'asc'
-                
-                # Apply the sort order
-                logger.info(f"Applying {sort_order.upper()} order")
-                if sort_order == 'desc':
-                    sort_column = sort_column.desc()
+                query = query.filter(Book.genres.overlap(params.genres))
+        if params.min_rating is not None:
+            query = query.filter(Book.average_rating >= params.min_rating)
+        return query, search_rank
+
+    def export_books(self, params: BookSearchParams, fmt: str = 'ndjson') -> Iterator[str]:
+        """
+        Stream every book matching params' filters as NDJSON lines or CSV rows, in id order.
+
+        Rows are read through a server-side cursor EXPORT_BATCH_SIZE at a time and
+        yielded as one text chunk per batch. CSV output uses the same columns and
+        genre separator as the bulk import, so an export can be re-imported.
+        """
+        if fmt not in self.EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format. Must be one of: {', '.join(self.EXPORT_FORMATS)}")
+        columns = [getattr(Book, name) for name in self.EXPORT_COLUMNS]
+        query, _ = self._apply_filters(self.db.query(*columns), params)
+        result = self.db.execute(
+            query.order_by(Book.id).statement,
+            execution_options={"yield_per": self.EXPORT_BATCH_SIZE}
+        )
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(self.EXPORT_COLUMNS)
+        for batch in result.partitions():
+            for row in batch:
+                record = row._asdict()
+                if record['publication_date'] is not None:
+                    record['publication_date'] = record['publication_date'].isoformat()
+                if record['average_rating'] is not None:
+                    record['average_rating'] = float(record['average_rating'])
+                if fmt == 'csv':
+                    record['genres'] = GENRE_SEPARATOR.join(record['genres'] or [])
+                    writer.writerow(record.values())
                 else:
-                    sort_column = sort_column.asc()
-                
-                # Clear any existing order_by and apply the new one
-                query = query.order_by(None)  # Clear existing order_by
-                query = query.order_by(sort_column)
-                
-                # Log the final query with sort clause for debugging
-                logger.info(f"Query after sorting: {query}")
-        
-        # Apply pagination with defaults
-        if params.offset is not None and params.limit is not None:
-            # Use offset/limit style pagination
-            query = query.offset(params.offset).limit(params.limit)
+                    buffer.write(json.dumps(record))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()  # CSV header of an empty export
+
+    def get_genre_facets(self, params: BookSearchParams, limit: int = 50) -> List[dict]:
+        """
+        Per-genre book counts for the books matching params.
+
+        The unfiltered catalog is answered from the trigger-maintained genre_counts
+        table; filtered result sets are counted by unnesting only the matching rows.
+        """
+        if not (params.search or params.genres or params.min_rating is not None):
+            rows = (
+                self.db.query(GenreCount.genre, GenreCount.book_count)
+                .filter(GenreCount.book_count > 0)
+                .order_by(GenreCount.book_count.desc(), GenreCount.genre)
+                .limit(limit)
+                .all()
+            )
         else:
-            # Use page/items_per_page style pagination with defaults
-            page = params.page if params.page is not None else 1
-            items_per_page = params.items_per_page if params.items_per_page is not None else 50
-            query = query.offset((page - 1) * items_per_page).limit(items_per_page)
-        
-        result = query.all()
-        print(f"Total count: {total_count}, Results: {len(result)}")
-        print(f"First few results: {[book.title for book in result[:3]]}")
-        return result, total_count
+            query, _ = self._apply_filters(self.db.query(Book.id, Book.genres), params)
+            matches = query.subquery()
+            unnested = select(
+                matches.c.id, func.unnest(matches.c.genres).label('genre')
+            ).subquery()
+            book_count = func.count(func.distinct(unnested.c.id)).label('book_count')
+            rows = self.db.execute(
+                select(unnested.c.genre, book_count)
+                .group_by(unnested.c.genre)
+                .order_by(book_count.desc(), unnested.c.genre)
+                .limit(limit)
+            ).all()
+        return [{"genre": genre, "count": count} for genre, count in rows]
+
+    def list_cache_key(self, params: BookSearchParams) -> str:
+        """Response cache key: catalog version plus the normalized listing parameters"""
+        normalized = {
+            'filter': self._filter_key(params),
+            'sort': [self.SORT_COLUMNS.get(params.sort_by, params.sort_by), params.sort_order or 'asc'],
+            'page': [params.offset, params.limit, params.page, params.items_per_page, params.after],
+            'total': [params.include_total, params.count_strategy],
+            'facets': params.facets,
+            'fields': params.fields,
+        }
+        digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+        return f"{get_cache_version('catalog')}:{digest}"
+
+    def _filter_key(self, params: BookSearchParams) -> tuple:
+        """Normalized filter identity used to cache counts"""
+        search = " ".join(params.search.lower().split()) if params.search else None
+        genres = sorted(set(params.genres)) if params.genres else None
+        return (search, params.fuzzy if search else False, genres,
+                params.genre_mode if genres else None, params.min_rating)
+
+    def _resolve_sort(self, params: BookSearchParams, search_rank=None):
+        """
+        Map the requested sort onto (cursor key, sort expression, order).
+
+        Searches without an explicit sort are ordered by relevance (text rank, or
+        trigram similarity in fuzzy mode); otherwise `id` is the stable default.
+
+        Args:
+            search_rank: (cursor key, rank expression) for the active search, if any
+        """
+        sort_key = self.SORT_COLUMNS.get(params.sort_by) if params.sort_by else None
+        if params.sort_by and sort_key is None:
+            logger.warning(f"Unknown sort column: {params.sort_by}")
+
+        if sort_key == 'relevance' or (sort_key is None and search_rank is not None):
+            if search_rank is None:
+                raise ValueError("Sorting by relevance requires a search query")
+            # Best matches first
+            rank_key, rank_expression = search_rank
+            return rank_key, rank_expression, 'desc'
+        sort_key = sort_key or 'id'
+
+        # Always ensure sort_order is either 'asc' or 'desc'
+        sort_order = params.sort_order.lower() if params.sort_order else 'asc'
+        if sort_order not in ['asc', 'desc']:
+            sort_order = 'asc'
+        return sort_key, getattr(Book, sort_key), sort_order
+
+    def _is_nullable(self, sort_key: str) -> bool:
+        column = Book.__table__.c.get(sort_key)
+        return column is not None and column.nullable
 
     def create_book(self, book_data: BookCreate) -> Book:
         db_book = Book(**book_data.model_dump())
         self.db.add(db_book)
         self.db.commit()
         self.db.refresh(db_book)
+        suggestion_index.upsert(db_book)
+        bump_cache_version('catalog')
         return db_book
 
     def update_book(self, book_id: int, book_data: BookUpdate) -> Optional[Book]:
@@ -124,6 +388,8 @@ class BookService:
             
         self.db.commit()
         self.db.refresh(db_book)
+        suggestion_index.upsert(db_book)
+        bump_cache_version('catalog')
         return db_book
 
     def delete_book(self, book_id: int) -> bool:
@@ -133,26 +399,62 @@ class BookService:
             
         self.db.delete(db_book)
         self.db.commit()
+        suggestion_index.remove(book_id)
+        bump_cache_version('catalog')
+        bump_cache_version('reviews')  # Reviews cascade with the book
         return True
 
-    def update_book_rating(self, book_id: int, new_rating: int) -> Optional[Book]:
+    def reconcile_ratings(self, batch_size: int = 1000) -> int:
         """
-        Update book's average rating and total reviews when a new review is added
+        Recompute rating aggregates from active reviews for books whose stored
+        values drifted (e.g. after manual SQL). Drift is found with one set-based
+        scan; each batch of drifted books is then locked, so that concurrent
+        review deltas queue behind the fix instead of being overwritten, and
+        recomputed. Returns the number of books corrected.
         """
-        db_book = self.get_book(book_id)
-        if not db_book:
-            return None
+        drifted = self.db.execute(text("""
+            SELECT b.id
+            FROM books b
+            LEFT JOIN (
+                SELECT book_id, sum(rating) AS rating_sum, count(*) AS review_count
+                FROM reviews
+                WHERE NOT coalesce(is_deleted, false)
+                GROUP BY book_id
+            ) r ON r.book_id = b.id
+            WHERE b.rating_sum <> coalesce(r.rating_sum, 0)
+               OR b.total_reviews IS DISTINCT FROM coalesce(r.review_count, 0)
+               OR b.average_rating IS DISTINCT FROM CASE
+                    WHEN r.review_count > 0 THEN round(r.rating_sum::numeric / r.review_count, 1)
+                    ELSE 0
+                  END
+            ORDER BY b.id
+        """)).scalars().all()
 
-        current_total = db_book.total_reviews
-        current_average = float(db_book.average_rating or 0)
-        
-        # Calculate new average and round to 1 decimal
-        new_total = current_total + 1
-        new_average = round(((current_average * current_total) + new_rating) / new_total, 1)
-        
-        db_book.average_rating = new_average
-        db_book.total_reviews = new_total
-        
-        self.db.commit()
-        self.db.refresh(db_book)
-        return db_book
+        corrected = 0
+        for start in range(0, len(drifted), batch_size):
+            ids = list(drifted[start:start + batch_size])
+            self.db.execute(text("SELECT id FROM books WHERE id = ANY(:ids) ORDER BY id FOR UPDATE"), {"ids": ids})
+            corrected += self.db.execute(text("""
+                UPDATE books b SET
+                    rating_sum = a.rating_sum,
+                    total_reviews = a.review_count,
+                    average_rating = CASE
+                        WHEN a.review_count > 0 THEN round(a.rating_sum::numeric / a.review_count, 1)
+                        ELSE 0
+                    END
+                FROM (
+                    SELECT bb.id, coalesce(sum(r.rating), 0) AS rating_sum, count(r.id) AS review_count
+                    FROM books bb
+                    LEFT JOIN reviews r ON r.book_id = bb.id AND NOT coalesce(r.is_deleted, false)
+                    WHERE bb.id = ANY(:ids)
+                    GROUP BY bb.id
+                ) a
+                WHERE b.id = a.id
+            """), {"ids": ids}).rowcount
+            self.db.commit()
+
+        if corrected:
+            logger.info(f"Reconciled rating aggregates of {corrected} books")
+            suggestion_index.expire()
+            bump_cache_version('catalog')
+        return corrected
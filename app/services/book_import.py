@@ -0,0 +1,224 @@
+"""Bulk catalog import: stream CSV/NDJSON feeds into books through COPY."""
+import csv
+import io
+import json
+import logging
+from datetime import date
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.cache import bump_cache_version
+from app.services.suggest import suggestion_index
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("csv", "ndjson")
+GENRE_SEPARATOR = "|"  # Genres inside a single CSV field, e.g. "Fantasy|Adventure"
+IMPORT_BATCH_ROWS = 5000  # Valid rows staged, merged and committed together
+
+StagedRow = Tuple[int, str, str, str, Optional[str], Optional[str], Optional[str]]
+
+
+class _CsvRowStream:
+    """File-like object that CSV-encodes rows lazily for COPY FROM STDIN."""
+
+    def __init__(self, rows: Iterable[tuple]):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        if size < 0:
+            chunk, self._pending = self._pending, ""
+        else:
+            chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    readline = read
+
+
+class BookImportService:
+    """
+    Upsert a catalog feed into books keyed on ISBN.
+
+    Rows are validated while streaming and processed IMPORT_BATCH_ROWS at a
+    time: each batch is staged into a temporary table with COPY, merged with
+    two set-based statements and committed, so memory use does not depend on
+    the size of the feed and updated books stay locked for one batch only.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.received = 0
+        self.rejected = 0
+
+    def import_books(self, stream: TextIO, fmt: str) -> Dict[str, int]:
+        """
+        Import a CSV (header row required) or NDJSON feed.
+
+        Args:
+            stream: Text stream with the feed contents
+            fmt: "csv" or "ndjson"
+
+        Returns:
+            Dict with received, rejected, inserted and updated row counts
+        """
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format. Must be one of: {', '.join(IMPORT_FORMATS)}")
+        records = self._read_csv(stream) if fmt == "csv" else self._read_ndjson(stream)
+        staged = self._staged_rows(records)
+
+        inserted = updated = 0
+        try:
+            while True:
+                batch = list(islice(staged, IMPORT_BATCH_ROWS))
+                if not batch:
+                    break
+                batch_inserted, batch_updated = self._import_batch(batch)
+                self.db.commit()
+                inserted += batch_inserted
+                updated += batch_updated
+        finally:
+            # Batches merged before a failure stay committed
+            bump_cache_version('catalog')
+            suggestion_index.expire()
+
+        result = {
+            "received": self.received,
+            "rejected": self.rejected,
+            "inserted": inserted,
+            "updated": updated,
+        }
+        logger.info(f"Book import finished: {result}")
+        return result
+
+    def _import_batch(self, rows: Iterable[StagedRow]) -> Tuple[int, int]:
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.execute("""
+                CREATE TEMP TABLE books_import (
+                    line bigint, title text, author text, isbn text,
+                    publication_date text, genres text, description text
+                ) ON COMMIT DROP
+            """)
+            cursor.copy_expert(
+                "COPY books_import (line, title, author, isbn, publication_date, genres, description) "
+                "FROM STDIN WITH (FORMAT csv)",
+                _CsvRowStream(rows)
+            )
+            result = self._merge(cursor)
+            cursor.execute("DROP TABLE books_import")
+            return result
+        finally:
+            cursor.close()
+
+    def _merge(self, cursor) -> Tuple[int, int]:
+        # The last occurrence of an ISBN in the batch wins; later batches update earlier ones
+        cursor.execute("""
+            DELETE FROM books_import a USING books_import b
+            WHERE a.isbn = b.isbn AND a.line < b.line
+        """)
+        cursor.execute("ANALYZE books_import")
+        # Serialize concurrent imports so two of them cannot insert the same new ISBN.
+        # Unlike a table lock this leaves other writers alone: review writes (whose
+        # trigger updates books) only wait on rows this batch has touched.
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('books_import'))")
+        cursor.execute("""
+            UPDATE books b SET
+                title = s.title,
+                author = s.author,
+                publication_date = COALESCE(s.publication_date::date, b.publication_date),
+                genres = COALESCE(string_to_array(s.genres, %(sep)s), b.genres),
+                description = COALESCE(s.description, b.description)
+            FROM books_import s
+            WHERE b.isbn = s.isbn
+        """, {"sep": GENRE_SEPARATOR})
+        updated = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO books (title, author, isbn, publication_date, genres, description,
+                               average_rating, total_reviews, created_at)
+            SELECT s.title, s.author, s.isbn, s.publication_date::date,
+                   string_to_array(s.genres, %(sep)s), s.description, 0, 0, now()
+            FROM books_import s
+            WHERE NOT EXISTS (SELECT 1 FROM books b WHERE b.isbn = s.isbn)
+        """, {"sep": GENRE_SEPARATOR})
+        inserted = cursor.rowcount
+        return inserted, updated
+
+    def _staged_rows(self, records: Iterable[dict]) -> Iterator[StagedRow]:
+        for line, record in enumerate(records, start=1):
+            self.received += 1
+            row = self._validate(line, record)
+            if row is None:
+                self.rejected += 1
+                continue
+            yield row
+
+    @staticmethod
+    def _text(value: Any) -> Optional[str]:
+        """Stripped text of a feed field: "" when empty, None when it is not text."""
+        if value is None:
+            return ""
+        if not isinstance(value, str):
+            return None
+        return value.strip()
+
+    def _validate(self, line: int, record: dict) -> Optional[StagedRow]:
+        """Normalize one feed record; None when it cannot be imported."""
+        if not isinstance(record, dict):
+            return None
+        title = self._text(record.get("title"))
+        author = self._text(record.get("author"))
+        description = self._text(record.get("description"))
+        if not title or not author or description is None or len(title) > 255 or len(author) > 255:
+            return None
+        isbn = record.get("isbn")
+        if isinstance(isbn, bool) or not isinstance(isbn, (str, int)):
+            return None  # NDJSON feeds may give the ISBN as a number
+        isbn = str(isbn).replace("-", "").strip()
+        if not 10 <= len(isbn) <= 13:
+            return None
+
+        publication_date = record.get("publication_date") or None
+        if publication_date:
+            try:
+                publication_date = date.fromisoformat(str(publication_date)).isoformat()
+            except ValueError:
+                publication_date = None
+
+        genres = record.get("genres")
+        if isinstance(genres, str):
+            genres = genres.split(GENRE_SEPARATOR)
+        elif genres is not None and not isinstance(genres, list):
+            return None
+        if genres:
+            if not all(isinstance(g, str) or g is None for g in genres):
+                return None
+            genres = [g.strip()[:50] for g in genres if g and g.strip()]
+        genres = GENRE_SEPARATOR.join(genres) if genres else None
+
+        return line, title, author, isbn, publication_date, genres, description or None
+
+    def _read_csv(self, stream: TextIO) -> Iterator[dict]:
+        yield from csv.DictReader(stream)
+
+    def _read_ndjson(self, stream: TextIO) -> Iterator[dict]:
+        for raw_line in stream:
+            raw_line = raw_line.strip()
+            if not raw_line:
+                continue
+            try:
+                yield json.loads(raw_line)
+            except json.JSONDecodeError:
+                yield None
@@ -0,0 +1,62 @@
+"""Total-count strategies for paginated listings."""
+import logging
+from typing import Hashable, Optional
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.core.cache import TTLCache, get_cache_version
+
+logger = logging.getLogger(__name__)
+
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+COUNT_STRATEGY_PATTERN = "^(exact|cached|estimated)$"
+COUNT_CACHE_TTL = 60  # seconds
+
+_count_cache = TTLCache(ttl=COUNT_CACHE_TTL)
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) wrapper around a select statement."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def estimate_count(db: Session, query) -> int:
+    """Row estimate from the query planner; no rows are read."""
+    plan = db.execute(Explain(query.statement)).scalar()
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(db: Session, query, strategy: str = "exact", namespace: Optional[str] = None,
+               key: Optional[Hashable] = None) -> int:
+    """
+    Total rows matched by a query.
+
+    Args:
+        strategy: "exact" runs COUNT(*); "cached" reuses an exact count per
+            (namespace, key) for COUNT_CACHE_TTL seconds or until the namespace's
+            cache version is bumped; "estimated" asks the planner
+        namespace: Cache version the count depends on ("catalog", "reviews");
+            versions are shared through Redis, so a write in one worker drops
+            the cached counts of every worker
+        key: Normalized filter identifying the query within the namespace
+    """
+    if strategy == "estimated":
+        return estimate_count(db, query)
+    if strategy == "cached" and namespace is not None:
+        cache_key = (namespace, get_cache_version(namespace), key)
+        total = _count_cache.get(cache_key)
+        if total is None:
+            total = query.count()
+            _count_cache.set(cache_key, total)
+        return total
+    return query.count()
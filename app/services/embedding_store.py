@@ -0,0 +1,154 @@
+"""Persistent float32 store for book embeddings, memory-mapped and shared by all workers."""
+import fcntl
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Sequence, Union
+
+import numpy as np
+
+from app.core.config import get_settings
+
+EMBEDDING_DIMENSIONS = 1536  # text-embedding-ada-002
+INDEX_ROW_BYTES = 16  # (book_id, text digest) as two int64
+
+
+def text_digest(text: str) -> int:
+    """64-bit digest of the text an embedding was computed from."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little", signed=True)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so cosine similarity is a plain dot product."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding matrix on disk:
+
+    - vectors.f32: contiguous float32 rows of unit-length embeddings
+    - index.i64: one (book_id, text digest) pair per row
+
+    Each worker maps both files read-only, so the page cache holds one copy
+    shared by every process. Embeddings never expire: a row is reused for as
+    long as the digest of the book's embedding text matches, and an edited
+    book gets a new row. The latest row for a book id wins.
+    """
+
+    def __init__(self, path: Union[str, Path], dimensions: int = EMBEDDING_DIMENSIONS):
+        self.path = Path(path)
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._vectors = np.empty((0, dimensions), dtype=np.float32)
+        self._index = np.empty((0, 2), dtype=np.int64)
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_rows = np.empty(0, dtype=np.int64)
+
+    @property
+    def _index_file(self) -> Path:
+        return self.path / "index.i64"
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.f32"
+
+    def __len__(self) -> int:
+        self._refresh()
+        return self._rows
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """All stored rows, unit length; row numbers match rows()."""
+        self._refresh()
+        return self._vectors
+
+    def _refresh(self) -> None:
+        """Map rows appended since the last call, by this worker or another one."""
+        try:
+            rows = os.path.getsize(self._index_file) // INDEX_ROW_BYTES
+        except FileNotFoundError:
+            return
+        if rows == self._rows:
+            return
+        with self._lock:
+            if rows == self._rows:
+                return
+            # Vectors are written before their index rows, so both files hold at least `rows` rows
+            index = np.memmap(self._index_file, dtype=np.int64, mode="r", shape=(rows, 2))
+            vectors = np.memmap(self._vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            order = np.argsort(index[:, 0], kind="stable")
+            self._sorted_ids = np.asarray(index[order, 0])
+            self._sorted_rows = order
+            self._index, self._vectors = index, vectors
+            self._rows = rows
+
+    def rows(self, book_ids: Sequence[int], digests: Sequence[int]) -> np.ndarray:
+        """Row of the current embedding for each book, or -1 where it is missing or stale."""
+        self._refresh()
+        ids = np.asarray(book_ids, dtype=np.int64)
+        if not self._rows or not len(ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        # Last occurrence of each id, i.e. its most recently added row
+        position = np.searchsorted(self._sorted_ids, ids, side="right") - 1
+        clipped = np.maximum(position, 0)
+        rows = self._sorted_rows[clipped]
+        found = (
+            (position >= 0)
+            & (self._sorted_ids[clipped] == ids)
+            & (self._index[rows, 1] == np.asarray(digests, dtype=np.int64))
+        )
+        return np.where(found, rows, -1)
+
+    @property
+    def max_book_id(self) -> int:
+        self._refresh()
+        return int(self._sorted_ids[-1]) if self._rows else 0
+
+    def book_ids(self, rows: np.ndarray) -> np.ndarray:
+        """Book id stored at each row."""
+        self._refresh()
+        return np.asarray(self._index[rows, 0])
+
+    def is_latest(self, rows: np.ndarray) -> np.ndarray:
+        """Whether each row is its book's most recent embedding (older rows are superseded)."""
+        ids = self.book_ids(rows)
+        position = np.searchsorted(self._sorted_ids, ids, side="right") - 1
+        return self._sorted_rows[position] == rows
+
+    def add(self, book_ids: Sequence[int], digests: Sequence[int], embeddings: Sequence[Sequence[float]]) -> None:
+        """Append embeddings; safe to call from several workers at once."""
+        if not len(book_ids):
+            return
+        vectors = normalize(np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimensions))
+        index = np.column_stack((np.asarray(book_ids, dtype=np.int64), np.asarray(digests, dtype=np.int64)))
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self._index_file, "ab") as index_file, open(self._vectors_file, "ab") as vectors_file:
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                # Drop anything past the last complete row, left by a writer that died mid-append
+                rows = os.fstat(index_file.fileno()).st_size // INDEX_ROW_BYTES
+                index_file.truncate(rows * INDEX_ROW_BYTES)
+                vectors_file.truncate(rows * self.dimensions * 4)
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                index_file.write(index.tobytes())
+                index_file.flush()
+            finally:
+                fcntl.flock(index_file, fcntl.LOCK_UN)
+        self._refresh()
+
+    def similarities(self, query: Sequence[float], rows: np.ndarray) -> np.ndarray:
+        """Cosine similarity between `query` and the embeddings at `rows`."""
+        vectors = self.vectors
+        query = normalize(query)
+        if len(rows) * 4 < len(vectors):
+            return vectors[rows] @ query  # Few candidates: gather them instead of scanning every row
+        return (vectors @ query)[rows]  # One pass over the mapped matrix
+
+
+embedding_store = EmbeddingStore(get_settings().EMBEDDING_STORE_PATH)
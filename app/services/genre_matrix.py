@@ -0,0 +1,236 @@
+"""Catalog genre matrix for vectorised SIMILAR recommendation scoring."""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import local_cache_version
+from app.core.clients import clients
+from app.core.config import get_settings
+from app.db.models import Book
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+EXACT_MATCH_BONUS = 50.0
+
+BookRow = Tuple[int, Optional[Sequence[str]], Optional[float]]  # (id, genres, average_rating)
+
+
+def genre_matches(name: str, genre: str) -> bool:
+    """The genre filter of every recommendation type: `genre` is a case-insensitive substring of the name"""
+    return genre.lower() in name.lower()
+
+
+class GenreMatrix:
+    """
+    Multi-hot book x genre matrix over a catalog-wide genre vocabulary, stored
+    sparse in both orientations: per book (CSR) and per genre (posting lists).
+
+    Every stored entry is one genre occurrence, so a genre listed twice on a
+    book counts twice, exactly like the per-book loop this replaces. Rows are
+    books in id order, which is also the tie-break order of the ranking.
+    """
+
+    def __init__(self, rows: Iterable[BookRow]):
+        vocabulary: Dict[str, int] = {}
+        ids: List[int] = []
+        indptr = [0]
+        indices: List[int] = []
+        distinct: List[int] = []
+        ratings: List[float] = []
+        for book_id, genres, rating in rows:
+            genres = genres or []
+            ids.append(book_id)
+            indices.extend(vocabulary.setdefault(genre, len(vocabulary)) for genre in genres)
+            indptr.append(len(indices))
+            distinct.append(len(set(genres)))
+            ratings.append(float(rating or 3.0))
+
+        self.vocabulary = vocabulary
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.distinct_genres = np.asarray(distinct, dtype=np.float64)
+        self.rating_boost = (np.asarray(ratings, dtype=np.float64) - 3.0) / 1000.0
+
+        # Per-genre posting lists: the book row and in-book position of every occurrence
+        indptr = np.asarray(indptr, dtype=np.int64)
+        genre_of = np.asarray(indices, dtype=np.int64)
+        row_of = np.repeat(np.arange(len(ids), dtype=np.int64), np.diff(indptr))
+        position = np.arange(len(genre_of), dtype=np.int64) - np.repeat(indptr[:-1], np.diff(indptr))
+        order = np.argsort(genre_of, kind="stable")
+        self.posting_rows = row_of[order]
+        self.posting_genres = genre_of[order]
+        self.posting_positions = position[order]
+        self.posting_ptr = np.concatenate(([0], np.cumsum(np.bincount(genre_of, minlength=len(vocabulary)))))
+        self.max_genres = int(position.max()) + 1 if len(position) else 1
+
+        self.max_id = int(ids[-1]) if ids else 0
+        self.built_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _postings(self, genre_ids: List[int]) -> np.ndarray:
+        """Indices into the posting arrays for all occurrences of the given genres."""
+        if not genre_ids:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.arange(self.posting_ptr[genre_id], self.posting_ptr[genre_id + 1]) for genre_id in genre_ids
+        ])
+
+    def top_k(
+        self,
+        preferences: Dict[str, float],
+        limit: int,
+        exclude_ids: Iterable[int] = (),
+        genre: Optional[str] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Rank books by genre preference and return (book_id, score) pairs, best first.
+
+        Only books holding at least one preferred genre are touched, so the cost
+        follows the size of the user's genres rather than the catalog.
+        """
+        genre_ids = [self.vocabulary[name] for name in preferences if name in self.vocabulary]
+        if not genre_ids or limit <= 0:
+            return []
+        weights = np.zeros(len(self.vocabulary), dtype=np.float64)
+        for name, weight in preferences.items():
+            if name in self.vocabulary:
+                weights[self.vocabulary[name]] = weight
+
+        postings = self._postings(genre_ids)
+        rows = self.posting_rows[postings]
+        # Visit each book's matches in its own genre order so the sums round like the original loop
+        order = np.argsort(rows * self.max_genres + self.posting_positions[postings])
+        rows = rows[order]
+        occurrence_weights = weights[self.posting_genres[postings][order]]
+
+        new_row = np.empty(len(rows), dtype=bool)
+        new_row[0] = True
+        np.not_equal(rows[1:], rows[:-1], out=new_row[1:])
+        candidates = rows[new_row]
+        group = np.cumsum(new_row) - 1
+        preference_score = np.bincount(group, weights=occurrence_weights)
+        n_matches = np.bincount(group).astype(np.float64)
+
+        keep = np.ones(len(candidates), dtype=bool)
+        exclude = np.fromiter(exclude_ids, dtype=np.int64)
+        if len(exclude):
+            keep &= ~np.isin(self.ids[candidates], exclude)
+        if genre:
+            filter_ids = [genre_id for name, genre_id in self.vocabulary.items() if genre_matches(name, genre)]
+            in_genre = np.zeros(len(self.ids), dtype=bool)
+            in_genre[self.posting_rows[self._postings(filter_ids)]] = True
+            keep &= in_genre[candidates]
+        candidates = candidates[keep]
+        if not len(candidates):
+            return []
+
+        # Every scored book's own genre set is among the matched sets, so the exact-set bonus always applies
+        scores = (
+            preference_score[keep] * 100.0
+            + n_matches[keep] / self.distinct_genres[candidates] * 10.0
+            + EXACT_MATCH_BONUS
+            + self.rating_boost[candidates]
+        )
+
+        k = min(limit, len(scores))
+        if k < len(scores):
+            threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+            shortlist = np.flatnonzero(scores >= threshold)
+        else:
+            shortlist = np.arange(len(scores))
+        # Highest score first, lower id (earlier row) on ties
+        ranked = shortlist[np.lexsort((candidates[shortlist], -scores[shortlist]))][:k]
+        return [(int(self.ids[candidates[i]]), float(scores[i])) for i in ranked]
+
+
+class GenreMatrixCache:
+    """
+    Per-process GenreMatrix, rebuilt when the catalog changes.
+
+    Freshness follows the catalog version, read from Redis without blocking the
+    event loop. After a version change, added or deleted books (a different max
+    id, checked once per version) start a rebuild immediately; other changes
+    (edits, rating updates) are picked up within the refresh interval. While
+    Redis is down only this process's changes move the version, so the matrix
+    is also rebuilt whenever it is older than the refresh interval.
+
+    Only the first build blocks a request. Once a matrix exists, a stale one
+    keeps being served while a single background task, on its own session,
+    checks the max id or rebuilds and swaps the new matrix in; the CPU-bound
+    construction runs in a worker thread.
+    """
+
+    def __init__(self, refresh_seconds: float, session_factory=AsyncSessionLocal):
+        self.refresh_seconds = refresh_seconds
+        self.session_factory = session_factory  # Background refreshes outlive the request's session
+        self._matrix: Optional[GenreMatrix] = None
+        self._version: Optional[Tuple[bool, int]] = None  # (shared, version) the matrix was built at
+        self._checked_version: Optional[Tuple[bool, int]] = None  # Latest version whose max id matched
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _catalog_version(self) -> Tuple[bool, int]:
+        version = await clients.cache_version('catalog')
+        if version is None:
+            return False, local_cache_version('catalog')
+        return True, version
+
+    def _is_fresh(self, version: Tuple[bool, int]) -> bool:
+        matrix = self._matrix
+        if matrix is None:
+            return False
+        if time.monotonic() - matrix.built_at < self.refresh_seconds:
+            return version in (self._version, self._checked_version)
+        shared, _ = version
+        return shared and version == self._version
+
+    async def get(self, db: AsyncSession) -> GenreMatrix:
+        version = await self._catalog_version()
+        if self._is_fresh(version):
+            return self._matrix
+        if self._matrix is not None:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh(version))
+            return self._matrix
+        async with self._lock:
+            if self._matrix is None:  # Otherwise built while this request waited
+                await self._build(db, version)
+            return self._matrix
+
+    async def _refresh(self, version: Tuple[bool, int]) -> None:
+        try:
+            async with self._lock, self.session_factory() as db:
+                if self._is_fresh(version):
+                    return
+                matrix = self._matrix
+                if matrix is not None and time.monotonic() - matrix.built_at < self.refresh_seconds:
+                    max_id = await db.scalar(select(func.max(Book.id))) or 0
+                    if max_id == matrix.max_id:
+                        self._checked_version = version
+                        return
+                await self._build(db, version)
+        except Exception:
+            logger.exception("Genre matrix refresh failed; serving the previous matrix")
+
+    async def _build(self, db: AsyncSession, version: Tuple[bool, int]) -> None:
+        rows = (await db.execute(
+            select(Book.id, Book.genres, Book.average_rating).order_by(Book.id)
+        )).all()
+        matrix = await asyncio.to_thread(GenreMatrix, rows)
+        self._matrix, self._version, self._checked_version = matrix, version, version
+
+    def clear(self) -> None:
+        self._matrix = None
+        self._version = None
+        self._checked_version = None
+        self._refresh_task = None
+
+
+genre_matrix_cache = GenreMatrixCache(get_settings().GENRE_MATRIX_REFRESH_SECONDS)
@@ -0,0 +1,129 @@
+"""Keyset (cursor) pagination helpers shared by the listing services."""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import literal, tuple_
+
+
+def _encode_value(value: Any) -> Any:
+    """Convert a sort value into a JSON-safe representation."""
+    if isinstance(value, Decimal):
+        return {"d": str(value)}
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """Reverse of _encode_value."""
+    if isinstance(value, dict):
+        if "d" in value:
+            return Decimal(value["d"])
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "date" in value:
+            return date.fromisoformat(value["date"])
+        raise ValueError("Invalid cursor value")
+    return value
+
+
+def encode_cursor(sort_key: str, sort_order: str, value: Any, row_id: int) -> str:
+    """
+    Build an opaque cursor pointing just after the given row.
+
+    The sort key and order are embedded so a cursor cannot be replayed
+    against a different ordering.
+    """
+    payload = {"s": sort_key, "o": sort_order, "v": _encode_value(value), "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str, sort_order: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        Tuple of (last sort value, last row id)
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another ordering
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload: Dict[str, Any] = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value = _decode_value(payload["v"])
+        row_id = int(payload["id"])
+        cursor_sort, cursor_order = payload["s"], payload["o"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if cursor_sort != sort_key or cursor_order != sort_order:
+        raise ValueError("Pagination cursor does not match the requested sort order")
+    return value, row_id
+
+
+def keyset_order_by(sort_column, id_column, sort_order: str) -> List:
+    """ORDER BY clauses for offset pages, consistent with keyset pages (NULL sort values last)."""
+    if sort_column is id_column:
+        return [id_column.desc() if sort_order == "desc" else id_column.asc()]
+    if sort_order == "desc":
+        return [sort_column.desc().nulls_last(), id_column.desc()]
+    return [sort_column.asc().nulls_last(), id_column.asc()]
+
+
+def fetch_keyset_page(query, sort_column, id_column, sort_order: str, limit: int,
+                      after: Optional[Tuple[Any, int]] = None, nullable: bool = True) -> List:
+    """
+    Fetch up to limit + 1 rows ordered by (sort_column, id) starting after `after`.
+
+    Rows with a NULL sort value come last in both directions. They are read in a
+    second step, only when the non-NULL rows run out, so that each step is a
+    plain range scan over the composite (sort_column, id) index.
+
+    Args:
+        query: Filtered query to page through
+        after: (last sort value, last id) from a decoded cursor, or None for the first page
+        nullable: Whether sort_column can be NULL; skips the NULL step when False
+    """
+    desc = sort_order == "desc"
+    id_order = id_column.desc() if desc else id_column.asc()
+
+    def id_after(last_id: int):
+        return id_column < last_id if desc else id_column > last_id
+
+    if sort_column is id_column:
+        if after is not None:
+            query = query.filter(id_after(after[1]))
+        return query.order_by(None).order_by(id_order).limit(limit + 1).all()
+
+    rows = []
+    in_null_block = after is not None and after[0] is None
+    if not in_null_block:
+        page_query = query.filter(sort_column.isnot(None))
+        if after is not None:
+            key = tuple_(sort_column, id_column)
+            bound = tuple_(literal(after[0]), literal(after[1]))
+            page_query = page_query.filter(key < bound if desc else key > bound)
+        sort_order_by = sort_column.desc() if desc else sort_column.asc()
+        rows = page_query.order_by(None).order_by(sort_order_by, id_order).limit(limit + 1).all()
+
+    if nullable and len(rows) <= limit:
+        null_query = query.filter(sort_column.is_(None))
+        if in_null_block:
+            null_query = null_query.filter(id_after(after[1]))
+        rows += null_query.order_by(None).order_by(id_order).limit(limit + 1 - len(rows)).all()
+    return rows
+
+
+def next_cursor(rows: List, has_more: bool, sort_key: str, sort_order: str, value_getter,
+                id_getter=lambda row: row.id) -> Optional[str]:
+    """Cursor for the page following `rows`, or None when this was the last page."""
+    if not rows or not has_more:
+        return None
+    last = rows[-1]
+    return encode_cursor(sort_key, sort_order, value_getter(last), id_getter(last))
@@ -1,9 +1,9 @@
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
 from app.db.models import User, Review, UserFavorite, Book
 from app.schemas.profile import ProfileUpdate
+from app.services.pagination import decode_cursor, fetch_keyset_page, keyset_order_by, next_cursor
 
 class ProfileService:
     def __init__(self, db: Session):
@@ -32,25 +32,38 @@ class ProfileService:
 
     def get_user_reviews(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Review]:
         """Get a user's reviews"""
-        return (
-            self.db.query(Review)
-            .filter(Review.user_id == user_id, Review.is_deleted == False)
-            .order_by(desc(Review.created_at))
-            .offset(offset)
-            .limit(limit)
-            .all()
-        )
+        return self.get_user_reviews_page(user_id, limit, offset)[0]
+
+    def get_user_reviews_page(self, user_id: int, limit: int = 10, offset: int = 0,
+                              after: Optional[str] = None) -> Tuple[List[Review], Optional[str]]:
+        """A user's reviews, newest first, with the cursor for the next page"""
+        query = self.db.query(Review).filter(Review.user_id == user_id, Review.is_deleted == False)
+        return self._newest_first_page(query, Review.created_at, Review.id, limit, offset, after)
 
     def get_user_favorites(self, user_id: int, limit: int = 10, offset: int = 0) -> List[UserFavorite]:
         """Get a user's favorite books"""
-        return (
-            self.db.query(UserFavorite)
-            .filter(UserFavorite.user_id == user_id)
-            .order_by(desc(UserFavorite.created_at))
-            .offset(offset)
-            .limit(limit)
-            .all()
-        )
+        return self.get_user_favorites_page(user_id, limit, offset)[0]
+
+    def get_user_favorites_page(self, user_id: int, limit: int = 10, offset: int = 0,
+                                after: Optional[str] = None) -> Tuple[List[UserFavorite], Optional[str]]:
+        """A user's favorites, newest first, with the cursor for the next page"""
+        query = self.db.query(UserFavorite).filter(UserFavorite.user_id == user_id)
+        return self._newest_first_page(query, UserFavorite.created_at, UserFavorite.id, limit, offset, after)
+
+    def _newest_first_page(self, query, created_at, id_column, limit: int, offset: int, after: Optional[str]):
+        """
+        Page by keyset on (created_at, id) for the first page and cursor requests,
+        by OFFSET otherwise. Raises ValueError for an invalid cursor.
+        """
+        if after or offset == 0:
+            last = decode_cursor(after, 'date', 'desc') if after else None
+            rows = fetch_keyset_page(query, created_at, id_column, 'desc', limit, last, nullable=False)
+        else:
+            query = query.order_by(*keyset_order_by(created_at, id_column, 'desc'))
+            rows = query.offset(offset).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, next_cursor(rows, has_more, 'date', 'desc', value_getter=lambda row: row.created_at)
 
     def add_favorite(self, user_id: int, book_id: int) -> UserFavorite:
         """Add a book to user's favorites"""
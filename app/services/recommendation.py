@@ -1,44 +1,65 @@
 import os
 from typing import List, Dict, Set, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_
-from app.db.models import Book, Review, User, UserFavorite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Numeric, desc, func, and_, literal_column, select
+from app.db.models import Book, Review, User, UserFavorite, TOP_RATED_SCORE_SQL
 from app.schemas.recommendation import RecommendationType
 import random
 from datetime import datetime, timedelta
 import aiohttp
 import asyncio
 from functools import lru_cache
-from redis import Redis
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 import json
 from collections import Counter
 import numpy as np
 from openai import AsyncOpenAI
 import logging
 from dotenv import load_dotenv
-from app.core.config import get_settings
+from app.core.clients import clients
+from app.services.ann_index import embedding_search
+from app.services.embedding_store import embedding_store, text_digest
+from app.services.genre_matrix import genre_matches, genre_matrix_cache
 
 # Load environment variables
 load_dotenv()
 
+EMBEDDING_CONCURRENCY = 8  # Parallel embedding requests for books missing from the store
+NEW_BOOK_EMBEDDING_LIMIT = 256  # New books embedded per AI request; scripts/build_ann_index.py backfills the rest
+AI_GENRE_OVERFETCH = 10  # Extra neighbours fetched when a genre filter will discard some of them
+
 class RecommendationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, cache: Optional[Redis] = None, openai_client: Optional[AsyncOpenAI] = None):
+        # Redis and OpenAI clients are app-lifespan singletons (see app.core.clients),
+        # injected by the endpoint; None disables caching / AI recommendations
         self.db = db
-        settings = get_settings()
+        self.cache = cache
+        self.openai_client = openai_client
+        self.embedding_store = embedding_store  # Per-worker, memory-mapped (see app.services.embedding_store)
+        self.embedding_search = embedding_search  # IVF index over the store (see app.services.ann_index)
+        self.cache_ttl = 24 * 60 * 60  # 24 hours
+
+    async def _cache_get(self, key: str) -> Optional[str]:
+        if self.cache is None:
+            return None
         try:
-            self.cache = Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                decode_responses=True
-            )
-            self.cache.ping()
-        except:
+            return await self.cache.get(key)
+        except RedisError as e:
+            logging.warning(f"Redis unavailable, skipping cache: {str(e)}")
+            clients.mark_redis_down()
+            self.cache = None
+            return None
+
+    async def _cache_set(self, key: str, value: str) -> None:
+        if self.cache is None:
+            return
+        try:
+            await self.cache.setex(key, self.cache_ttl, value)
+        except RedisError as e:
+            logging.warning(f"Redis unavailable, skipping cache: {str(e)}")
+            clients.mark_redis_down()
             self.cache = None
-            logging.warning("Redis not available, caching disabled")
-            
-        self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.cache_ttl = 24 * 60 * 60  # 24 hours
 
     def _create_book_recommendation(self, book: Book, score: float, reason: str) -> Dict:
         """Helper method to create a standardized book recommendation dictionary."""
@@ -54,14 +75,14 @@ class RecommendationService:
             "publication_year": book.publication_date.year if book.publication_date else None
         }
 
-    def _get_popular_books(self, limit: int, exclude_ids: Set[int] = None) -> List[Dict]:
+    async def _get_popular_books(self, limit: int, exclude_ids: Set[int] = None) -> List[Dict]:
         """Fallback method to get popular books."""
         if exclude_ids is None:
             exclude_ids = set()
             
-        popular_books = (
-            self.db.query(Book)
-            .filter(
+        popular_books = (await self.db.scalars(
+            select(Book)
+            .where(
                 and_(
                     Book.id.notin_(exclude_ids),
                     Book.average_rating >= 3.5,
@@ -70,8 +91,7 @@ class RecommendationService:
             )
             .order_by(desc(Book.total_reviews), desc(Book.average_rating))
             .limit(limit)
-            .all()
-        )
+        )).all()
         
         return [
             self._create_book_recommendation(
@@ -82,15 +102,16 @@ class RecommendationService:
             for book in popular_books
         ]
 
-    def _get_user_genre_preferences(self, user_id: int) -> Dict[str, float]:
+    async def _get_user_genre_preferences(self, user_id: int) -> Dict[str, float]:
         """Get user's genre preferences based on their favorite books."""
-        favorites = self.db.query(UserFavorite).filter(UserFavorite.user_id == user_id).all()
-        if not favorites:
+        favorite_book_ids = (await self.db.scalars(
+            select(UserFavorite.book_id).where(UserFavorite.user_id == user_id)
+        )).all()
+        if not favorite_book_ids:
             return {}
 
         # Get all favorite books
-        favorite_book_ids = [fav.book_id for fav in favorites]
-        favorite_books = self.db.query(Book).filter(Book.id.in_(favorite_book_ids)).all()
+        favorite_books = (await self.db.scalars(select(Book).where(Book.id.in_(favorite_book_ids)))).all()
 
         # First collect all unique genres to give equal weight initially
         unique_genres = set()
@@ -132,160 +153,137 @@ class RecommendationService:
             genre=genre
         )
 
-    def _get_similar_recommendations(
-        self, 
-        books: List[Book], 
+    async def _get_similar_books(
+        self,
         user_preferences: Dict[str, float],
-        limit: int
+        limit: int,
+        exclude_ids: Set[int],
+        genre: Optional[str] = None
     ) -> List[Tuple[Book, float, str]]:
-        """Get recommendations based on genre preferences."""
-        # First collect exact genre sets from user's preferences to prioritize exact matches
-        logging.info(f"User preferences: {user_preferences}")
-        
-        user_genre_sets = set()
-        for genre_set in books:
-            if not genre_set.genres or not set(genre_set.genres).intersection(set(user_preferences.keys())):
-                continue
-            user_genre_sets.add(frozenset(genre_set.genres))
-            
-        logging.info(f"User genre sets: {[list(gs) for gs in user_genre_sets]}")
+        """
+        SIMILAR ranking over the cached catalog genre matrix (see
+        GenreMatrix.top_k for the score); ties go to the lower id. Only the top
+        `limit` books are loaded.
+        """
+        matrix = await genre_matrix_cache.get(self.db)
+        ranked = matrix.top_k(user_preferences, limit, exclude_ids, genre)
+        if not ranked:
+            return []
+        books = {book.id: book for book in (await self.db.scalars(
+            select(Book).where(Book.id.in_([book_id for book_id, _ in ranked]))
+        )).all()}
 
         scored_books = []
-        for book in books:
-            if not book.genres:
+        for book_id, score in ranked:
+            book = books.get(book_id)
+            if book is None:  # Deleted since the matrix was built
                 continue
+            matching_genres = [g for g in book.genres or [] if g in user_preferences]
+            scored_books.append((book, score, f"Matches your interest in {', '.join(matching_genres)}"))
+        return scored_books
 
-            # Find matching genres
-            book_genres = set(book.genres)
-            logging.info(f"Book {book.title} genres: {book_genres}")
-            matching_genres = [g for g in book.genres if g in user_preferences]
-            if not matching_genres:
-                logging.info(f"Book {book.title} has no matching genres")
-                continue
-            logging.info(f"Book {book.title} matching genres: {matching_genres}")
-            
-            # Calculate match percentages and bonuses
-            n_matches = len(matching_genres)
-            n_book_genres = len(book_genres)
-            
-            # Score based on total preference weight of matching genres
-            preference_score = 0
-            for genre in matching_genres:
-                # Perfect match gets full weight
-                if genre in book.genres:
-                    preference_score += user_preferences[genre]
-                # Partial match gets reduced weight
-                else:
-                    preference_score += user_preferences[genre] * 0.5
-            base_score = preference_score * 100.0  # Scale up to make preference matches dominant
-            logging.info(f"Book {book.title}: Base score {base_score} from preference score {preference_score}")
-            
-            # Add bonus for matching more genres as a percentage
-            match_percentage = n_matches / n_book_genres
-            percentage_bonus = match_percentage * 10.0  # Up to 10 points for 100% match
-            logging.info(f"Book {book.title}: Percentage bonus {percentage_bonus} from {n_matches}/{n_book_genres} matches")
-            
-            # Calculate exact genre set match bonus for exact user genre sets
-            exact_match_bonus = 50.0 if frozenset(book.genres) in user_genre_sets else 0.0
-            logging.info(f"Book {book.title}: Exact match bonus {exact_match_bonus}")
-            
-            # Combine scores with proper weighting - weighted preference score dominates
-            final_score = base_score + percentage_bonus + exact_match_bonus
-            
-            # Add a tiny boost for higher ratings only to break ties
-            rating_boost = (float(book.average_rating or 3.0) - 3.0) / 1000.0
-            final_score += rating_boost
-            logging.info(f"Book {book.title}: Final score {final_score} (base={base_score}, pct_bonus={percentage_bonus}, exact_bonus={exact_match_bonus}, rating_boost={rating_boost})")
-            
-            reason = f"Matches your interest in {', '.join(matching_genres)}"
-            scored_books.append((book, final_score, reason))
-
-        # Sort by score (which already factors in genre matches)
-        return sorted(
-            scored_books,
-            key=lambda x: x[1],  # Sort by score only
-            reverse=True
-        )[:limit]
-
-    def _get_top_rated_recommendations(self, books: List[Book], limit: int, genre: Optional[str] = None) -> List[Tuple[Book, float, str]]:
-        """Get recommendations based on highest ratings and review counts."""
-        scored_books = []
-        for book in books:
-            try:
-                # Use average rating as the base score
-                base_score = float(book.average_rating or 0)
-                
-                # Only apply a small boost based on number of reviews to break ties
-                # between books with same rating
-                review_boost = min((book.total_reviews or 0) / 1000.0, 0.1)
-                
-                final_score = base_score + review_boost
-                
-                reason = f"Top rated book with {book.average_rating:.1f} rating"
-                if book.total_reviews:
-                    reason += f" from {book.total_reviews} reviews"
-                if genre and genre in (book.genres or []):
-                    reason = f"Top rated {genre} book"
-                
-                if final_score > 0:
-                    scored_books.append((book, final_score, reason))
-                    
-            except (TypeError, ValueError):
-                continue
-                
-        return sorted(scored_books, key=lambda x: x[1], reverse=True)[:limit]
+    async def _get_top_rated_books(self, limit: int, genre: Optional[str] = None) -> List[Tuple[Book, float, str]]:
+        """
+        TOP_RATED ranking computed by the database: ORDER BY the indexed score
+        expression with LIMIT, so only the top `limit` books are ever loaded.
+        Score is the average rating plus a review-count tie-break of at most
+        0.1 (TOP_RATED_SCORE_SQL); ties go to the lower id.
+        """
+        score = literal_column(TOP_RATED_SCORE_SQL, Numeric)
+        query = select(Book, score.label("score")).where(score > 0)
+        if genre:
+            query = query.where(self._genre_filter(genre))
+        rows = (await self.db.execute(
+            query.order_by(literal_column(f"{TOP_RATED_SCORE_SQL} DESC"), Book.id).limit(limit)
+        )).all()
+        return [(book, float(book_score), self._top_rated_reason(book, genre)) for book, book_score in rows]
 
-    async def _get_book_embeddings(self, book: Book) -> Optional[List[float]]:
-        """Get embeddings for book content using OpenAI API"""
-        cache_key = f"book_embedding:{book.id}"
-        
-        # Try to get from cache first
-        if self.cache:
-            cached = self.cache.get(cache_key)
-            if cached:
-                return json.loads(cached)
-        
-        # Create a rich text representation of the book
-        text = (
+    def _top_rated_reason(self, book: Book, genre: Optional[str]) -> str:
+        reason = f"Top rated book with {float(book.average_rating or 0):.1f} rating"
+        if book.total_reviews:
+            reason += f" from {book.total_reviews} reviews"
+        matched = self._matching_genres(book, genre)
+        if matched:
+            reason = f"Top rated {matched[0]} book"
+        return reason
+
+    @staticmethod
+    def _genre_filter(genre: str):
+        """SQL form of genre_matches: EXISTS a genre of the book containing `genre`, ignoring case"""
+        name = func.unnest(Book.genres).column_valued("genre_name")
+        return select(name).where(name.icontains(genre, autoescape=True)).exists()
+
+    @staticmethod
+    def _matching_genres(book: Book, genre: Optional[str]) -> List[str]:
+        if not genre:
+            return []
+        return [name for name in book.genres or [] if genre_matches(name, genre)]
+
+    def _book_embedding_text(self, book: Book) -> str:
+        """Rich text representation of a book, the input to its embedding"""
+        return (
             f"Title: {book.title}\n"
             f"Author: {book.author}\n"
             f"Genres: {', '.join(book.genres or [])}\n"
             f"Description: {book.description or ''}"
         )
-        
+
+    async def _embed_book(self, book: Book, text: str) -> Optional[List[float]]:
+        """Get embeddings for book content using OpenAI API"""
         try:
             response = await self.openai_client.embeddings.create(
                 model="text-embedding-ada-002",
                 input=text
             )
-            embedding = response.data[0].embedding
-            
-            # Cache the embedding
-            if self.cache:
-                self.cache.setex(
-                    cache_key,
-                    self.cache_ttl,
-                    json.dumps(embedding)
-                )
-            
-            return embedding
+            return response.data[0].embedding
         except Exception as e:
             logging.error(f"Error getting embeddings for book {book.id}: {str(e)}")
             return None
 
+    async def _get_book_embedding_rows(self, books: List[Book]) -> np.ndarray:
+        """
+        Embedding store row for each book (-1 where unavailable). Books without a
+        current embedding are embedded concurrently and appended to the store,
+        so each book text is paid for once.
+        """
+        texts = [self._book_embedding_text(book) for book in books]
+        digests = [text_digest(text) for text in texts]
+        rows = self.embedding_store.rows([book.id for book in books], digests)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing) and self.openai_client is not None:
+            semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+
+            async def embed(i: int) -> Optional[List[float]]:
+                async with semaphore:
+                    return await self._embed_book(books[i], texts[i])
+
+            embeddings = await asyncio.gather(*(embed(i) for i in missing))
+            embedded = [(i, embedding) for i, embedding in zip(missing, embeddings) if embedding]
+            if embedded:
+                self.embedding_store.add(
+                    [books[i].id for i, _ in embedded],
+                    [digests[i] for i, _ in embedded],
+                    [embedding for _, embedding in embedded]
+                )
+                rows = self.embedding_store.rows([book.id for book in books], digests)
+        return rows
+
     async def _get_user_interest_embedding(self, user_id: int) -> Optional[List[float]]:
         """Get an embedding representing user's reading interests"""
         cache_key = f"user_embedding:{user_id}"
         
         # Try cache first
-        if self.cache:
-            cached = self.cache.get(cache_key)
-            if cached:
-                return json.loads(cached)
+        cached = await self._cache_get(cache_key)
+        if cached:
+            return json.loads(cached)
         
         # Get user's favorite and reviewed books
-        favorites = self.db.query(Book).join(UserFavorite).filter(UserFavorite.user_id == user_id).all()
-        reviews = self.db.query(Book, Review).join(Review).filter(Review.user_id == user_id).all()
+        favorites = (await self.db.scalars(
+            select(Book).join(UserFavorite).where(UserFavorite.user_id == user_id)
+        )).all()
+        reviews = (await self.db.execute(
+            select(Book, Review).join(Review).where(Review.user_id == user_id)
+        )).all()
         
         if not favorites and not reviews:
             return None
@@ -315,57 +313,78 @@ class RecommendationService:
             embedding = response.data[0].embedding
             
             # Cache the embedding
-            if self.cache:
-                self.cache.setex(
-                    cache_key,
-                    self.cache_ttl,
-                    json.dumps(embedding)
-                )
+            await self._cache_set(cache_key, json.dumps(embedding))
             
             return embedding
         except Exception as e:
             logging.error(f"Error getting user interest embedding: {str(e)}")
             return None
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if not vec1 or not vec2:
-            return 0.0
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        return float(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
+    async def embed_books(self, books: List[Book]) -> None:
+        """Make sure the embedding store holds a current embedding for each book."""
+        await self._get_book_embedding_rows(books)
+
+    async def _embed_new_books(self) -> None:
+        """Embed books added since the store last grew (ids above the highest stored one)."""
+        new_books = (await self.db.scalars(
+            select(Book).where(Book.id > self.embedding_store.max_book_id).order_by(Book.id).limit(NEW_BOOK_EMBEDDING_LIMIT)
+        )).all()
+        if new_books:
+            await self.embed_books(new_books)
 
     async def _get_ai_recommendations(
         self,
-        books: List[Book],
         user_id: int,
         limit: int,
+        exclude_ids: Set[int],
         genre: Optional[str] = None
     ) -> List[Tuple[Book, float, str]]:
         """Get AI-powered recommendations using OpenAI embeddings"""
+        if self.openai_client is None:
+            logging.warning("OpenAI client not configured, skipping AI recommendations")
+            return []
         try:
             # Get user's interest embedding
             user_embedding = await self._get_user_interest_embedding(user_id)
             if not user_embedding:
                 return []
             
+            await self._embed_new_books()
+
+            # Nearest neighbours from the index; read/favourite books and the genre
+            # filter are applied afterwards, so fetch enough to still fill the page
+            fetch = (limit + len(exclude_ids)) * (AI_GENRE_OVERFETCH if genre else 1)
+            # The exact scan (or building/extending the index) reads the whole store; keep it off the event loop
+            rows, _ = await asyncio.to_thread(
+                self.embedding_search.search, np.asarray(user_embedding, dtype=np.float32), fetch
+            )
+            rows = rows[self.embedding_store.is_latest(rows)]
+            neighbour_ids = [book_id for book_id in map(int, self.embedding_store.book_ids(rows)) if book_id not in exclude_ids]
+            if not neighbour_ids:
+                return []
+            query = select(Book).where(Book.id.in_(neighbour_ids))
+            if genre:
+                query = query.where(self._genre_filter(genre))
+            books = (await self.db.scalars(query)).all()
+
+            # Re-embeds neighbours whose text changed since they were stored, then scores them exactly
+            rows = await self._get_book_embedding_rows(books)
+            available = np.flatnonzero(rows >= 0)
+            similarities = self.embedding_store.similarities(user_embedding, rows[available])
+
             scored_books = []
-            for book in books:
-                # Get book embedding
-                book_embedding = await self._get_book_embeddings(book)
-                if not book_embedding:
-                    continue
-                
-                # Calculate similarity score
-                similarity = self._cosine_similarity(user_embedding, book_embedding)
-                
+            for i, similarity in zip(available, similarities):
+                book = books[i]
+                similarity = float(similarity)
+
                 # Apply genre boost if matching requested genre
-                if genre and genre in (book.genres or []):
+                matched = self._matching_genres(book, genre)
+                if matched:
                     similarity *= 1.2
                 
                 # Create explanation
                 reason = "AI recommendation based on your reading history"
-                if genre and genre in (book.genres or []):
+                if matched:
                     reason = f"AI recommendation matching your interest in {genre}"
                 
                 scored_books.append((book, similarity, reason))
@@ -386,33 +405,34 @@ class RecommendationService:
     ) -> Dict[str, any]:
         """Get personalized book recommendations for a user."""
         try:
+            if recommendation_type not in (RecommendationType.AI, RecommendationType.SIMILAR):
+                # Top rated is the same for every user: rank in SQL, no candidate set needed
+                scored_books = await self._get_top_rated_books(limit, genre)
+                return {
+                    "recommendations": [
+                        self._create_book_recommendation(book=book, score=score, reason=reason)
+                        for book, score, reason in scored_books
+                    ],
+                    "is_fallback": False,
+                    "recommendation_type": recommendation_type,
+                    "is_ai_powered": False
+                }
+
             # Get user's read books to exclude
             exclude_ids = set()
-            user_reviews = self.db.query(Review).filter(Review.user_id == user_id).all()
-            user_favorites = self.db.query(UserFavorite).filter(UserFavorite.user_id == user_id).all()
-            
-            for review in user_reviews:
-                exclude_ids.add(review.book_id)
-            for favorite in user_favorites:
-                exclude_ids.add(favorite.book_id)
-
-            # Query books excluding read ones and applying filters
-            query = self.db.query(Book).filter(Book.id.notin_(exclude_ids))
-            if genre:
-                query = query.filter(Book.genres.isnot(None), func.array_to_string(Book.genres, ',', '').ilike(f'%{genre}%'))
-            books = query.all()
+            exclude_ids.update((await self.db.scalars(
+                select(Review.book_id).where(Review.user_id == user_id)
+            )).all())
+            exclude_ids.update((await self.db.scalars(
+                select(UserFavorite.book_id).where(UserFavorite.user_id == user_id)
+            )).all())
 
             # Get recommendations based on type
-            if recommendation_type == RecommendationType.TOP_RATED:
-                # Always use all books, ignore user
-                all_books = self.db.query(Book).all()
-                scored_books = self._get_top_rated_recommendations(all_books, limit, genre)
-                is_ai_powered = False
-            elif recommendation_type == RecommendationType.AI:
+            if recommendation_type == RecommendationType.AI:
                 try:
                     logging.info("Attempting AI recommendations")
-                    # Use all books, but AI logic is based on user favorites
-                    scored_books = await self._get_ai_recommendations(books, user_id, limit, genre)
+                    # Nearest books to the user's interest embedding, minus read ones
+                    scored_books = await self._get_ai_recommendations(user_id, limit, exclude_ids, genre)
                     logging.info("AI recommendations succeeded")
                     is_ai_powered = True
                 except Exception as e:
@@ -421,18 +441,13 @@ class RecommendationService:
                     is_ai_powered = False
                 # No fallback for AI
             elif recommendation_type == RecommendationType.SIMILAR:
-                user_preferences = self._get_user_genre_preferences(user_id)
+                user_preferences = await self._get_user_genre_preferences(user_id)
                 is_fallback = False
                 if user_preferences:
-                    scored_books = self._get_similar_recommendations(books, user_preferences, limit)
+                    scored_books = await self._get_similar_books(user_preferences, limit, exclude_ids, genre)
                 else:
                     scored_books = []
                 is_ai_powered = False
-            else:
-                # Default fallback to top rated
-                all_books = self.db.query(Book).all()
-                scored_books = self._get_top_rated_recommendations(all_books, limit, genre)
-                is_ai_powered = False
 
             # Ensure scored_books and is_ai_powered are always defined
             if 'scored_books' not in locals():
@@ -459,7 +474,7 @@ class RecommendationService:
             
         except Exception as e:
             logging.error(f"Error in get_recommendations: {str(e)}")
-            recommendations = self._get_popular_books(limit)
+            recommendations = await self._get_popular_books(limit)
             return {
                 "recommendations": recommendations,
                 "is_fallback": True,
@@ -1,212 +1,305 @@
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Tuple
-from sqlalchemy import and_, or_, func
-from sqlalchemy.orm import Session
-from app.db.models import Review, ReviewVote, Book
+from typing import List, Optional, Tuple, Union
+from sqlalchemy import DateTime, and_, case, false, func, literal, null, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from app.core.cache import bump_cache_version
+from app.core.config import get_settings
+from app.db.models import Review, ReviewVote, Book, User
 from app.schemas.review import ReviewCreate, ReviewUpdate, ReviewVoteCreate, ReviewSearchParams
+from app.services.counting import count_rows
+from app.services.pagination import decode_cursor, fetch_keyset_page, keyset_order_by, next_cursor
+from app.services.suggest import suggestion_index
+from app.services.vote_buffer import vote_buffer
+
+# Reviews can be edited within this long of creation
+EDIT_WINDOW = timedelta(hours=24)
+
+# Upserts a vote on an active review (never the voter's own). The vote CTE returns whether
+# the vote was inserted (true) or flipped (false), and no row when it was left unchanged;
+# xmax is 0 only for freshly inserted rows.
+VOTE_UPSERT_CTES = """
+    WITH target AS (
+        SELECT id, user_id FROM reviews
+        WHERE id = :review_id AND NOT coalesce(is_deleted, false)
+    ), vote AS (
+        INSERT INTO review_votes (user_id, review_id, is_helpful, created_at)
+        SELECT :user_id, id, :is_helpful, :now FROM target WHERE user_id <> :user_id
+        ON CONFLICT ON CONSTRAINT uix_user_review_vote DO UPDATE SET is_helpful = EXCLUDED.is_helpful
+        WHERE review_votes.is_helpful IS DISTINCT FROM EXCLUDED.is_helpful
+        RETURNING (xmax = 0) AS inserted
+    )
+"""
+
+# Applies the vote's delta to the review's counters, chained after VOTE_UPSERT_CTES
+VOTE_COUNT_CTE = """
+    , counted AS (
+        UPDATE reviews SET
+            helpful_votes = helpful_votes
+                + CASE WHEN :is_helpful THEN 1 WHEN NOT vote.inserted THEN -1 ELSE 0 END,
+            unhelpful_votes = unhelpful_votes
+                + CASE WHEN NOT :is_helpful THEN 1 WHEN NOT vote.inserted THEN -1 ELSE 0 END
+        FROM vote
+        WHERE reviews.id = :review_id
+        RETURNING reviews.id
+    )
+"""
+
+# One row for an active review: its author and vote.inserted (NULL when unchanged)
+VOTE_RESULT_SELECT = """
+    SELECT target.user_id AS author_id, vote.inserted
+    FROM target LEFT JOIN vote ON true
+"""
+
+# Vote only; the counters are applied later by the vote buffer (write-behind)
+VOTE_UPSERT_SQL = VOTE_UPSERT_CTES + VOTE_RESULT_SELECT
+
+# Vote and counter update in a single statement
+VOTE_UPSERT_AND_COUNT_SQL = VOTE_UPSERT_CTES + VOTE_COUNT_CTE + VOTE_RESULT_SELECT
 
 class ReviewService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
+        # The *_async read methods need an AsyncSession; everything else a Session
         self.db = db
 
     def get_review(self, review_id: int) -> Optional[Review]:
         return self.db.query(Review).filter(Review.id == review_id, Review.is_deleted == False).first()
 
-    def get_reviews(self, params: ReviewSearchParams) -> Tuple[List[Review], int]:
-        query = self.db.query(Review).filter(Review.is_deleted == False)
+    async def get_review_async(self, review_id: int) -> Optional[Review]:
+        """Active review with its author loaded (async sessions cannot lazy-load)"""
+        statement = select(Review).options(joinedload(Review.user)).where(
+            Review.id == review_id, Review.is_deleted == False
+        )
+        return (await self.db.execute(statement)).scalar_one_or_none()
+
+    def get_review_version(self, review_id: int) -> Optional[Tuple[int, datetime]]:
+        """(row_version, created_at) of an active review, or None, without loading the row"""
+        return self.db.execute(self._review_version_statement(review_id)).first()
+
+    async def get_review_version_async(self, review_id: int) -> Optional[Tuple[int, datetime]]:
+        return (await self.db.execute(self._review_version_statement(review_id))).first()
+
+    def _review_version_statement(self, review_id: int):
+        return select(Review.row_version, Review.created_at).where(
+            Review.id == review_id, Review.is_deleted == False
+        )
+
+    # Sort options mapped to (non-null) Review columns; each is paired with id for keyset pages
+    SORT_COLUMNS = {
+        'date': Review.created_at,
+        'rating': Review.rating,
+        'votes': Review.helpful_votes,
+    }
+
+    # Columns of a review listing row; the author's email comes from the joined users row
+    LISTING_COLUMNS = (
+        Review.id, Review.text, Review.rating, Review.user_id, Review.book_id, Review.created_at,
+        Review.updated_at, Review.is_deleted, Review.helpful_votes, Review.unhelpful_votes,
+    )
+
+    def get_reviews(self, params: ReviewSearchParams) -> Tuple[List[Review], Optional[int]]:
+        query = self._filter_reviews(self.db.query(Review), params)
+        total_count = self._count_reviews(query, params)
+        query = self._sort_reviews(query, params)
         
-        # Apply filters
+        # Apply pagination
+        query = query.offset((params.page - 1) * params.items_per_page).limit(params.items_per_page)
+        
+        return query.all(), total_count
+
+    def get_review_rows(self, params: ReviewSearchParams) -> Tuple[List, Optional[int], Optional[str]]:
+        """
+        Listing page as lightweight rows (LISTING_COLUMNS plus user_email) fetched
+        with the authors in one joined statement, instead of Review entities that
+        lazy-load their user one row at a time.
+
+        The first page and pages requested with a cursor (params.after) are read by
+        keyset on (sort column, id); other pages fall back to OFFSET.
+
+        Returns:
+            Tuple of (rows, total count or None, cursor for the next page or None)
+        """
+        filtered = self._filter_reviews(self.db.query(Review), params)
+        total_count = self._count_reviews(filtered, params)
+
+        query = self._filter_reviews(
+            self.db.query(*self.LISTING_COLUMNS, User.email.label("user_email")).join(User, User.id == Review.user_id),
+            params
+        )
+        sort_key, sort_column, sort_order = self._sort_spec(params)
+        limit = params.items_per_page
+        if params.after or params.page == 1:
+            after = decode_cursor(params.after, sort_key, sort_order) if params.after else None
+            rows = fetch_keyset_page(query, sort_column, Review.id, sort_order, limit, after, nullable=False)
+        else:
+            query = query.order_by(*keyset_order_by(sort_column, Review.id, sort_order))
+            rows = query.offset((params.page - 1) * limit).limit(limit + 1).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = next_cursor(rows, has_more, sort_key, sort_order,
+                             value_getter=lambda row: getattr(row, sort_column.key))
+        return rows, total_count, cursor
+
+    def _filter_reviews(self, query, params: ReviewSearchParams):
+        query = query.filter(Review.is_deleted == False)
         if params.book_id:
             query = query.filter(Review.book_id == params.book_id)
         if params.user_id:
             query = query.filter(Review.user_id == params.user_id)
         if params.rating:
             query = query.filter(Review.rating == params.rating)
-        
-        # Get total count before pagination
-        total_count = query.count()
-        
-        # Apply sorting
-        if params.sort_by:
-            if params.sort_by == 'date':
-                sort_column = Review.created_at
-            elif params.sort_by == 'rating':
-                sort_column = Review.rating
-            elif params.sort_by == 'votes':
-                sort_column = Review.helpful_votes
-            
-            if params.sort_order == 'desc':
-                sort_column = sort_column.desc()
-            query = query.order_by(sort_column)
-        else:
-            # Default sort by latest
-            query = query.order_by(Review.created_at.desc())
-        
-        # Apply pagination
-        query = query.offset((params.page - 1) * params.items_per_page).limit(params.items_per_page)
-        
-        return query.all(), total_count
+        return query
+
+    def _count_reviews(self, query, params: ReviewSearchParams) -> Optional[int]:
+        if not params.include_total:
+            return None
+        count_key = (params.book_id, params.user_id, params.rating)
+        return count_rows(self.db, query, params.count_strategy, namespace='reviews', key=count_key)
+
+    def _sort_spec(self, params: ReviewSearchParams):
+        """(cursor key, sort column, order) for the requested sort; latest first by default"""
+        if not params.sort_by:
+            return 'date', Review.created_at, 'desc'
+        return params.sort_by, self.SORT_COLUMNS[params.sort_by], params.sort_order or 'asc'
+
+    def _sort_reviews(self, query, params: ReviewSearchParams):
+        _, sort_column, sort_order = self._sort_spec(params)
+        # id breaks ties so pages never overlap or skip rows
+        return query.order_by(*keyset_order_by(sort_column, Review.id, sort_order))
 
     def create_review(self, user_id: int, review_data: ReviewCreate) -> Review:
-        print(f"ReviewService: Creating review for user {user_id} on book {review_data.book_id}")
-        
-        # Verify book exists
-        book = self.db.query(Book).filter(Book.id == review_data.book_id).first()
-        if not book:
-            print(f"ReviewService: Book {review_data.book_id} not found")
+        """
+        Create the user's review of a book, or overwrite the one they already wrote.
+
+        One INSERT ... ON CONFLICT statement in one transaction: the book check is the
+        INSERT's SELECT, an existing (or soft-deleted) review is updated in place, and
+        the reviews_book_rating_trigger folds the rating into the book's aggregates.
+        """
+        now = datetime.now(timezone.utc)
+        reviews = Review.__table__.c
+        statement = pg_insert(Review).from_select(
+            ["user_id", "book_id", "text", "rating", "created_at", "is_deleted", "helpful_votes", "unhelpful_votes"],
+            # Selects nothing, and so inserts nothing, when the book does not exist
+            select(
+                literal(user_id), Book.id, literal(review_data.text), literal(review_data.rating),
+                literal(now, DateTime(timezone=True)), false(), literal(0), literal(0)
+            ).where(Book.id == review_data.book_id)
+        )
+        revived = reviews.is_deleted.is_(True)
+        statement = statement.on_conflict_do_update(
+            constraint="uix_user_book_review",
+            set_={
+                "text": statement.excluded.text,
+                "rating": statement.excluded.rating,
+                "is_deleted": False,
+                # A deleted review comes back as a new one, with a fresh edit window
+                "created_at": case((revived, statement.excluded.created_at), else_=reviews.created_at),
+                "updated_at": case((revived, null()), else_=statement.excluded.created_at),
+            }
+        ).returning(*reviews)
+
+        db_review = self.db.scalars(
+            select(Review).from_statement(statement), execution_options={"populate_existing": True}
+        ).first()
+        if db_review is None:
+            self.db.rollback()
             raise ValueError(f"Book with ID {review_data.book_id} not found")
+        self.db.commit()
 
-        try:
-            # Check if user has already reviewed this book
-            existing_review = self.db.query(Review).filter(
-                Review.user_id == user_id,
-                Review.book_id == review_data.book_id,
-                Review.is_deleted == False
-            ).first()
-            
-            if existing_review:
-                print(f"ReviewService: Updating existing review {existing_review.id}")
-                # Update the existing review instead of raising error
-                existing_review.text = review_data.text
-                existing_review.rating = review_data.rating
-                existing_review.updated_at = datetime.now(timezone.utc)
-                self.db.commit()
-                self.db.refresh(existing_review)
-                # Now update book stats after review update
-                self._update_book_rating(review_data.book_id)
-                return existing_review
-
-            print(f"ReviewService: Creating new review")
-            # Create new review
-            db_review = Review(
-                user_id=user_id,
-                book_id=review_data.book_id,
-                text=review_data.text,
-                rating=review_data.rating,
-                created_at=datetime.now(timezone.utc)
-            )
-            self.db.add(db_review)
-            self.db.commit()
-            print(f"ReviewService: New review committed to database")
-            self.db.refresh(db_review)
-            # Now update book stats after review commit/refresh
-            self._update_book_rating(review_data.book_id)
-            print(f"ReviewService: Book rating updated")
-            return db_review
-        except Exception as e:
-            print(f"ReviewService Error: {str(e)}")
-            import traceback
-            print(f"ReviewService Traceback: {traceback.format_exc()}")
-            raise
+        self._book_rating_changed(review_data.book_id)
+        bump_cache_version('reviews')
+        return db_review
 
     def update_review(self, user_id: int, review_id: int, review_data: ReviewUpdate) -> Optional[Review]:
-        db_review = self.get_review(review_id)
-        if not db_review or db_review.user_id != user_id:
-            return None
+        now = datetime.now(timezone.utc)
+        update_data = {field: value for field, value in review_data.model_dump(exclude_unset=True).items() if value is not None}
 
-        # Check 24-hour edit window
-        if datetime.now(timezone.utc) - db_review.created_at > timedelta(hours=24):
-            raise ValueError("Review can only be edited within 24 hours of creation")
-
-        # Update fields
-        update_data = review_data.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_review, field, value)
-        
-        db_review.updated_at = datetime.now(timezone.utc)
+        # Ownership and the 24-hour edit window are part of the UPDATE itself
+        db_review = self.db.scalars(
+            update(Review)
+            .where(
+                Review.id == review_id,
+                Review.user_id == user_id,
+                Review.is_deleted == False,
+                Review.created_at > now - EDIT_WINDOW
+            )
+            .values(**update_data, updated_at=now)
+            .returning(Review),
+            execution_options={"populate_existing": True}
+        ).first()
+        if db_review is None:
+            # Only failed edits pay for telling a closed window from a missing review
+            existing = self.get_review(review_id)
+            if existing and existing.user_id == user_id:
+                raise ValueError("Review can only be edited within 24 hours of creation")
+            return None
         self.db.commit()
-        self.db.refresh(db_review)
 
-        # If rating was updated, update book's average rating
+        # If rating was updated, the book's average rating changed
         if 'rating' in update_data:
-            self._update_book_rating(db_review.book_id)
+            self._book_rating_changed(db_review.book_id)
+        bump_cache_version('reviews')
 
         return db_review
 
     def delete_review(self, user_id: int, review_id: int) -> bool:
-        db_review = self.get_review(review_id)
-        if not db_review or db_review.user_id != user_id:
-            return False
-
         # Soft delete
-        db_review.is_deleted = True
-        db_review.updated_at = datetime.now(timezone.utc)
+        book_id = self.db.execute(
+            update(Review)
+            .where(Review.id == review_id, Review.user_id == user_id, Review.is_deleted == False)
+            .values(is_deleted=True, updated_at=datetime.now(timezone.utc))
+            .returning(Review.book_id)
+        ).scalar_one_or_none()
+        if book_id is None:
+            return False
         self.db.commit()
 
-        # Update book's average rating and review count
-        self._update_book_rating(db_review.book_id)
+        # The book's average rating and review count changed
+        self._book_rating_changed(book_id)
+        bump_cache_version('reviews')
         
         return True
 
     def vote_review(self, user_id: int, review_id: int, vote_data: ReviewVoteCreate) -> bool:
-        db_review = self.get_review(review_id)
-        if not db_review:
-            return False
-
-        # Check if user is trying to vote on their own review
-        if db_review.user_id == user_id:
-            raise ValueError("Cannot vote on your own review")
-
-        # Check for existing vote
-        existing_vote = self.db.query(ReviewVote).filter(
-            ReviewVote.user_id == user_id,
-            ReviewVote.review_id == review_id
+        """
+        Record or change the user's vote in one statement. The vote upsert reports
+        whether it inserted a vote, flipped one or changed nothing, and the review's
+        counters are moved by that delta instead of being recounted.
+        """
+        write_behind = get_settings().REVIEW_VOTE_WRITE_BEHIND
+        row = self.db.execute(
+            text(VOTE_UPSERT_SQL if write_behind else VOTE_UPSERT_AND_COUNT_SQL),
+            {"user_id": user_id, "review_id": review_id, "is_helpful": vote_data.is_helpful,
+             "now": datetime.now(timezone.utc)}
         ).first()
+        if row is None or row.author_id == user_id:
+            self.db.rollback()  # Nothing was written; end the transaction before reporting
+            if row is None:
+                return False
+            raise ValueError("Cannot vote on your own review")
+        self.db.commit()
 
-        if existing_vote:
-            # Update existing vote if different
-            if existing_vote.is_helpful != vote_data.is_helpful:
-                existing_vote.is_helpful = vote_data.is_helpful
-                self.db.commit()
-        else:
-            # Create new vote
-            db_vote = ReviewVote(
-                user_id=user_id,
-                review_id=review_id,
-                is_helpful=vote_data.is_helpful
-            )
-            self.db.add(db_vote)
-            self.db.commit()
-
-        # Update helpful/unhelpful counts
-        self._update_vote_counts(review_id)
+        if row.inserted is not None:
+            flipped = 0 if row.inserted else -1
+            helpful_delta, unhelpful_delta = (1, flipped) if vote_data.is_helpful else (flipped, 1)
+            if write_behind:
+                vote_buffer.add(review_id, helpful_delta, unhelpful_delta)
+            else:
+                bump_cache_version('reviews')
         return True
 
-    def _update_book_rating(self, book_id: int, commit: bool = True) -> None:
-        """Update book's average rating and total reviews count"""
-        # Get all active reviews for the book
-        reviews = self.db.query(Review).filter(
-            Review.book_id == book_id,
-            Review.is_deleted == False
-        ).all()
-        total_reviews = len(reviews)
-        if total_reviews > 0:
-            average_rating = round(sum(r.rating for r in reviews) / total_reviews, 1)
-        else:
-            average_rating = 0.0
-
-        # Update book
-        book = self.db.query(Book).filter(Book.id == book_id).first()
+    def _book_rating_changed(self, book_id: int) -> None:
+        """
+        Propagate a book's rating aggregates after a review write. The
+        reviews_book_rating_trigger has already applied the write's delta to the
+        book in the same transaction, so this only refreshes derived state.
+        """
+        book = self.db.query(
+            Book.id, Book.title, Book.author, Book.average_rating, Book.total_reviews
+        ).filter(Book.id == book_id).first()
         if book:
-            book.average_rating = average_rating
-            book.total_reviews = total_reviews
-            if commit:
-                self.db.commit()
-
-    def _update_vote_counts(self, review_id: int) -> None:
-        """Update helpful and unhelpful vote counts for a review"""
-        helpful_count = self.db.query(func.count(ReviewVote.id)).filter(
-            ReviewVote.review_id == review_id,
-            ReviewVote.is_helpful == True
-        ).scalar()
-
-        unhelpful_count = self.db.query(func.count(ReviewVote.id)).filter(
-            ReviewVote.review_id == review_id,
-            ReviewVote.is_helpful == False
-        ).scalar()
-
-        review = self.get_review(review_id)
-        if review:
-            review.helpful_votes = helpful_count
-            review.unhelpful_votes = unhelpful_count
-            self.db.commit()
+            # Rating changes shift the book's suggestion weight and cached listings
+            suggestion_index.upsert(book)
+            bump_cache_version('catalog')  # min_rating filters depend on the average
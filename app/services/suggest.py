@@ -0,0 +1,203 @@
+"""In-memory prefix index serving search-as-you-type book suggestions."""
+import bisect
+import heapq
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.db.models import Book
+
+logger = logging.getLogger(__name__)
+
+
+class SuggestionIndex:
+    """
+    Sorted-array prefix index over book titles and authors.
+
+    Every title and author is stored as a normalized key in one sorted list, so a
+    prefix lookup is two binary searches plus a scan of the matching range. Ranked
+    results for short (and therefore wide) prefixes are memoized until a write
+    touches a key under that prefix.
+    """
+    CACHED_PREFIX_LENGTH = 3
+    MAX_LIMIT = 20
+    REFRESH_SECONDS = 300  # Full rebuild interval; picks up writes made by other workers
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._entries: List[Tuple[str, str, int]] = []  # (normalized key, kind, book_id), sorted
+        self._books: Dict[int, Tuple[str, str, float]] = {}  # book_id -> (title, author, weight)
+        self._top_cache: Dict[str, List[Tuple[float, str, str, Optional[int]]]] = {}
+        self._built_at: Optional[float] = None
+
+    @staticmethod
+    def normalize(text: Optional[str]) -> str:
+        """Lowercase and collapse whitespace."""
+        return " ".join((text or "").lower().split())
+
+    @staticmethod
+    def weight(average_rating, total_reviews) -> float:
+        """Popularity weight: rating scaled by the (log) number of reviews."""
+        return float(average_rating or 0) * math.log2(2 + (total_reviews or 0))
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at is not None
+
+    def is_stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.REFRESH_SECONDS
+
+    def expire(self) -> None:
+        """Mark a built index stale so the next lookup triggers a background rebuild."""
+        with self._lock:
+            if self.is_built:
+                self._built_at = float("-inf")
+
+    def build(self, rows) -> None:
+        """Replace the index contents with the given book rows."""
+        books = {}
+        entries = []
+        for row in rows:
+            books[row.id] = (row.title, row.author, self.weight(row.average_rating, row.total_reviews))
+            entries.extend(self._entries_for(row.id, row.title, row.author))
+        entries.sort()
+
+        with self._lock:
+            self._books = books
+            self._entries = entries
+            self._top_cache = {}
+            self._built_at = time.monotonic()
+        logger.info(f"Suggestion index built with {len(books)} books")
+
+    def upsert(self, book) -> None:
+        """Add or refresh a single book. No-op until the index has been built."""
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove_locked(book.id)
+            self._books[book.id] = (
+                book.title, book.author, self.weight(book.average_rating, book.total_reviews)
+            )
+            for entry in self._entries_for(book.id, book.title, book.author):
+                bisect.insort(self._entries, entry)
+                self._invalidate_prefixes(entry[0])
+
+    def remove(self, book_id: int) -> None:
+        """Drop a book from the index."""
+        with self._lock:
+            if self.is_built:
+                self._remove_locked(book_id)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """
+        Top title/author completions for a prefix.
+
+        Returns:
+            List of dicts with text, kind ("title" or "author"), book_id and score
+        """
+        key = self.normalize(prefix)
+        if not key:
+            return []
+        limit = min(limit, self.MAX_LIMIT)
+
+        with self._lock:
+            ranked = self._top_cache.get(key)
+            if ranked is None:
+                ranked = self._rank(key)
+                if len(key) <= self.CACHED_PREFIX_LENGTH:
+                    self._top_cache[key] = ranked
+
+        return [
+            {"text": text, "kind": kind, "book_id": book_id, "score": round(score, 4)}
+            for score, kind, text, book_id in ranked[:limit]
+        ]
+
+    def _entries_for(self, book_id: int, title: str, author: str) -> List[Tuple[str, str, int]]:
+        entries = []
+        if title:
+            entries.append((self.normalize(title), "title", book_id))
+        if author:
+            entries.append((self.normalize(author), "author", book_id))
+        return entries
+
+    def _remove_locked(self, book_id: int) -> None:
+        existing = self._books.pop(book_id, None)
+        if existing is None:
+            return
+        for entry in self._entries_for(book_id, existing[0], existing[1]):
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+            self._invalidate_prefixes(entry[0])
+
+    def _invalidate_prefixes(self, key: str) -> None:
+        for length in range(1, self.CACHED_PREFIX_LENGTH + 1):
+            self._top_cache.pop(key[:length], None)
+
+    def _rank(self, key: str) -> List[Tuple[float, str, str, Optional[int]]]:
+        low = bisect.bisect_left(self._entries, (key,))
+        high = bisect.bisect_left(self._entries, (key + "\uffff",))
+
+        # Titles keep their most popular edition; authors accumulate across their books
+        titles: Dict[str, Tuple[float, str, str, Optional[int]]] = {}
+        authors: Dict[str, Tuple[float, str, str, Optional[int]]] = {}
+        for entry_key, kind, book_id in self._entries[low:high]:
+            title, author, weight = self._books[book_id]
+            if kind == "title":
+                current = titles.get(entry_key)
+                if current is None or weight > current[0]:
+                    titles[entry_key] = (weight, "title", title, book_id)
+            else:
+                current = authors.get(entry_key)
+                total = weight + (current[0] if current else 0.0)
+                authors[entry_key] = (total, "author", author, None)
+
+        # Highest weight first, alphabetical among equals
+        return heapq.nsmallest(
+            self.MAX_LIMIT,
+            list(titles.values()) + list(authors.values()),
+            key=lambda suggestion: (-suggestion[0], suggestion[2])
+        )
+
+
+suggestion_index = SuggestionIndex()
+
+
+def _load_rows(db: Session):
+    return db.query(
+        Book.id, Book.title, Book.author, Book.average_rating, Book.total_reviews
+    ).yield_per(10000)
+
+
+def _refresh_in_background() -> None:
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        suggestion_index.build(_load_rows(db))
+    except Exception as e:
+        logger.error(f"Suggestion index refresh failed: {str(e)}")
+    finally:
+        db.close()
+        suggestion_index._build_lock.release()
+
+
+def get_suggestion_index(db: Session) -> SuggestionIndex:
+    """
+    Return the shared index.
+
+    The first call builds it from the books table; afterwards a stale index keeps
+    serving while a background thread rebuilds it.
+    """
+    if not suggestion_index.is_built:
+        with suggestion_index._build_lock:
+            if not suggestion_index.is_built:
+                suggestion_index.build(_load_rows(db))
+    elif suggestion_index.is_stale() and suggestion_index._build_lock.acquire(blocking=False):
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return suggestion_index
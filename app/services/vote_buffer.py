@@ -0,0 +1,136 @@
+"""Write-behind buffer coalescing review vote counter deltas into batched updates."""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from redis import RedisError
+from sqlalchemy import text
+
+from app.core.cache import bump_cache_version, get_redis, mark_redis_down
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+Deltas = Dict[int, List[int]]  # review_id -> [helpful delta, unhelpful delta]
+
+
+class VoteCounterBuffer:
+    """
+    Accumulates helpful/unhelpful deltas per review and applies them in one
+    UPDATE per flush, so a burst of votes on a popular review costs a single
+    row lock instead of one per vote.
+
+    Deltas live in a Redis hash shared by all workers when Redis is reachable,
+    otherwise in process memory. Counters lag the vote rows by up to one flush
+    interval; the votes themselves are always written synchronously.
+    """
+    REDIS_KEY = "review_votes:pending"
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._local: Deltas = defaultdict(lambda: [0, 0])
+        self._flusher: Optional[threading.Thread] = None
+
+    def add(self, review_id: int, helpful_delta: int, unhelpful_delta: int) -> None:
+        self._ensure_flusher()
+        redis = get_redis()
+        if redis is not None:
+            try:
+                with redis.pipeline(transaction=False) as pipe:
+                    if helpful_delta:
+                        pipe.hincrby(self.REDIS_KEY, f"{review_id}:h", helpful_delta)
+                    if unhelpful_delta:
+                        pipe.hincrby(self.REDIS_KEY, f"{review_id}:u", unhelpful_delta)
+                    pipe.execute()
+                return
+            except RedisError:
+                mark_redis_down()
+        with self._lock:
+            counters = self._local[review_id]
+            counters[0] += helpful_delta
+            counters[1] += unhelpful_delta
+
+    def flush(self, db=None) -> int:
+        """Apply all pending deltas; returns the number of reviews updated."""
+        deltas = self._take()
+        if not deltas:
+            return 0
+        from app.db.session import SessionLocal
+
+        session = db or SessionLocal()
+        try:
+            review_ids = sorted(deltas)  # Stable lock order across concurrent flushes
+            session.execute(text("""
+                UPDATE reviews r SET
+                    helpful_votes = r.helpful_votes + d.helpful,
+                    unhelpful_votes = r.unhelpful_votes + d.unhelpful
+                FROM unnest(CAST(:ids AS integer[]), CAST(:helpful AS integer[]), CAST(:unhelpful AS integer[]))
+                    AS d(id, helpful, unhelpful)
+                WHERE r.id = d.id
+            """), {
+                "ids": review_ids,
+                "helpful": [deltas[review_id][0] for review_id in review_ids],
+                "unhelpful": [deltas[review_id][1] for review_id in review_ids],
+            })
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Vote counter flush failed, requeueing: {str(e)}")
+            for review_id, (helpful, unhelpful) in deltas.items():
+                self.add(review_id, helpful, unhelpful)
+            return 0
+        finally:
+            if db is None:
+                session.close()
+        bump_cache_version('reviews')
+        return len(deltas)
+
+    def _take(self) -> Deltas:
+        """Atomically detach everything buffered so far."""
+        with self._lock:
+            deltas: Deltas = {review_id: counters for review_id, counters in self._local.items() if any(counters)}
+            self._local = defaultdict(lambda: [0, 0])
+
+        redis = get_redis()
+        if redis is not None:
+            # RENAME hands this flush a private copy; concurrent votes start a fresh hash
+            claimed = f"{self.REDIS_KEY}:{uuid.uuid4().hex}"
+            try:
+                if redis.exists(self.REDIS_KEY):
+                    redis.rename(self.REDIS_KEY, claimed)
+                    pending = redis.hgetall(claimed)
+                    redis.delete(claimed)
+                    for field, value in pending.items():
+                        review_id, kind = field.split(":")
+                        counters = deltas.setdefault(int(review_id), [0, 0])
+                        counters[0 if kind == "h" else 1] += int(value)
+            except RedisError as e:
+                # The key vanished between EXISTS and RENAME (another worker flushed) or Redis failed
+                if "no such key" not in str(e).lower():
+                    mark_redis_down()
+        return {review_id: counters for review_id, counters in deltas.items() if any(counters)}
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="vote-flusher", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Vote counter flush failed: {str(e)}")
+
+
+vote_buffer = VoteCounterBuffer(get_settings().REVIEW_VOTE_FLUSH_SECONDS)
@@ -0,0 +1,56 @@
+# Script to embed every book missing from (or stale in) the embedding store, then train
+# the IVF index AI recommendations search and save it next to the store. Run it after
+# large imports; books added later are embedded and inserted into the index incrementally.
+# Usage: poetry run python scripts/build_ann_index.py [--nlist N] [--iterations N] [--skip-embed]
+
+import argparse
+import asyncio
+from sqlalchemy import select
+from app.core.clients import clients
+from app.db.models import Book
+from app.db.session import AsyncSessionLocal
+from app.services.ann_index import IVFFlatIndex, default_nlist, embedding_search
+from app.services.embedding_store import embedding_store
+from app.services.recommendation import RecommendationService
+
+BATCH_SIZE = 1000
+
+async def embed_catalog() -> int:
+    before = len(embedding_store)
+    await clients.start()
+    try:
+        async with AsyncSessionLocal() as db:
+            service = RecommendationService(db, openai_client=clients.openai())
+            last_id = 0
+            while True:
+                books = (await db.scalars(
+                    select(Book).where(Book.id > last_id).order_by(Book.id).limit(BATCH_SIZE)
+                )).all()
+                if not books:
+                    break
+                await service.embed_books(books)
+                last_id = books[-1].id
+    finally:
+        await clients.close()
+    return len(embedding_store) - before
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed the catalog and build the approximate nearest-neighbour index")
+    parser.add_argument("--nlist", type=int, help="Number of inverted lists (default: sqrt of the number of embeddings)")
+    parser.add_argument("--iterations", type=int, default=10, help="k-means iterations when training the lists")
+    parser.add_argument("--skip-embed", action="store_true", help="Only rebuild the index from the embeddings already stored")
+    args = parser.parse_args()
+
+    if not args.skip_embed:
+        print(f"Embedded {asyncio.run(embed_catalog())} books.")
+
+    rows = len(embedding_store)
+    if not rows:
+        print("Embedding store is empty; nothing to index.")
+        return
+    index = IVFFlatIndex.train(embedding_store.vectors, args.nlist or default_nlist(rows), iterations=args.iterations)
+    embedding_search.set_index(index)
+    print(f"Indexed {rows} embeddings into {index.nlist} lists at {embedding_search.index_path}.")
+
+if __name__ == "__main__":
+    main()
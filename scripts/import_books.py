@@ -0,0 +1,32 @@
+# Script to bulk import a catalog feed (CSV or NDJSON) into the books table
+# Books are matched on ISBN: existing rows are updated, new ones inserted.
+# Usage: poetry run python scripts/import_books.py books.csv [--format csv|ndjson]
+
+import argparse
+from sqlalchemy.orm import sessionmaker
+from app.db.session import engine
+from app.services.book_import import BookImportService, IMPORT_FORMATS
+
+Session = sessionmaker(bind=engine)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import books from a CSV or NDJSON file")
+    parser.add_argument("path", help="Feed file to import")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Feed format; inferred from the extension when omitted")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    session = Session()
+    try:
+        with open(args.path, encoding="utf-8", newline="") as feed:
+            result = BookImportService(session).import_books(feed, fmt)
+        print(f"Received {result['received']} rows: {result['inserted']} inserted, "
+              f"{result['updated']} updated, {result['rejected']} rejected.")
+    except Exception as e:
+        session.rollback()
+        print(f"Import failed: {e}")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    main()
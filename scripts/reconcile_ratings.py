@@ -0,0 +1,36 @@
+# Script to reconcile books' rating aggregates (rating_sum, total_reviews, average_rating)
+# with their active reviews. Review writes keep them current through a database trigger;
+# this catches drift from writes that bypassed it. Run it from cron, or loop with --interval.
+# Usage: poetry run python scripts/reconcile_ratings.py [--interval SECONDS]
+
+import argparse
+import time
+from sqlalchemy.orm import sessionmaker
+from app.db.session import engine
+from app.services.book import BookService
+
+Session = sessionmaker(bind=engine)
+
+def reconcile():
+    session = Session()
+    try:
+        corrected = BookService(session).reconcile_ratings()
+        print(f"Reconciled rating aggregates: {corrected} books corrected.")
+    except Exception as e:
+        session.rollback()
+        print(f"Reconciliation failed: {e}")
+    finally:
+        session.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute drifted book rating aggregates from reviews")
+    parser.add_argument("--interval", type=float, help="Repeat every INTERVAL seconds instead of running once")
+    args = parser.parse_args()
+
+    reconcile()
+    while args.interval:
+        time.sleep(args.interval)
+        reconcile()
+
+if __name__ == "__main__":
+    main()
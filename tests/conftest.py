@@ -6,7 +6,8 @@ from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 from app.db.models import Base
-from app.db.session import get_db
+from app.db.session import get_async_db, get_async_read_db, get_db, get_read_db, get_session_factory
+from app.core.cache import bump_cache_version
 from app.main import app
 from fastapi.testclient import TestClient
 
@@ -73,6 +74,53 @@ def db(engine):
     transaction.rollback()
     connection.close()
 
+class AsyncSessionAdapter:
+    """
+    Exposes the transactional test session through the AsyncSession methods the
+    app uses, so async code paths see (and roll back) the same data as the tests.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def execute(self, *args, **kwargs):
+        return self.sync_session.execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        return self.sync_session.scalar(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        return self.sync_session.scalars(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        return self.sync_session.get(*args, **kwargs)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def flush(self):
+        self.sync_session.flush()
+
+    async def commit(self):
+        self.sync_session.commit()
+
+    async def rollback(self):
+        self.sync_session.rollback()
+
+    async def refresh(self, instance, *args, **kwargs):
+        self.sync_session.refresh(instance, *args, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass  # The test owns the session
+
+@pytest.fixture
+def async_db(db: Session):
+    """The test session, for services that take an AsyncSession"""
+    return AsyncSessionAdapter(db)
+
 @pytest.fixture
 def sample_data(db: Session):
     """Create sample data for tests"""
@@ -118,6 +166,30 @@ def sample_data(db: Session):
         "reviews": reviews
     }
 
+@pytest.fixture(autouse=True)
+def embedding_store(tmp_path, monkeypatch):
+    """Give every test its own empty on-disk embedding store"""
+    import app.services.recommendation as recommendation_module
+    from app.services.ann_index import EmbeddingSearch
+    from app.services.embedding_store import EmbeddingStore
+
+    store = EmbeddingStore(tmp_path / "embeddings")
+    monkeypatch.setattr(recommendation_module, "embedding_store", store)
+    monkeypatch.setattr(recommendation_module, "embedding_search", EmbeddingSearch(store, nprobe=8, min_rows=0))
+    return store
+
+@pytest.fixture(autouse=True)
+def genre_matrix_cache(db: Session, monkeypatch):
+    """
+    Start every test without a cached genre matrix; test rows do not bump the
+    catalog version. Background refreshes read through the test session.
+    """
+    from app.services.genre_matrix import genre_matrix_cache
+    monkeypatch.setattr(genre_matrix_cache, "session_factory", lambda: AsyncSessionAdapter(db))
+    genre_matrix_cache.clear()
+    yield genre_matrix_cache
+    genre_matrix_cache.clear()
+
 @pytest.fixture
 def client(db: Session) -> Generator:
     """Create a test client for the FastAPI application with test database session"""
@@ -128,6 +200,18 @@ def client(db: Session) -> Generator:
             pass
     
     app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_read_db] = _get_test_db
+
+    async def _get_test_async_db():
+        yield AsyncSessionAdapter(db)
+
+    app.dependency_overrides[get_async_db] = _get_test_async_db
+    app.dependency_overrides[get_async_read_db] = _get_test_async_db
+    # Streamed responses open their own session; hand them the test session too
+    app.dependency_overrides[get_session_factory] = lambda: (lambda: db)
+    # Rows written directly through the test session bypass cache invalidation,
+    # so start every test from a fresh catalog version
+    bump_cache_version("catalog")
     with TestClient(app) as test_client:
         yield test_client
     
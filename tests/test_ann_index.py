@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from app.services.ann_index import EmbeddingSearch, IVFFlatIndex, default_nlist
+from app.services.embedding_store import EmbeddingStore, normalize
+
+DIMENSIONS = 32
+
+
+@pytest.fixture
+def clustered_store(tmp_path):
+    """2,000 embeddings drawn around 40 well-separated topics"""
+    rng = np.random.default_rng(7)
+    topics = rng.normal(size=(40, DIMENSIONS))
+    vectors = topics[rng.integers(0, len(topics), 2000)] + 0.2 * rng.normal(size=(2000, DIMENSIONS))
+    store = EmbeddingStore(tmp_path, dimensions=DIMENSIONS)
+    store.add(np.arange(1, 2001), np.zeros(2000, dtype=np.int64), vectors)
+    return store
+
+
+def _exact_top(store, query, k):
+    return set(np.argsort(-(store.vectors @ normalize(query)))[:k])
+
+
+def test_ivf_search_recall_and_exact_at_full_probe(clustered_store):
+    index = IVFFlatIndex.train(clustered_store.vectors, default_nlist(len(clustered_store)))
+    assert len(index) == 2000
+    queries = np.random.default_rng(1).normal(size=(20, DIMENSIONS))
+
+    recall = np.mean([
+        len(set(index.search(clustered_store.vectors, query, 10, nprobe=8)[0]) & _exact_top(clustered_store, query, 10)) / 10
+        for query in queries
+    ])
+    assert recall >= 0.8
+
+    rows, scores = index.search(clustered_store.vectors, queries[0], 10, nprobe=index.nlist)
+    assert set(rows) == _exact_top(clustered_store, queries[0], 10)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_search_inserts_new_rows_and_persists(clustered_store):
+    search = EmbeddingSearch(clustered_store, nprobe=4, min_rows=0, save_every=1)
+    search.set_index(IVFFlatIndex.train(clustered_store.vectors, nlist=16))
+
+    new_vector = np.zeros(DIMENSIONS)
+    new_vector[0] = 1.0
+    clustered_store.add([5000], [0], [new_vector])
+    rows, scores = search.search(new_vector, 1)
+    assert clustered_store.book_ids(rows).tolist() == [5000]
+    assert scores[0] == pytest.approx(1.0)
+
+    # A new worker loads the saved index, which already covers the inserted row
+    reloaded = EmbeddingSearch(EmbeddingStore(clustered_store.path, dimensions=DIMENSIONS), nprobe=4, min_rows=0)
+    assert reloaded.search(new_vector, 1)[0].tolist() == rows.tolist()
+    assert len(IVFFlatIndex.load(reloaded.index_path)) == 2001
+
+
+def test_small_store_without_index_is_searched_exactly(clustered_store):
+    search = EmbeddingSearch(clustered_store, nprobe=1, min_rows=10_000)
+    query = clustered_store.vectors[3]
+    rows, _ = search.search(query, 5)
+    assert set(rows) == _exact_top(clustered_store, query, 5)
+    assert rows[0] == 3
@@ -3,8 +3,10 @@ from datetime import date
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from app.services.book import BookService
+from app.services.review import ReviewService
 from app.schemas.book import BookCreate, BookUpdate, BookSearchParams
-from app.db.models import Book, Base
+from app.schemas.review import ReviewCreate
+from app.db.models import Book, Base, User
 from app.db.session import engine
 
 @pytest.fixture(scope="function")
@@ -141,7 +143,9 @@ def test_search_books(db_session):
     assert any(book.title == "Advanced Python" for book in books)
 
 def test_update_book_rating(db_session):
+    """Book rating aggregates follow review writes (maintained by the reviews trigger)"""
     book_service = BookService(db_session)
+    review_service = ReviewService(db_session)
     
     # Create a test book
     book_data = BookCreate(
@@ -151,13 +155,22 @@ def test_update_book_rating(db_session):
         genres=["Fiction"]
     )
     book = book_service.create_book(book_data)
+    users = [
+        User(name=f"Rater {i}", email=f"rater{i}@example.com", hashed_password="dummy_hash")
+        for i in range(2)
+    ]
+    db_session.add_all(users)
+    db_session.commit()
     
     # Add first rating
-    updated_book = book_service.update_book_rating(book.id, 4)
+    review_service.create_review(users[0].id, ReviewCreate(book_id=book.id, text="Good read", rating=4))
+    updated_book = book_service.get_book(book.id)
+    db_session.refresh(updated_book)
     assert updated_book.average_rating == 4.0
     assert updated_book.total_reviews == 1
     
     # Add second rating
-    updated_book = book_service.update_book_rating(book.id, 5)
+    review_service.create_review(users[1].id, ReviewCreate(book_id=book.id, text="Great read", rating=5))
+    db_session.refresh(updated_book)
     assert updated_book.average_rating == 4.5
     assert updated_book.total_reviews == 2
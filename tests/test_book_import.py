@@ -0,0 +1,120 @@
+import io
+import json
+import pytest
+from app.core.auth import create_access_token, get_password_hash
+from app.db.models import Book, User
+from app.services.book_import import BookImportService
+
+CSV_FEED = """title,author,isbn,publication_date,genres,description
+Imported One,Feed Author,9990000000001,2001-02-03,Fiction|Mystery,First import
+Imported Two,Feed Author,9990000000002,not-a-date,,
+,Missing Title,9990000000003,,,
+Imported One (Revised),Feed Author,999-0000000001,,,
+"""
+
+def test_import_csv_inserts_and_dedupes(db):
+    result = BookImportService(db).import_books(io.StringIO(CSV_FEED), "csv")
+
+    assert result == {"received": 4, "rejected": 1, "inserted": 2, "updated": 0}
+    book = db.query(Book).filter(Book.isbn == "9990000000001").one()
+    # Last occurrence of an ISBN wins; empty fields stay NULL
+    assert book.title == "Imported One (Revised)"
+    assert book.genres is None
+    assert float(book.average_rating) == 0.0
+    assert book.total_reviews == 0
+    second = db.query(Book).filter(Book.isbn == "9990000000002").one()
+    assert second.publication_date is None
+
+def test_import_ndjson_updates_existing_by_isbn(db):
+    db.add(Book(title="Old Title", author="Old Author", isbn="9990000000010",
+                genres=["Classic"], description="Keep me"))
+    db.commit()
+
+    feed = "\n".join([
+        json.dumps({"title": "New Title", "author": "Old Author", "isbn": "9990000000010", "genres": ["Drama"]}),
+        "{not json",
+        json.dumps({"title": "Brand New", "author": "Someone", "isbn": "9990000000011"}),
+    ])
+    result = BookImportService(db).import_books(io.StringIO(feed), "ndjson")
+
+    assert result == {"received": 3, "rejected": 1, "inserted": 1, "updated": 1}
+    book = db.query(Book).filter(Book.isbn == "9990000000010").one()
+    db.refresh(book)
+    assert book.title == "New Title"
+    assert book.genres == ["Drama"]
+    assert book.description == "Keep me"
+
+def test_import_rejects_unknown_format(db):
+    with pytest.raises(ValueError):
+        BookImportService(db).import_books(io.StringIO(""), "xml")
+
+def test_import_rejects_non_text_values(db):
+    feed = "\n".join([
+        json.dumps({"title": 42, "author": "Someone", "isbn": "9990000000020"}),
+        json.dumps({"title": "Bad Genres", "author": "Someone", "isbn": "9990000000021", "genres": [1, 2]}),
+        json.dumps({"title": "Bad ISBN", "author": "Someone", "isbn": ["9990000000022"]}),
+        json.dumps({"title": "Numeric ISBN", "author": "Someone", "isbn": 9990000000023}),
+    ])
+    result = BookImportService(db).import_books(io.StringIO(feed), "ndjson")
+
+    assert result == {"received": 4, "rejected": 3, "inserted": 1, "updated": 0}
+    assert db.query(Book).filter(Book.isbn == "9990000000023").one().title == "Numeric ISBN"
+
+def test_import_merges_in_batches(db, monkeypatch):
+    monkeypatch.setattr("app.services.book_import.IMPORT_BATCH_ROWS", 2)
+    result = BookImportService(db).import_books(io.StringIO(CSV_FEED), "csv")
+
+    # The revised row lands in the second batch and updates the book the first one inserted
+    assert result == {"received": 4, "rejected": 1, "inserted": 2, "updated": 1}
+    assert db.query(Book).filter(Book.isbn == "9990000000001").one().title == "Imported One (Revised)"
+
+@pytest.fixture
+def auth_headers(db):
+    user = User(name="Importer", email="importer@example.com", hashed_password=get_password_hash("importpass123"))
+    db.add(user)
+    db.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+def test_import_endpoint_csv(client, db, auth_headers):
+    response = client.post("/v1/books/import", headers=auth_headers,
+                           files={"file": ("feed.csv", CSV_FEED.encode(), "text/csv")})
+
+    assert response.status_code == 200
+    assert response.json() == {"received": 4, "rejected": 1, "inserted": 2, "updated": 0}
+    assert db.query(Book).filter(Book.isbn == "9990000000001").one().title == "Imported One (Revised)"
+
+def test_import_endpoint_ndjson(client, db, auth_headers):
+    db.add(Book(title="Old Title", author="Old Author", isbn="9990000000030"))
+    db.commit()
+    feed = "\n".join([
+        json.dumps({"title": "New Title", "author": "Old Author", "isbn": "9990000000030"}),
+        json.dumps({"title": "Brand New", "author": "Someone", "isbn": "9990000000031"}),
+    ])
+
+    # Inferred from the .ndjson file name, then forced for a neutral name
+    response = client.post("/v1/books/import", headers=auth_headers,
+                           files={"file": ("feed.ndjson", feed.encode(), "application/x-ndjson")})
+    assert response.status_code == 200
+    assert response.json() == {"received": 2, "rejected": 0, "inserted": 1, "updated": 1}
+
+    response = client.post("/v1/books/import?format=ndjson", headers=auth_headers,
+                           files={"file": ("feed.txt", feed.encode(), "text/plain")})
+    assert response.status_code == 200
+    assert response.json() == {"received": 2, "rejected": 0, "inserted": 0, "updated": 2}
+    book = db.query(Book).filter(Book.isbn == "9990000000030").one()
+    db.refresh(book)
+    assert book.title == "New Title"
+
+def test_import_endpoint_rejects_bad_feed(client, auth_headers):
+    response = client.post("/v1/books/import", headers=auth_headers,
+                           files={"file": ("feed.csv", "title,author,isbn\nCaf\xe9,A,9990000000040\n".encode("latin-1"), "text/csv")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Import file must be UTF-8 encoded"
+
+    response = client.post("/v1/books/import?format=xml", headers=auth_headers,
+                           files={"file": ("feed.xml", b"<books/>", "application/xml")})
+    assert response.status_code == 422
+
+def test_import_endpoint_requires_auth(client):
+    response = client.post("/v1/books/import", files={"file": ("feed.csv", CSV_FEED.encode(), "text/csv")})
+    assert response.status_code == 401
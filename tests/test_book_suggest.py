@@ -0,0 +1,68 @@
+import pytest
+from types import SimpleNamespace
+from app.services.suggest import SuggestionIndex
+
+def make_book(book_id, title, author, average_rating=4.0, total_reviews=10):
+    return SimpleNamespace(
+        id=book_id,
+        title=title,
+        author=author,
+        average_rating=average_rating,
+        total_reviews=total_reviews
+    )
+
+@pytest.fixture
+def index():
+    index = SuggestionIndex()
+    index.build([
+        make_book(1, "Harry Potter and the Philosopher's Stone", "J.K. Rowling", 4.8, 5000),
+        make_book(2, "Harry Potter and the Chamber of Secrets", "J.K. Rowling", 4.6, 3000),
+        make_book(3, "Hard Times", "Charles Dickens", 3.9, 200),
+        make_book(4, "The Hobbit", "J.R.R. Tolkien", 4.7, 4000),
+    ])
+    return index
+
+def test_suggest_ranks_by_weight(index):
+    suggestions = index.suggest("har")
+    assert [s["text"] for s in suggestions] == [
+        "Harry Potter and the Philosopher's Stone",
+        "Harry Potter and the Chamber of Secrets",
+        "Hard Times",
+    ]
+    assert suggestions[0]["kind"] == "title"
+    assert suggestions[0]["book_id"] == 1
+
+def test_suggest_authors_are_aggregated(index):
+    suggestions = index.suggest("j.")
+    assert suggestions[0] == {
+        "text": "J.K. Rowling",
+        "kind": "author",
+        "book_id": None,
+        "score": suggestions[0]["score"],
+    }
+    assert [s["text"] for s in suggestions].count("J.K. Rowling") == 1
+
+def test_suggest_is_case_and_space_insensitive(index):
+    assert index.suggest("  THE   hob")[0]["text"] == "The Hobbit"
+    assert index.suggest("") == []
+    assert index.suggest("zzz") == []
+
+def test_suggest_incremental_updates(index):
+    # Warm the short-prefix cache, then mutate
+    assert index.suggest("ha")[0]["book_id"] == 1
+
+    index.upsert(make_book(5, "Hamlet", "William Shakespeare", 5.0, 100000))
+    assert index.suggest("ha")[0]["text"] == "Hamlet"
+
+    index.upsert(make_book(5, "Macbeth", "William Shakespeare", 5.0, 100000))
+    assert all(s["text"] != "Hamlet" for s in index.suggest("ha"))
+    assert index.suggest("mac")[0]["text"] == "Macbeth"
+
+    index.remove(1)
+    assert all(s["book_id"] != 1 for s in index.suggest("harry"))
+
+def test_upsert_before_build_is_ignored():
+    index = SuggestionIndex()
+    index.upsert(make_book(1, "Dune", "Frank Herbert"))
+    assert not index.is_built
+    assert index.suggest("du") == []
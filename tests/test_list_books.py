@@ -1,7 +1,11 @@
+import csv
+import io
+import json
 import pytest
 from datetime import date
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.etag import make_etag
 from app.db.models import Book
 from sqlalchemy.orm import Session
 
@@ -134,3 +138,308 @@ def test_list_books(client, db):
     data = response.json()
     # Check that the expected book is present
     assert any(book["title"] == "Advanced Python" and book["author"] == "John Doe" for book in data["books"])
+
+def test_list_books_cursor_pagination(client):
+    """Test that walking next_cursor pages visits every book exactly once in sort order"""
+    for sort_by in ["title", "author", "rating", "total_reviews", "publication_date"]:
+        for sort_order in ["asc", "desc"]:
+            response = client.get(f"/v1/books/?sortBy={sort_by}&sortOrder={sort_order}&limit=100")
+            assert response.status_code == 200
+            expected = [book["id"] for book in response.json()["books"]]
+
+            seen = []
+            url = f"/v1/books/?sortBy={sort_by}&sortOrder={sort_order}&limit=7"
+            while True:
+                response = client.get(url)
+                assert response.status_code == 200
+                data = response.json()
+                seen.extend(book["id"] for book in data["books"])
+                if not data["next_cursor"]:
+                    break
+                url = f"/v1/books/?sortBy={sort_by}&sortOrder={sort_order}&limit=7&after={data['next_cursor']}"
+
+            assert seen == expected[:len(seen)]
+            assert len(seen) == len(set(seen))
+
+def test_list_books_invalid_cursor(client):
+    """Test that malformed or mismatched cursors are rejected"""
+    response = client.get("/v1/books/?after=not-a-cursor")
+    assert response.status_code == 400
+
+    response = client.get("/v1/books/?sortBy=title&limit=2")
+    cursor = response.json()["next_cursor"]
+    assert cursor
+    response = client.get(f"/v1/books/?sortBy=author&limit=2&after={cursor}")
+    assert response.status_code == 400
+
+def test_list_books_search_ranked_by_relevance(client, db):
+    """Test that full-text search matches descriptions and ranks title matches first"""
+    db.add_all([
+        Book(
+            title="Gardening Basics",
+            author="Ann Green",
+            isbn="9990000000001",
+            genres=["Hobby"],
+            description="A short chapter covers the lighthouse keeper's vegetable patch."
+        ),
+        Book(
+            title="The Lighthouse Keeper",
+            author="Tom Shore",
+            isbn="9990000000002",
+            genres=["Fiction"],
+            description="A lighthouse story."
+        )
+    ])
+    db.commit()
+
+    response = client.get("/v1/books/?search=lighthouse&limit=100")
+    assert response.status_code == 200
+    titles = [book["title"] for book in response.json()["books"]]
+    assert titles.index("The Lighthouse Keeper") < titles.index("Gardening Basics")
+
+    response = client.get("/v1/books/?sortBy=relevance")
+    assert response.status_code == 400
+
+def _walk_cursor(client, url):
+    """Follow next_cursor from the first page to the last, returning every page's book ids"""
+    pages = []
+    response = client.get(url)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        pages.append([book["id"] for book in data["books"]])
+        assert len(pages) <= 20, "cursor pagination does not advance"
+        if not data["next_cursor"]:
+            return pages
+        response = client.get(f"{url}&after={data['next_cursor']}")
+
+def test_list_books_search_cursor_walk(client, db):
+    """Cursor pages of a ranked search are disjoint and complete, ties on rank included"""
+    books = [Book(title=f"Beacon Tales {index}", author="Ray Harbor", isbn=f"99900000002{index:02d}",
+                  description="Beacon stories.") for index in range(12)]
+    db.add_all(books)
+    db.commit()
+
+    pages = _walk_cursor(client, "/v1/books/?search=beacon&limit=5")
+    ids = [book_id for page in pages for book_id in page]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {book.id for book in books}
+
+def test_list_books_fuzzy_search(client, db):
+    """Test that fuzzy search tolerates typos and ranks the closest match first"""
+    db.add(Book(
+        title="The Hitchhiker's Guide to the Galaxy",
+        author="Douglas Adams",
+        isbn="9990000000003",
+        genres=["Science Fiction"]
+    ))
+    db.commit()
+
+    response = client.get("/v1/books/?search=Hitchiker&fuzzy=true&limit=10")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["books"][0]["title"] == "The Hitchhiker's Guide to the Galaxy"
+
+    response = client.get("/v1/books/?search=Duglas%20Adams&fuzzy=true&limit=10")
+    assert response.status_code == 200
+    assert any(book["author"] == "Douglas Adams" for book in response.json()["books"])
+
+def test_list_books_fuzzy_cursor_walk(client, db):
+    """Cursor pages of a fuzzy search are disjoint and complete, ties on similarity included"""
+    books = [Book(title=f"Quixotic Voyages {index}", author="Mara Quill", isbn=f"99900000003{index:02d}")
+             for index in range(12)]
+    db.add_all(books)
+    db.commit()
+
+    pages = _walk_cursor(client, "/v1/books/?search=Quixotik&fuzzy=true&limit=5")
+    ids = [book_id for page in pages for book_id in page]
+    assert len(ids) == len(set(ids))
+    assert {book.id for book in books} <= set(ids)
+
+def test_list_books_count_strategies(client, db):
+    """Test include_total and the exact/cached/estimated count strategies"""
+    response = client.get("/v1/books/?include_total=false&limit=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] is None
+    assert data["total_pages"] is None
+    assert len(data["books"]) == 5
+
+    exact = client.get("/v1/books/?count=exact").json()["total"]
+    assert client.get("/v1/books/?count=cached").json()["total"] == exact
+
+    # Writes through the service invalidate cached counts
+    from app.services.book import BookService
+    from app.schemas.book import BookCreate
+    BookService(db).create_book(BookCreate(title="Count Me", author="Counter", isbn="9990000000004"))
+    assert client.get("/v1/books/?count=cached").json()["total"] == exact + 1
+
+    # Counts are keyed on the shared catalog version, so a bump from another
+    # worker drops them too
+    from app.core.cache import bump_cache_version
+    db.add(Book(title="Count Me Too", author="Counter", isbn="9990000000005"))
+    db.flush()
+    assert client.get("/v1/books/?count=cached").json()["total"] == exact + 1
+    bump_cache_version("catalog")
+    assert client.get("/v1/books/?count=cached").json()["total"] == exact + 2
+
+    estimated = client.get("/v1/books/?count=estimated").json()["total"]
+    assert isinstance(estimated, int) and estimated >= 0
+
+    response = client.get("/v1/books/?count=bogus")
+    assert response.status_code == 422
+
+def test_list_books_response_cache(client, db):
+    """Test that listings are served from cache until a service write bumps the catalog version"""
+    first = client.get("/v1/books/?sortBy=title&limit=5").json()
+
+    # Direct inserts bypass invalidation, so the cached page is still served
+    db.add(Book(title="AAA Cached Out", author="Nobody", isbn="9990000000005"))
+    db.commit()
+    assert client.get("/v1/books/?sortBy=title&limit=5").json() == first
+
+    from app.services.book import BookService
+    from app.schemas.book import BookCreate
+    BookService(db).create_book(BookCreate(title="AAA Fresh", author="Somebody", isbn="9990000000006"))
+    titles = [book["title"] for book in client.get("/v1/books/?sortBy=title&limit=5").json()["books"]]
+    assert "AAA Fresh" in titles
+    assert "AAA Cached Out" in titles
+
+def test_list_books_genre_filters_and_facets(client, db):
+    """Test genre any/all filters, min_rating and genre facet counts"""
+    db.add_all([
+        Book(title="Facet One", author="F", isbn="9990000000007", genres=["Facetopia", "Mystery"], average_rating=4.9),
+        Book(title="Facet Two", author="F", isbn="9990000000008", genres=["Facetopia"], average_rating=2.0),
+    ])
+    db.commit()
+
+    data = client.get("/v1/books/?genre=Facetopia&genre=Mystery&limit=100").json()
+    titles = {book["title"] for book in data["books"]}
+    assert {"Facet One", "Facet Two"} <= titles
+
+    data = client.get("/v1/books/?genre=Facetopia&genre=Mystery&genre_mode=all&limit=100").json()
+    assert [book["title"] for book in data["books"]] == ["Facet One"]
+
+    data = client.get("/v1/books/?genre=Facetopia&min_rating=4&limit=100").json()
+    assert [book["title"] for book in data["books"]] == ["Facet One"]
+
+    # Filtered facets count only the matching books
+    data = client.get("/v1/books/?genre=Facetopia&facets=true").json()
+    facets = {facet["genre"]: facet["count"] for facet in data["facets"]}
+    assert facets["Facetopia"] == 2
+    assert facets["Mystery"] == 1
+
+    # Unfiltered facets come from the trigger-maintained aggregate
+    data = client.get("/v1/books/?facets=true").json()
+    facets = {facet["genre"]: facet["count"] for facet in data["facets"]}
+    assert facets["Facetopia"] == 2
+    assert client.get("/v1/books/").json()["facets"] is None
+
+def test_export_books_streams_ndjson_and_csv(client, db):
+    """Test the streaming export in both formats, with and without filters"""
+    total = db.query(Book).count()
+
+    response = client.get("/v1/books/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == total
+    ids = [record["id"] for record in records]
+    assert ids == sorted(ids)
+    assert set(records[0]) == {"id", "title", "author", "isbn", "publication_date", "genres",
+                               "description", "average_rating", "total_reviews"}
+
+    db.add(Book(title="Exported", author="E", isbn="9990000000012", genres=["Exportia", "Drama"]))
+    db.commit()
+    response = client.get("/v1/books/export?format=csv&genre=Exportia")
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Exported"]
+    assert rows[0]["genres"] == "Exportia|Drama"
+
+    response = client.get("/v1/books/export?format=csv&genre=NoSuchGenre")
+    assert response.text.strip() == "id,title,author,isbn,publication_date,genres,description,average_rating,total_reviews"
+
+def test_book_etags_and_conditional_get(client, db):
+    """Test ETags on single books and listings, and 304 responses for If-None-Match"""
+    book = Book(title="ETag Book", author="E", isbn="9990000000013")
+    db.add(book)
+    db.commit()
+
+    response = client.get(f"/v1/books/{book.id}")
+    etag = response.headers["etag"]
+    not_modified = client.get(f"/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    # Any update bumps the row version
+    book.title = "ETag Book (Updated)"
+    db.commit()
+    response = client.get(f"/v1/books/{book.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "ETag Book (Updated)"
+    assert response.headers["etag"] != etag
+    assert client.get("/v1/books/999999", headers={"If-None-Match": etag}).status_code == 404
+
+    # Listings are versioned by the catalog
+    listing = client.get("/v1/books/?search=ETag&limit=5")
+    list_etag = listing.headers["etag"]
+    assert client.get("/v1/books/?search=ETag&limit=5", headers={"If-None-Match": list_etag}).status_code == 304
+    assert client.get("/v1/books/?search=ETag&limit=6", headers={"If-None-Match": list_etag}).status_code == 200
+
+    from app.services.book import BookService
+    from app.schemas.book import BookUpdate
+    BookService(db).update_book(book.id, BookUpdate(title="ETag Book (Again)"))
+    assert client.get("/v1/books/?search=ETag&limit=5", headers={"If-None-Match": list_etag}).status_code == 200
+
+def test_get_books_batch(client, db):
+    """Test batch fetching preserves request order and reports missing ids"""
+    ids = [book.id for book in db.query(Book).order_by(Book.id).limit(3).all()]
+    requested = [ids[2], 999999, ids[0], ids[2]]
+
+    response = client.get("/v1/books/batch", params={"ids": ",".join(map(str, requested))})
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["id"] for book in data["books"]] == [ids[2], ids[0]]
+    assert data["missing"] == [999999]
+
+    response = client.post("/v1/books/batch", json={"ids": requested})
+    assert response.json() == data
+
+    assert client.get("/v1/books/batch?ids=1,abc").status_code == 400
+    assert client.post("/v1/books/batch", json={"ids": []}).status_code == 422
+
+def test_list_books_sparse_fields(client, db):
+    """Test fields= returns only the requested book fields"""
+    response = client.get("/v1/books/?fields=id,title,average_rating&sortBy=title&limit=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["books"]) == 5
+    for book in data["books"]:
+        assert set(book) == {"id", "title", "average_rating"}
+        assert isinstance(book["average_rating"], float)
+    titles = [book["title"] for book in data["books"]]
+    assert titles == sorted(titles)
+
+    # The sort column seeds the cursor even when it is not selected
+    next_page = client.get(f"/v1/books/?fields=id&sortBy=title&limit=5&after={data['next_cursor']}").json()
+    assert set(next_page["books"][0]) == {"id"}
+    full = client.get("/v1/books/?sortBy=title&limit=10").json()
+    assert [book["id"] for book in next_page["books"]] == [book["id"] for book in full["books"][5:]]
+
+    book_id = data["books"][0]["id"]
+    single = client.get(f"/v1/books/{book_id}?fields=title,author")
+    assert single.json() == {"title": data["books"][0]["title"], "author": single.json()["author"]}
+    assert single.headers["etag"] != client.get(f"/v1/books/{book_id}").headers["etag"]
+
+    assert client.get("/v1/books/?fields=id,password").status_code == 400
+
+def test_listing_etags_without_shared_version(client, monkeypatch):
+    """Without a shared catalog version, listing ETags are derived from the content"""
+    monkeypatch.setattr("app.api.book.cache_versions_shared", lambda: False)
+    listing = client.get("/v1/books/?limit=3")
+    list_etag = listing.headers["etag"]
+    assert list_etag == make_etag(listing.content.decode())
+    assert client.get("/v1/books/?limit=3", headers={"If-None-Match": list_etag}).status_code == 304
+    assert client.get("/v1/books/?limit=4", headers={"If-None-Match": list_etag}).status_code == 200
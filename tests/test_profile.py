@@ -160,3 +160,28 @@ def test_update_last_login(db, test_user):
     
     assert updated_user.last_login is not None
     assert isinstance(updated_user.last_login, datetime)
+
+def test_get_user_reviews_cursor_pages(db, test_user):
+    books = []
+    for i in range(3):
+        book = Book(title=f"Cursor Book {i}", author="Cursor Author", genres=["test_genre"], isbn=f"987654321{i:04}")
+        db.add(book)
+        books.append(book)
+    db.commit()
+    for i, book in enumerate(books):
+        db.add(Review(user_id=test_user.id, book_id=book.id, text=f"Cursor review {i}", rating=3,
+                      created_at=datetime.now(timezone.utc)))
+    db.commit()
+
+    profile_service = ProfileService(db)
+    first, cursor = profile_service.get_user_reviews_page(test_user.id, limit=2)
+    assert len(first) == 2 and cursor is not None
+    second, cursor = profile_service.get_user_reviews_page(test_user.id, limit=2, after=cursor)
+    assert len(second) == 1 and cursor is None
+
+    everything = first + second
+    assert len({review.id for review in everything}) == 3
+    assert [review.created_at for review in everything] == sorted((r.created_at for r in everything), reverse=True)
+
+    with pytest.raises(ValueError):
+        profile_service.get_user_reviews_page(test_user.id, after="not-a-cursor")
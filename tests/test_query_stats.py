@@ -0,0 +1,53 @@
+import re
+from sqlalchemy import text
+from app.db.session import QueryStats, query_stats
+
+
+def test_query_stats_record_counts_and_slowest():
+    stats = QueryStats()
+    stats.record("SELECT 1", 0.002)
+    stats.record("SELECT 2", 0.005)
+    stats.record("SELECT 3", 0.001)
+    assert stats.count == 3
+    assert abs(stats.total_seconds - 0.008) < 1e-9
+    assert stats.slowest_statement == "SELECT 2"
+
+
+def test_engine_events_record_into_current_stats(db):
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        db.execute(text("SELECT 1"))
+        db.execute(text("SELECT 2"))
+    finally:
+        query_stats.reset(token)
+    assert stats.count == 2
+    assert stats.total_seconds > 0
+
+    # Nothing is recorded outside a request
+    db.execute(text("SELECT 3"))
+    assert stats.count == 2
+
+
+def test_savepoints_are_not_counted(db):
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        with db.begin_nested():
+            db.execute(text("SELECT 1"))
+    finally:
+        query_stats.reset(token)
+    assert stats.count == 1
+
+
+def test_server_timing_header(client, sample_data):
+    response = client.get("/v1/reviews")
+    assert response.status_code == 200
+    timing = response.headers["Server-Timing"]
+    match = re.match(r'db;dur=[\d.]+;desc="(\d+) queries", db-slowest;dur=[\d.]+', timing)
+    assert match and int(match.group(1)) >= 1
+
+
+def test_no_server_timing_without_queries(client):
+    response = client.get("/health")
+    assert "Server-Timing" not in response.headers
@@ -2,11 +2,14 @@
 import json
 import os
 import asyncio
+import numpy as np
 import pytest
 from unittest.mock import patch, AsyncMock
 from sqlalchemy.orm import Session
 from app.db.models import User, Book, UserFavorite
 from app.services.recommendation import RecommendationService
+from app.services.genre_matrix import GenreMatrix
+from app.services.embedding_store import EmbeddingStore, text_digest
 from app.schemas.recommendation import RecommendationType
 
 # Configure event loop for tests
@@ -17,7 +20,40 @@ def event_loop():
     yield loop
     loop.close()
 
-def test_get_user_genre_preferences(db: Session):
+
+def top_rated_reference(service, books, limit, genre=None):
+    """Reference TOP_RATED scorer: the per-book loop the SQL ranking replaced."""
+    scored_books = []
+    for book in books:
+        # Average rating plus a small review-count boost to break ties
+        final_score = float(book.average_rating or 0) + min((book.total_reviews or 0) / 1000.0, 0.1)
+        if final_score > 0:
+            scored_books.append((book, final_score, service._top_rated_reason(book, genre)))
+    return sorted(scored_books, key=lambda x: x[1], reverse=True)[:limit]
+
+def similar_reference(books, user_preferences, limit):
+    """Reference SIMILAR scorer: the per-book loop GenreMatrix.top_k replaced."""
+    user_genre_sets = {
+        frozenset(book.genres) for book in books
+        if book.genres and set(book.genres).intersection(user_preferences)
+    }
+    scored_books = []
+    for book in books:
+        if not book.genres:
+            continue
+        matching_genres = [g for g in book.genres if g in user_preferences]
+        if not matching_genres:
+            continue
+        base_score = sum(user_preferences[g] for g in matching_genres) * 100.0
+        percentage_bonus = len(matching_genres) / len(set(book.genres)) * 10.0
+        exact_match_bonus = 50.0 if frozenset(book.genres) in user_genre_sets else 0.0
+        rating_boost = (float(book.average_rating or 3.0) - 3.0) / 1000.0
+        final_score = base_score + percentage_bonus + exact_match_bonus + rating_boost
+        scored_books.append((book, final_score, f"Matches your interest in {', '.join(matching_genres)}"))
+    return sorted(scored_books, key=lambda x: x[1], reverse=True)[:limit]
+
+@pytest.mark.asyncio
+async def test_get_user_genre_preferences(db: Session, async_db):
     # Create test data
     user = User(name="Test User", email="test@example.com", hashed_password="dummy_hash")
     db.add(user)
@@ -39,17 +75,17 @@ def test_get_user_genre_preferences(db: Session):
         db.add(favorite)
     db.commit()
 
-    service = RecommendationService(db)
-    preferences = service._get_user_genre_preferences(user.id)
+    service = RecommendationService(async_db)
+    preferences = await service._get_user_genre_preferences(user.id)
 
     assert preferences["Fiction"] == 1.0  # Both favorite books have Fiction
     assert preferences["Adventure"] == 0.5  # One favorite book has Adventure
     assert preferences["Mystery"] == 0.5  # One favorite book has Mystery
     assert "Romance" not in preferences  # Not in favorites
 
-def test_top_rated_scoring(db: Session):
+def test_top_rated_scoring(db: Session, async_db):
     """Test that TOP_RATED scoring works as expected"""
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     
     # Create test books with different ratings and review counts
     books = [
@@ -64,7 +100,7 @@ def test_top_rated_scoring(db: Session):
         db.add(book)
     db.commit()
 
-    scored_books = service._get_top_rated_recommendations(books, limit=3)
+    scored_books = top_rated_reference(service, books, limit=3)
     
     # Convert to dict for easier testing
     scores = {book[0].title: book[1] for book in scored_books}
@@ -79,7 +115,153 @@ def test_top_rated_scoring(db: Session):
     assert scores["High Rating Many Reviews"] - scores["High Rating Few Reviews"] <= 0.1
 
 @pytest.mark.asyncio
-async def test_similar_recommendations_scoring(db: Session, monkeypatch):
+async def test_top_rated_sql_matches_python_scoring(db: Session, async_db):
+    """The SQL top-k query ranks, scores and limits like the in-memory scorer"""
+    service = RecommendationService(async_db)
+    # A genre only these books carry keeps the seeded catalog out of the ranking
+    books = [
+        Book(title="Top A", author="Author 1", genres=["Mystery", "Scoring Test"],
+             average_rating=4.8, total_reviews=10, isbn="9780000000101"),
+        Book(title="Top B", author="Author 2", genres=["Mystery", "Thriller", "Scoring Test"],
+             average_rating=4.8, total_reviews=1000, isbn="9780000000102"),
+        Book(title="Top C", author="Author 3", genres=["Romance", "Scoring Test"],
+             average_rating=4.0, total_reviews=50, isbn="9780000000103"),
+        Book(title="Unrated", author="Author 4", genres=["Mystery", "Scoring Test"],
+             average_rating=0, total_reviews=0, isbn="9780000000104")
+    ]
+    db.add_all(books)
+    db.commit()
+
+    expected = top_rated_reference(service, books, limit=2, genre="Scoring Test")
+    ranked = await service._get_top_rated_books(limit=2, genre="Scoring Test")
+    assert [book.title for book, _, _ in ranked] == [book.title for book, _, _ in expected] == ["Top B", "Top A"]
+    assert [score for _, score, _ in ranked] == pytest.approx([score for _, score, _ in expected])
+    assert all(reason == "Top rated Scoring Test book" for _, _, reason in ranked)
+
+    everything = await service._get_top_rated_books(limit=10, genre="Scoring Test")
+    assert [book.title for book, _, _ in everything] == ["Top B", "Top A", "Top C"]
+
+@pytest.mark.asyncio
+async def test_top_rated_genre_filter_matches_like_similar(db: Session, async_db):
+    """TOP_RATED matches the genre as a case-insensitive substring, like SIMILAR and AI"""
+    service = RecommendationService(async_db)
+    db.add_all([
+        Book(title="Cosy", author="Author 1", genres=["Cozy Genrefilter_Test"],
+             average_rating=4.9, total_reviews=10, isbn="9780000000111"),
+        Book(title="Plain", author="Author 2", genres=["Genrefilter_Test"],
+             average_rating=4.5, total_reviews=10, isbn="9780000000112"),
+        Book(title="Wildcard", author="Author 3", genres=["GenrefilterXTest"],
+             average_rating=4.7, total_reviews=10, isbn="9780000000113")
+    ])
+    db.commit()
+
+    ranked = await service._get_top_rated_books(limit=10, genre="genrefilter_test")
+    assert [book.title for book, _, _ in ranked] == ["Cosy", "Plain"]  # "_" is not a wildcard
+    assert [reason for _, _, reason in ranked] == [
+        "Top rated Cozy Genrefilter_Test book", "Top rated Genrefilter_Test book"
+    ]
+
+    matrix = GenreMatrix((book.id, book.genres, book.average_rating) for book, _, _ in ranked)
+    preferences = {"Genrefilter_Test": 1.0, "Cozy Genrefilter_Test": 1.0}
+    assert len(matrix.top_k(preferences, limit=10, genre="genrefilter_test")) == 2
+
+def test_top_rated_reason_without_rating(async_db):
+    """A book with no average rating yet still gets a reason"""
+    service = RecommendationService(async_db)
+    book = Book(title="New", average_rating=None, total_reviews=0)
+    assert service._top_rated_reason(book, None) == "Top rated book with 0.0 rating"
+
+def test_genre_matrix_matches_similar_scoring(async_db):
+    """The vectorised scorer reproduces the per-book SIMILAR loop, quirks included"""
+    service = RecommendationService(async_db)
+    books = [
+        Book(id=1, title="Exact", genres=["Mystery", "Thriller"], average_rating=4.0),
+        Book(id=2, title="Partial", genres=["Mystery", "Crime", "Drama"], average_rating=4.5),
+        Book(id=3, title="Duplicate", genres=["Mystery", "Mystery"], average_rating=None),
+        Book(id=4, title="Unrated", genres=["Thriller"], average_rating=0),
+        Book(id=5, title="No Match", genres=["Romance"], average_rating=5.0),
+        Book(id=6, title="No Genres", genres=None, average_rating=5.0),
+        Book(id=7, title="Tie", genres=["Mystery", "Thriller"], average_rating=4.0)
+    ]
+    preferences = {"Mystery": 1.0, "Thriller": 0.5, "Crime": 0.5}
+    matrix = GenreMatrix((book.id, book.genres, book.average_rating) for book in books)
+
+    expected = similar_reference(books, preferences, limit=10)
+    assert matrix.top_k(preferences, limit=10) == [(book.id, score) for book, score, _ in expected]
+    assert [book_id for book_id, _ in matrix.top_k(preferences, limit=2)] == [3, 1]
+    assert [book_id for book_id, _ in matrix.top_k(preferences, limit=10, exclude_ids={1, 3})] == [7, 2, 4]
+    assert [book_id for book_id, _ in matrix.top_k(preferences, limit=10, genre="crime")] == [2]
+    assert matrix.top_k({"Horror": 1.0}, limit=10) == []
+
+@pytest.mark.asyncio
+async def test_genre_matrix_cache_builds_once(async_db, genre_matrix_cache, monkeypatch):
+    """Concurrent requests share one rebuild; an unchanged catalog version needs no queries"""
+    from app.db.session import QueryStats, query_stats
+    import app.services.genre_matrix as genre_matrix_module
+
+    builds = []
+    def counting_matrix(rows):
+        builds.append(rows)
+        return GenreMatrix(rows)
+    monkeypatch.setattr(genre_matrix_module, "GenreMatrix", counting_matrix)
+
+    matrices = await asyncio.gather(*(genre_matrix_cache.get(async_db) for _ in range(5)))
+    assert len(builds) == 1
+    assert all(matrix is matrices[0] for matrix in matrices)
+
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        assert await genre_matrix_cache.get(async_db) is matrices[0]
+    finally:
+        query_stats.reset(token)
+    assert stats.count == 0
+
+@pytest.mark.asyncio
+async def test_genre_matrix_cache_refreshes_in_background(db: Session, async_db, genre_matrix_cache):
+    """A stale matrix keeps being served while the rebuild runs; the new one is swapped in after"""
+    from app.core.cache import bump_cache_version
+
+    stale = await genre_matrix_cache.get(async_db)
+    book = Book(title="Background Rebuild", author="Async Author", isbn="9990000000301", genres=["Fiction"])
+    db.add(book)
+    db.flush()
+    bump_cache_version("catalog")
+
+    assert await genre_matrix_cache.get(async_db) is stale
+    await genre_matrix_cache._refresh_task
+
+    fresh = await genre_matrix_cache.get(async_db)
+    assert fresh is not stale
+    assert fresh.max_id == book.id
+
+@pytest.mark.asyncio
+async def test_similar_books_load_only_top_k(db: Session, async_db):
+    """SIMILAR through the cached matrix returns the loop's ranking and reasons"""
+    service = RecommendationService(async_db)
+    books = [
+        Book(title="Matrix A", author="Author 1", genres=["Mystery", "Thriller"],
+             average_rating=4.0, isbn="9780000000111"),
+        Book(title="Matrix B", author="Author 2", genres=["Mystery"],
+             average_rating=4.5, isbn="9780000000112"),
+        Book(title="Matrix C", author="Author 3", genres=["Romance"],
+             average_rating=5.0, isbn="9780000000113")
+    ]
+    db.add_all(books)
+    db.commit()
+    preferences = {"Mystery": 1.0, "Thriller": 0.5}
+
+    ranked = await service._get_similar_books(preferences, limit=2, exclude_ids=set())
+    expected = similar_reference(db.query(Book).order_by(Book.id).all(), preferences, limit=2)
+    assert [(book.title, score, reason) for book, score, reason in ranked] == \
+        [(book.title, score, reason) for book, score, reason in expected]
+    assert ranked[0][2] == "Matches your interest in Mystery, Thriller"
+
+    excluded = await service._get_similar_books(preferences, limit=5, exclude_ids={books[0].id})
+    assert "Matrix A" not in [book.title for book, _, _ in excluded]
+
+@pytest.mark.asyncio
+async def test_similar_recommendations_scoring(db: Session, async_db, monkeypatch):
     """Test SIMILAR recommendations prioritize genre matches"""
     # Clear out existing test books for isolation
     db.query(Book).delete()
@@ -102,7 +284,7 @@ async def test_similar_recommendations_scoring(db: Session, monkeypatch):
     )
     
     # Create service after mocking
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
 
     # Create a user with clear genre preferences
     user = User(name="Genre User", email="genre@test.com", hashed_password="dummy_hash")
@@ -297,9 +479,10 @@ async def test_similar_recommendations_scoring(db: Session, monkeypatch):
         assert genre in recommendations[0]["recommendation_reason"]
 
 
-def test_get_popular_books(db: Session, sample_data):
-    service = RecommendationService(db)
-    popular_books = service._get_popular_books(limit=3)
+@pytest.mark.asyncio
+async def test_get_popular_books(db: Session, async_db, sample_data):
+    service = RecommendationService(async_db)
+    popular_books = await service._get_popular_books(limit=3)
     assert len(popular_books) <= 3
     for book in popular_books:
         assert "book_id" in book
@@ -309,7 +492,7 @@ def test_get_popular_books(db: Session, sample_data):
         assert "Popular book with" in book["recommendation_reason"]
 
 @pytest.mark.asyncio
-async def test_get_recommendations_new_user(db: Session):
+async def test_get_recommendations_new_user(db: Session, async_db):
     # Create a new user with no history
     new_user = User(
         name="New User",
@@ -319,16 +502,16 @@ async def test_get_recommendations_new_user(db: Session):
     db.add(new_user)
     db.commit()
 
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     result = await service.get_recommendations(new_user.id, limit=3)
 
     assert len(result["recommendations"]) > 0
     assert result["recommendation_type"] == RecommendationType.TOP_RATED
 
 @pytest.mark.asyncio
-async def test_recommendations_with_genre_filter(db: Session):
+async def test_recommendations_with_genre_filter(db: Session, async_db):
     """Test that genre filtering works for both recommendation types"""
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     
     # Create test user and books
     user = User(name="Filter User", email="filter@test.com", hashed_password="dummy_hash")
@@ -370,12 +553,12 @@ async def test_recommendations_with_genre_filter(db: Session):
     assert all("Romance" in book["genres"] for book in romance_recs)
 
 @pytest.mark.asyncio
-async def test_recommendations_exclude_read_books(db: Session, monkeypatch):
+async def test_recommendations_exclude_read_books(db: Session, async_db, monkeypatch):
     # Clear out existing test books for isolation
     db.query(Book).delete()
     db.commit()
     """Test that recommendations exclude books the user has already marked as favorites"""
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     
     # Create test user and books
     user = User(name="Test User", email="test@example.com", hashed_password="dummy_hash")
@@ -412,9 +595,9 @@ async def test_recommendations_exclude_read_books(db: Session, monkeypatch):
     assert "New Book" in titles
 
 @pytest.mark.asyncio
-async def test_fallback_behavior(db: Session):
+async def test_fallback_behavior(db: Session, async_db):
     """Test that fallback to popular books works when no recommendations found"""
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     
     # Create user with favorites in a genre that has no other books
     user = User(name="Fallback User", email="fallback@test.com", hashed_password="dummy_hash")
@@ -460,9 +643,9 @@ async def test_fallback_behavior(db: Session):
     assert len(result["recommendations"]) > 0
 
 @pytest.mark.asyncio
-async def test_similar_books_recommendations_by_genre(db: Session):
+async def test_similar_books_recommendations_by_genre(db: Session, async_db):
     # Create test user and service
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     user = User(name="Genre Test User", email="genre@test.com", hashed_password="dummy_hash")
     db.add(user)
     db.commit()
@@ -510,8 +693,8 @@ async def test_similar_books_recommendations_by_genre(db: Session):
     assert scores.get("Rec 1", 0) > scores.get("Rec 2", 0)
 
 @pytest.mark.asyncio
-async def test_similar_books_recommendations(db: Session, sample_data):
-    service = RecommendationService(db)
+async def test_similar_books_recommendations(db: Session, async_db, sample_data):
+    service = RecommendationService(async_db)
     result = await service.get_recommendations(
         user_id=sample_data["user"].id,
         limit=3,
@@ -525,7 +708,7 @@ async def test_similar_books_recommendations(db: Session, sample_data):
     assert "is_ai_powered" in result  # Check AI flag is present
 
 @pytest.mark.asyncio
-async def test_ai_recommendations(db: Session):
+async def test_ai_recommendations(db: Session, async_db):
     """Test AI-powered recommendations with mocked OpenAI API"""
     # Mock OpenAI API responses
     mock_embedding = [0.1] * 1536  # OpenAI embeddings are 1536-dimensional
@@ -547,7 +730,7 @@ async def test_ai_recommendations(db: Session):
             self.embeddings = MockEmbeddings()
 
     # Create service with mocked OpenAI client
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     service.openai_client = MockAsyncOpenAI()
     
     # Create test user with clear preferences
@@ -600,7 +783,7 @@ async def test_ai_recommendations(db: Session):
     assert any("AI recommendation" in rec["recommendation_reason"] for rec in result["recommendations"])
 
 @pytest.mark.asyncio
-async def test_ai_recommendations_fallback(db: Session, monkeypatch):
+async def test_ai_recommendations_fallback(db: Session, async_db, monkeypatch):
     """Test that recommendations fall back gracefully when AI fails"""
     
     # Create a failing mock for OpenAI embeddings
@@ -617,7 +800,7 @@ async def test_ai_recommendations_fallback(db: Session, monkeypatch):
 
     # Apply the mock at module level
     monkeypatch.setattr("openai.AsyncOpenAI", MockOpenAI)
-    service = RecommendationService(db)
+    service = RecommendationService(async_db)
     
     # Create test user and books
     user = User(name="AI Test User", email="ai@test.com", hashed_password="dummy_hash")
@@ -647,3 +830,106 @@ async def test_ai_recommendations_fallback(db: Session, monkeypatch):
     # Should use genre-based recommendations as fallback
     assert any("Matches your interest in" in rec["recommendation_reason"] 
               for rec in result["recommendations"])
+
+def test_embedding_store_roundtrip(tmp_path):
+    store = EmbeddingStore(tmp_path, dimensions=4)
+    assert list(store.rows([1], [text_digest("a")])) == [-1]
+
+    store.add([1, 2], [text_digest("a"), text_digest("b")], [[3, 0, 0, 0], [0, 0, 2, 0]])
+    assert list(store.rows([1, 2, 3], [text_digest("a"), text_digest("b"), text_digest("c")])) == [0, 1, -1]
+    # An edited book no longer matches its stored digest until it is re-embedded
+    assert list(store.rows([1], [text_digest("a, edited")])) == [-1]
+    store.add([1], [text_digest("a, edited")], [[0, 1, 0, 0]])
+    assert list(store.rows([1], [text_digest("a, edited")])) == [2]
+
+    # Another worker maps the same files
+    other = EmbeddingStore(tmp_path, dimensions=4)
+    assert len(other) == 3
+    similarities = other.similarities([1, 1, 0, 0], np.array([0, 1, 2]))
+    assert similarities == pytest.approx([2 ** -0.5, 0.0, 2 ** -0.5])
+
+@pytest.mark.asyncio
+async def test_ai_book_embeddings_are_computed_once(db: Session, async_db, embedding_store):
+    """Book embeddings persist in the store instead of being re-requested"""
+    calls = []
+
+    class MockEmbeddings:
+        async def create(self, model, input):
+            calls.append(input)
+            vector = [0.0] * 1536
+            vector[len(calls) % 1536] = 1.0
+            return type("Response", (), {"data": [type("Item", (), {"embedding": vector})()]})()
+
+    class MockOpenAI:
+        embeddings = MockEmbeddings()
+
+    service = RecommendationService(async_db, openai_client=MockOpenAI())
+    user = User(name="Store User", email="store@test.com", hashed_password="dummy_hash")
+    books = [
+        Book(title=f"Stored {i}", author="Author", genres=["Mystery"], isbn=f"978000000{i + 120:04}")
+        for i in range(3)
+    ]
+    db.add(user)
+    db.add_all(books)
+    db.commit()
+    db.add(UserFavorite(user_id=user.id, book_id=books[0].id))
+    db.commit()
+
+    first = await service._get_ai_recommendations(user.id, limit=5, exclude_ids={books[0].id})
+    book_calls = sum(1 for text in calls if text.startswith("Title:"))
+    assert book_calls == len(embedding_store) > 0
+    assert books[0].id not in [book.id for book, _, _ in first]
+
+    second = await service._get_ai_recommendations(user.id, limit=5, exclude_ids={books[0].id})
+    assert sum(1 for text in calls if text.startswith("Title:")) == book_calls
+    assert [book.id for book, _, _ in second] == [book.id for book, _, _ in first]
+
+class _DownRedis:
+    """Stands in for a Redis client whose server has gone away"""
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, key):
+        from redis.exceptions import ConnectionError
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+    async def setex(self, key, ttl, value):
+        from redis.exceptions import ConnectionError
+        self.calls += 1
+        raise ConnectionError("connection refused")
+
+@pytest.mark.asyncio
+async def test_dead_redis_is_detected_once(async_db, monkeypatch):
+    from app.core.clients import AsyncClients
+    import app.services.recommendation as recommendation_module
+
+    shared = AsyncClients()
+    monkeypatch.setattr(recommendation_module, "clients", shared)
+    cache = _DownRedis()
+    service = RecommendationService(async_db, cache=cache)
+
+    assert await service._cache_get("book_embedding:1") is None
+    await service._cache_set("book_embedding:1", "[]")
+    assert cache.calls == 1  # The service stops using Redis after the first failure
+    assert shared._redis_down_until > 0  # and later requests skip it process-wide
+
+@pytest.mark.asyncio
+async def test_clients_lifecycle_with_unreachable_redis(monkeypatch):
+    from app.core.clients import AsyncClients
+    from app.core.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "REDIS_PORT", 1)
+    shared = AsyncClients()
+    await shared.start()
+    try:
+        assert shared.redis() is None
+        assert shared.openai() is not None
+    finally:
+        await shared.close()
+    assert shared.openai() is None
+
+@pytest.mark.asyncio
+async def test_ai_recommendations_without_openai_client(async_db):
+    service = RecommendationService(async_db)
+    assert await service._get_ai_recommendations(user_id=1, limit=5, exclude_ids=set()) == []
@@ -141,6 +141,7 @@ def test_vote_review(db: Session, test_user: User, test_review: Review):
     # Test voting on own review
     with pytest.raises(ValueError, match="Cannot vote on your own review"):
         review_service.vote_review(test_user.id, test_review.id, vote_data)
+    assert not db.in_transaction()  # The rejected vote does not leave a transaction open
 
 def test_get_reviews_with_filters(db: Session, test_review: Review):
     review_service = ReviewService(db)
@@ -155,3 +156,161 @@ def test_get_reviews_with_filters(db: Session, test_review: Review):
     assert count == 1
     assert len(reviews) == 1
     assert reviews[0].id == test_review.id
+
+def test_rating_aggregates_follow_review_writes(db: Session, test_user: User, test_book: Book):
+    other = User(
+        name="Other User",
+        email="other@example.com",
+        hashed_password="dummy_hash",
+        created_at=datetime.now(timezone.utc)
+    )
+    db.add(other)
+    db.commit()
+
+    review_service = ReviewService(db)
+    first = review_service.create_review(test_user.id, ReviewCreate(book_id=test_book.id, text="Great", rating=5))
+    second = review_service.create_review(other.id, ReviewCreate(book_id=test_book.id, text="Not for me", rating=2))
+    db.refresh(test_book)
+    assert (test_book.rating_sum, test_book.total_reviews, float(test_book.average_rating)) == (7, 2, 3.5)
+
+    review_service.update_review(test_user.id, first.id, ReviewUpdate(rating=3))
+    db.refresh(test_book)
+    assert (test_book.rating_sum, test_book.total_reviews, float(test_book.average_rating)) == (5, 2, 2.5)
+
+    review_service.delete_review(other.id, second.id)
+    db.refresh(test_book)
+    assert (test_book.rating_sum, test_book.total_reviews, float(test_book.average_rating)) == (3, 1, 3.0)
+
+def test_reconcile_ratings_fixes_drift(db: Session, test_review: Review, test_book: Book):
+    from app.services.book import BookService
+
+    # Simulate drift from a write that bypassed the review path
+    test_book.rating_sum = 40
+    test_book.total_reviews = 9
+    test_book.average_rating = 4.4
+    db.commit()
+
+    assert BookService(db).reconcile_ratings() >= 1
+    db.refresh(test_book)
+    assert (test_book.rating_sum, test_book.total_reviews, float(test_book.average_rating)) == (4, 1, 4.0)
+
+def test_create_review_missing_book(db: Session, test_user: User):
+    review_service = ReviewService(db)
+    with pytest.raises(ValueError, match="not found"):
+        review_service.create_review(test_user.id, ReviewCreate(book_id=999999, text="Nowhere", rating=3))
+
+def test_create_review_revives_deleted_review(db: Session, test_user: User, test_review: Review, test_book: Book):
+    review_service = ReviewService(db)
+    assert review_service.delete_review(test_user.id, test_review.id) is True
+
+    revived = review_service.create_review(test_user.id, ReviewCreate(book_id=test_book.id, text="Second thoughts", rating=2))
+    assert revived.id == test_review.id
+    assert revived.is_deleted is False
+    assert revived.rating == 2
+    assert revived.updated_at is None
+
+    db.refresh(test_book)
+    assert test_book.total_reviews == 1
+    assert float(test_book.average_rating) == 2.0
+
+def _voter(db: Session, email: str) -> User:
+    voter = User(name="Voter", email=email, hashed_password="dummy_hash", created_at=datetime.now(timezone.utc))
+    db.add(voter)
+    db.commit()
+    return voter
+
+def test_vote_flip_and_repeat_adjust_counts(db: Session, test_review: Review):
+    voter = _voter(db, "flipper@example.com")
+    review_service = ReviewService(db)
+
+    assert review_service.vote_review(voter.id, test_review.id, ReviewVoteCreate(is_helpful=True)) is True
+    # Repeating the same vote changes nothing
+    assert review_service.vote_review(voter.id, test_review.id, ReviewVoteCreate(is_helpful=True)) is True
+    db.refresh(test_review)
+    assert (test_review.helpful_votes, test_review.unhelpful_votes) == (1, 0)
+
+    # Flipping moves the vote from one counter to the other
+    assert review_service.vote_review(voter.id, test_review.id, ReviewVoteCreate(is_helpful=False)) is True
+    db.refresh(test_review)
+    assert (test_review.helpful_votes, test_review.unhelpful_votes) == (0, 1)
+    assert db.query(ReviewVote).filter_by(review_id=test_review.id).count() == 1
+
+    assert review_service.vote_review(voter.id, 999999, ReviewVoteCreate(is_helpful=True)) is False
+
+def test_vote_write_behind_coalesces_counts(db: Session, test_review: Review, monkeypatch):
+    from app.core.config import get_settings
+    from app.services.vote_buffer import vote_buffer
+
+    monkeypatch.setattr(get_settings(), "REVIEW_VOTE_WRITE_BEHIND", True)
+    monkeypatch.setattr(vote_buffer, "_ensure_flusher", lambda: None)  # Flush explicitly below
+    review_service = ReviewService(db)
+    for index in range(3):
+        voter = _voter(db, f"storm{index}@example.com")
+        review_service.vote_review(voter.id, test_review.id, ReviewVoteCreate(is_helpful=index != 2))
+
+    # Votes are written immediately, counters only on flush
+    db.refresh(test_review)
+    assert (test_review.helpful_votes, test_review.unhelpful_votes) == (0, 0)
+    assert vote_buffer.flush(db) >= 1
+    db.refresh(test_review)
+    assert (test_review.helpful_votes, test_review.unhelpful_votes) == (2, 1)
+
+def test_review_rows_load_authors_in_one_query(db: Session, test_book: Book):
+    from app.db.session import QueryStats, query_stats
+
+    for index in range(5):
+        author = _voter(db, f"author{index}@example.com")
+        db.add(Review(user_id=author.id, book_id=test_book.id, text="Listing row", rating=3,
+                      created_at=datetime.now(timezone.utc)))
+    db.commit()
+    book_id = test_book.id  # Reload the expired book before measuring
+
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        rows, total, _ = ReviewService(db).get_review_rows(ReviewSearchParams(book_id=book_id))
+        emails = {row.user_email for row in rows}
+    finally:
+        query_stats.reset(token)
+
+    assert total == 5
+    assert emails == {f"author{index}@example.com" for index in range(5)}
+    assert stats.count == 2  # Count plus the joined page, however many rows
+
+def test_list_reviews_endpoint_includes_authors(client, db: Session, test_review: Review, test_user: User):
+    response = client.get("/v1/reviews", params={"book_id": test_review.book_id})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 1
+    item = body["items"][0]
+    assert item["id"] == test_review.id
+    assert item["user"] == {"id": test_user.id, "email": test_user.email}
+    assert item["can_edit"] is True
+
+def test_review_rows_cursor_pages_match_offset_pages(db: Session, test_book: Book):
+    for index in range(5):
+        author = _voter(db, f"pager{index}@example.com")
+        db.add(Review(user_id=author.id, book_id=test_book.id, text="Paged review", rating=1 + index % 3,
+                      created_at=datetime.now(timezone.utc)))
+    db.commit()
+
+    review_service = ReviewService(db)
+    params = dict(book_id=test_book.id, sort_by="rating", sort_order="desc", items_per_page=2)
+    seen, cursor = [], None
+    while True:
+        rows, _, cursor = review_service.get_review_rows(ReviewSearchParams(**params, after=cursor))
+        seen.extend(row.id for row in rows)
+        if cursor is None:
+            break
+
+    offset_pages = []
+    for page in (1, 2, 3):
+        rows, _, _ = review_service.get_review_rows(ReviewSearchParams(**params, page=page))
+        offset_pages.extend(row.id for row in rows)
+    assert seen == offset_pages
+    assert len(set(seen)) == 5
+
+    # A cursor cannot be replayed under another ordering
+    first_cursor = review_service.get_review_rows(ReviewSearchParams(**params))[2]
+    with pytest.raises(ValueError):
+        review_service.get_review_rows(ReviewSearchParams(book_id=test_book.id, sort_by="date", after=first_cursor))